@@ -0,0 +1,92 @@
+"""Benchmark for the compositing backends
+
+Renders a two-logo thumbnail with ImageGenerator, once with each compositingBackend, and reports the time per render
+along with what each render allocates: the number and total size of the PIL images it creates, and the peak of the
+memory tracemalloc sees allocated (which covers NumPy arrays, but not PIL's own image memory).
+
+    python benchmarks/bench_compositing.py [--logos FILE FILE] [--size W H] [--stroke PX] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from unittest.mock import MagicMock
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pdst.image.ImageGenerator import ImageGenerator, COMPOSITING_BACKENDS  # noqa: E402
+from pdst.image.spec import ImageSpec, CompositeSpec, StrokeSpec  # noqa: E402
+
+
+class ImageCounter:
+    """Counts the PIL images created, and the bytes of pixels they hold, while it's in use"""
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.original = None
+
+    def __enter__(self):
+        self.original = Image.Image._new
+        counter = self
+
+        def counted(image, im):
+            new = counter.original(image, im)
+            counter.count += 1
+            counter.bytes += new.size[0] * new.size[1] * len(new.getbands())
+            return new
+
+        Image.Image._new = counted
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        Image.Image._new = self.original
+
+
+def main():
+    logosDir = os.path.join(os.path.dirname(__file__), '..', 'tests', 'test-files', 'logos', 'plain')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logos', nargs=2, default=[os.path.join(logosDir, 'Alpha.png'),
+                                                     os.path.join(logosDir, 'Charlie.png')])
+    parser.add_argument('--size', type=int, nargs=2, default=[800, 450])
+    parser.add_argument('--stroke', type=int, default=4, help="Stroke size for the second logo, 0 for none")
+    parser.add_argument('--repeat', type=int, default=10, help="Best of this many renders")
+    args = parser.parse_args()
+
+    compositeSpec = CompositeSpec(tuple(args.size))
+    imageSpecs = [ImageSpec(args.logos[0], colors=['123456']),
+                  ImageSpec(args.logos[1], colors=['ddeeff'],
+                            strokeSpec=StrokeSpec(args.stroke, colorHex='000') if args.stroke > 0 else None)]
+
+    print(f"{' vs '.join(os.path.basename(logo) for logo in args.logos)} at {args.size[0]}x{args.size[1]}, "
+          f"best of {args.repeat}")
+    print(f"{'backend':>8} {'ms':>8} {'images':>7} {'image MB':>9} {'traced MB':>10}")
+    for backend in COMPOSITING_BACKENDS:
+        config = MagicMock(thumbnailSize=args.size, fallbackColor='ccc', preventSimilarColors=False,
+                           compositingBackend=backend)
+        generator = ImageGenerator(config)
+        # the first render resizes the logos, and sets up the scratch buffers
+        generator.generateImage(compositeSpec, imageSpecs)
+
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            generator.generateImage(compositeSpec, imageSpecs)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        tracemalloc.start()
+        with ImageCounter() as images:
+            generator.generateImage(compositeSpec, imageSpecs)
+        (current, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"{backend:>8} {best * 1000:>8.2f} {images.count:>7} {images.bytes / 1024 / 1024:>9.1f} "
+              f"{peak / 1024 / 1024:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
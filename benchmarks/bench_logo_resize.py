@@ -0,0 +1,90 @@
+"""Benchmark for preparing logos for drawing
+
+Writes a set of large RGBA PNG logos, then resizes each one into a thumbnail-sized slot a number of times (as
+generating the thumbnails for each team's matches does), first the original way (decode the full image, LANCZOS
+resize it, every time) and then through LogoCache. Reports the cost per resize, and how far the reduced resizes are
+from the full-resolution ones.
+
+    python benchmarks/bench_logo_resize.py [--logos N] [--source PX] [--target PX] [--uses N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pdst.image.LogoCache import LogoCache  # noqa: E402
+
+
+def writeLogos(directory, count, sourceSize):
+    rng = random.Random(1)
+    files = []
+    for i in range(count):
+        image = Image.new('RGBA', (sourceSize, sourceSize), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        for _ in range(20):
+            (x1, x2) = sorted(rng.randrange(sourceSize) for _ in range(2))
+            (y1, y2) = sorted(rng.randrange(sourceSize) for _ in range(2))
+            color = tuple(rng.randrange(256) for _ in range(3)) + (255,)
+            draw.ellipse([x1, y1, x2, y2], fill=color)
+        filePath = os.path.join(directory, f"logo-{i:03d}.png")
+        image.save(filePath)
+        files.append(filePath)
+
+    return files
+
+
+def legacyResize(imageFile, size):
+    return Image.open(imageFile).resize(size, Image.LANCZOS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logos', type=int, default=10)
+    parser.add_argument('--source', type=int, default=3000, help="Width and height of the source logos")
+    parser.add_argument('--target', type=int, default=300, help="Width and height of the slot they're drawn in")
+    parser.add_argument('--uses', type=int, default=5, help="Number of times each logo is drawn")
+    args = parser.parse_args()
+
+    size = (args.target, args.target)
+    with tempfile.TemporaryDirectory() as directory:
+        files = writeLogos(directory, args.logos, args.source)
+        draws = [f for _ in range(args.uses) for f in files]
+
+        start = time.perf_counter()
+        legacy = {f: legacyResize(f, size) for f in draws}
+        legacyTime = time.perf_counter() - start
+
+        cache = LogoCache()
+        start = time.perf_counter()
+        cached = {f: cache.getResized(f, size) for f in draws}
+        cachedTime = time.perf_counter() - start
+
+        persisted = LogoCache(os.path.join(directory, 'cache'))
+        for f in files:
+            persisted.getResized(f, size)
+        reopened = LogoCache(os.path.join(directory, 'cache'))
+        start = time.perf_counter()
+        for f in files:
+            reopened.getResized(f, size)
+        persistedTime = time.perf_counter() - start
+
+        worst = max(np.abs(np.asarray(legacy[f], dtype=np.int16) - np.asarray(cached[f], dtype=np.int16)).mean()
+                    for f in files)
+
+    print(f"{len(files)} {args.source}px logos into {args.target}px, each drawn {args.uses} times")
+    print(f"{'':>10} {'ms/draw':>9}")
+    for name, elapsed, count in [('before', legacyTime, len(draws)), ('cached', cachedTime, len(draws)),
+                                 ('from disk', persistedTime, len(files))]:
+        print(f"{name:>10} {elapsed * 1000 / count:>9.2f}")
+    print(f"worst mean channel difference from a full resolution resize: {worst:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Micro-benchmark for logo name matching
+
+Compares the per-query latency of the original one-candidate-at-a-time scan against CandidateNames, for
+synthetic sets of 1k, 10k and 50k logo names, with two workloads:
+
+    vocabulary  names and queries drawn from the same small vocabulary, so names repeat and most queries find a
+                perfect match early on
+    no-match    unique, realistic team names, queried for teams that aren't there (the unknown team case), so every
+                candidate has to be scored
+    typo        the same team names, queried for teams that are there but misspelled, so nothing is perfect
+
+    python benchmarks/bench_matching.py [--queries N] [--sizes 1000,10000,50000] [--workloads vocabulary,no-match,typo]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fuzzywuzzy import fuzz  # noqa: E402
+
+from pdst.image.matching import CandidateNames  # noqa: E402
+
+WORDS = ['Boston', 'New', 'York', 'Red', 'Sox', 'City', 'United', 'FC', 'St.', 'Louis', 'Saint', 'Bay', 'Tampa',
+         'Los', 'Angeles', 'Real', 'Madrid', 'Athletic', 'Club', 'Sporting', 'Rovers', 'Wanderers', 'County',
+         'Albion', 'Rangers', 'Celtic', 'Dynamo', 'Inter', 'Olympique', 'Atlético', 'State', 'University', 'Tech']
+
+CITIES = ['Aberdeen', 'Albany', 'Atlanta', 'Austin', 'Baltimore', 'Barcelona', 'Birmingham', 'Boise', 'Bordeaux',
+          'Bristol', 'Buffalo', 'Calgary', 'Charlotte', 'Chicago', 'Cincinnati', 'Cleveland', 'Columbus', 'Dallas',
+          'Denver', 'Detroit', 'Dortmund', 'Dublin', 'Edmonton', 'Fresno', 'Glasgow', 'Hamburg', 'Houston',
+          'Indianapolis', 'Jacksonville', 'Kansas City', 'Leeds', 'Lisbon', 'Liverpool', 'Louisville', 'Lyon',
+          'Memphis', 'Miami', 'Milwaukee', 'Minnesota', 'Montreal', 'Nashville', 'Norwich', 'Oakland', 'Orlando',
+          'Ottawa', 'Phoenix', 'Pittsburgh', 'Portland', 'Porto', 'Sacramento']
+NICKNAMES = ['Aces', 'Bears', 'Blaze', 'Bulldogs', 'Cardinals', 'Chargers', 'Comets', 'Cougars', 'Cyclones',
+             'Dragons', 'Eagles', 'Express', 'Falcons', 'Flames', 'Foxes', 'Generals', 'Giants', 'Grizzlies',
+             'Hawks', 'Hornets', 'Huskies', 'Jaguars', 'Knights', 'Lancers', 'Lions', 'Lynx', 'Mariners', 'Mustangs',
+             'Owls', 'Panthers', 'Pilots', 'Pioneers', 'Raiders', 'Rams', 'Ravens', 'Rebels', 'Rockets', 'Royals',
+             'Sabres', 'Sharks', 'Spartans', 'Stallions', 'Storm', 'Thunder', 'Tigers', 'Titans', 'Vikings',
+             'Warriors', 'Wildcats', 'Wolves']
+QUALIFIERS = ['', 'FC', 'Reserves', 'U21', 'U19', 'Women', 'II', 'Academy', 'B', 'Juniors', 'Select', 'Legends',
+              'All-Stars', 'Youth', 'Amateurs', 'Veterans', 'College', 'Collegiate', 'Club', 'Alumni']
+# made up names for teams that aren't in the logo set
+SYLLABLES = ['zor', 'vak', 'quil', 'thrax', 'mby', 'oxo', 'pryn', 'gwel', 'dax', 'uun', 'kez', 'yol']
+
+
+def legacyBestMatch(searchTarget, images):
+    bestMatch = None
+    bestCleaned = None
+    bestScore = 0
+
+    for (filename, cleaned) in images:
+        score = fuzz.partial_ratio(searchTarget, cleaned)
+        if score > bestScore:
+            bestScore = score
+            bestMatch = filename
+            bestCleaned = cleaned
+        elif score == bestScore:
+            if fuzz.token_set_ratio(searchTarget, cleaned) > fuzz.token_set_ratio(searchTarget, bestCleaned):
+                bestMatch = filename
+                bestCleaned = cleaned
+
+    return bestMatch, bestScore
+
+
+def makeImages(count, rng):
+    images = []
+    for i in range(count):
+        name = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        images.append((f"{name}_{i:06x}.png", name))
+    return images
+
+
+def makeQueries(count, rng, images):
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))) for _ in range(count)]
+
+
+def makeTeamImages(count, rng):
+    """Unique '<city> <nickname> <qualifier>' names, up to len(CITIES) * len(NICKNAMES) * len(QUALIFIERS)"""
+    images = []
+    for i in rng.sample(range(len(CITIES) * len(NICKNAMES) * len(QUALIFIERS)), count):
+        (i, qualifier) = divmod(i, len(QUALIFIERS))
+        (city, nickname) = divmod(i, len(NICKNAMES))
+        name = ' '.join(p for p in [CITIES[city], NICKNAMES[nickname], QUALIFIERS[qualifier]] if p)
+        images.append((f"{name}.png", name))
+    return images
+
+
+def makeUnknownTeamQueries(count, rng, images):
+    def word():
+        return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+    return [f"{word()} {word()}" for _ in range(count)]
+
+
+def makeTypoQueries(count, rng, images):
+    queries = []
+    for (_, name) in rng.sample(images, count):
+        i = rng.randrange(len(name))
+        queries.append(name[:i] + 'x' + name[i + 1:])
+    return queries
+
+
+# name -> (function(count, rng) for the images, function(count, rng, images) for the queries)
+WORKLOADS = {
+    'vocabulary': (makeImages, makeQueries),
+    'no-match': (makeTeamImages, makeUnknownTeamQueries),
+    'typo': (makeTeamImages, makeTypoQueries),
+}
+
+
+def timePerQuery(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=5)
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS))
+    parser.add_argument('--seed', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'workload':>10} {'candidates':>10} {'unique':>8} {'best score':>10} {'prepare ms':>11} "
+          f"{'legacy ms/q':>12} {'engine ms/q':>12} {'speedup':>8}")
+    for workload in args.workloads.split(','):
+        (makeWorkloadImages, makeWorkloadQueries) = WORKLOADS[workload]
+        for size in [int(s) for s in args.sizes.split(',')]:
+            images = makeWorkloadImages(size, rng)
+            queries = makeWorkloadQueries(args.queries, rng, images)
+
+            start = time.perf_counter()
+            candidates = CandidateNames(images)
+            prepare = time.perf_counter() - start
+
+            legacy = timePerQuery(lambda q: legacyBestMatch(q, images), queries)
+            engine = timePerQuery(candidates.bestMatch, queries)
+            bestScore = sum(candidates.bestMatch(q)[1] for q in queries) / len(queries)
+
+            print(f"{workload:>10} {size:>10} {len(candidates):>8} {bestScore:>10.0f} {prepare * 1000:>11.1f} "
+                  f"{legacy * 1000:>12.1f} {engine * 1000:>12.1f} {legacy / engine:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark for reading .metadata files
+
+Writes a set of .metadata files the way `meta-export` does, then reads them back with EpisodeMetadata.fromFile,
+both with the line parser and with the original ConfigParser and uncached strptime path. Reports per-file parse
+cost for each.
+
+    python benchmarks/bench_metadata_file.py [--files N] [--shows N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pdst.db import metadata as metadataModule  # noqa: E402
+from pdst.db.metadata import BaseMetadata, EpisodeMetadata, parseTimestamp  # noqa: E402
+
+
+def legacyParseTimestamp(value):
+    return datetime.strptime(value, metadataModule.PLEX_TIMESTAMP_FORMAT)
+
+
+class Legacy:
+    """Swaps in the original parsing: ConfigParser for every file, and strptime for every timestamp"""
+
+    def __enter__(self):
+        self.saved = (metadataModule.readMetadataSections, metadataModule.parseTimestamp)
+        metadataModule.readMetadataSections = lambda filename: None
+        metadataModule.parseTimestamp = legacyParseTimestamp
+
+    def __exit__(self, *args):
+        (metadataModule.readMetadataSections, metadataModule.parseTimestamp) = self.saved
+
+
+def writeFiles(directory, count, shows):
+    files = []
+    start = datetime(2020, 1, 1, 12)
+    for i in range(count):
+        showId = i % shows
+        added = start + timedelta(days=i // shows, hours=showId % 12)
+        show = BaseMetadata({'id': 1000 + showId, 'title': f"Sport {showId:03d}", 'summary': f"Sport {showId:03d}",
+                             'genres': 'Sport|Live', 'user_thumb_url': f"upload://posters/{showId:040x}.jpg",
+                             'hash': f"{showId:040x}"})
+        season = BaseMetadata({'id': 2000 + showId, 'index': added.year, 'hash': f"{showId + 1:040x}",
+                               'parent_id': 1000 + showId})
+        episode = EpisodeMetadata({'id': 10000 + i, 'library_section_id': 1, 'metadata_type': 4,
+                                   'guid': f"com.plexapp.agents.none://{i}", 'title': f"Team {i % 7} vs. Team {i % 5}",
+                                   'summary': 'A game between two teams', 'genres': 'Sport', 'year': added.year,
+                                   'duration': 10800000, 'user_thumb_url': f"media://{i:040x}.jpg",
+                                   'originally_available_at': added.strftime('%Y-%m-%d 00:00:00'),
+                                   'added_at': str(added), 'created_at': str(added), 'index': i,
+                                   'hash': f"{i:040x}", 'parent_id': 2000 + showId,
+                                   'extra_data': f"at%3AmediaGrabBeginsAt={int(added.timestamp()) - 10800}"},
+                                  seasonMetadata=season, showMetadata=show)
+
+        filePath = os.path.join(directory, f"episode-{i:06d}.metadata")
+        episode.writeToFile(filePath)
+        files.append(filePath)
+
+    return files
+
+
+def timeReads(files, repeat):
+    best = None
+    for _ in range(repeat):
+        parseTimestamp.cache_clear()
+        start = time.perf_counter()
+        results = [EpisodeMetadata.fromFile(f) for f in files]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20, help="Number of shows the episodes are spread over")
+    parser.add_argument('--repeat', type=int, default=3, help="Best of this many passes over the files")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = writeFiles(directory, args.files, args.shows)
+
+        with Legacy():
+            (legacyTime, legacy) = timeReads(files, args.repeat)
+        (fastTime, fast) = timeReads(files, args.repeat)
+
+        for old, new in zip(legacy, fast):
+            assert vars(old).keys() == vars(new).keys()
+            assert all(getattr(old, k) == getattr(new, k) for k in vars(old) if k not in ('season', 'show'))
+            assert vars(old.season) == vars(new.season) and vars(old.show) == vars(new.show)
+
+        print(f"{len(files)} files, best of {args.repeat}")
+        print(f"{'':>8} {'us/file':>9}")
+        for name, elapsed in [('before', legacyTime), ('after', fastTime)]:
+            print(f"{name:>8} {elapsed * 1000000 / len(files):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark for looking up episode metadata in a Plex database
+
+Compares the original lookup (a fresh connection per file, one query for the episode and one per ancestor) with
+PlexDao, against a synthetic Plex-schema database. Reports queries per file and per-file latency, both for
+one lookup per file and for a bulk prefetch of the whole media directory followed by the same lookups.
+
+    python benchmarks/bench_plexdao.py [--shows N] [--seasons N] [--episodes N] [--files N]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pdst.db import PlexDao as plexDaoModule  # noqa: E402
+from pdst.db.PlexDao import PlexDao  # noqa: E402
+from pdst.db.metadata import BaseMetadata, EpisodeMetadata, MetadataType  # noqa: E402
+
+from synthetic_plex import createLibrary  # noqa: E402
+
+LEGACY_EPISODE_SQL = """SELECT meta.id, meta.library_section_id, meta.parent_id, meta.metadata_type, meta.guid,
+    meta.title, meta.summary, meta.tags_genre as genres, meta.year, meta."index", meta.user_thumb_url, meta.duration,
+    meta.originally_available_at, meta.added_at, meta.created_at, meta.hash, mi.extra_data,
+    mp.extra_data as part_extra_data
+    from media_parts mp
+    join media_items mi on mi.id = mp.media_item_id
+    join metadata_items meta on meta.id = mi.metadata_item_id
+    where mp.file=?"""
+
+LEGACY_BY_ID_SQL = """SELECT id, library_section_id, parent_id, metadata_type, guid, title, summary,
+    tags_genre as genres, year, "index", user_thumb_url, duration, originally_available_at, added_at, created_at, hash
+    from metadata_items where id=?"""
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, statement):
+        # the trace callback also sees the statements sqlite runs for PRAGMAs, only count real queries
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            self.count += 1
+
+
+def legacyLookup(dbPath, filePath, counter):
+    """The original PlexDao lookup, as it was before sharing a connection and fetching the ancestry in one query"""
+    conn = sqlite3.connect(dbPath)
+    conn.set_trace_callback(counter)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute(LEGACY_EPISODE_SQL, [filePath])
+    result = cursor.fetchone()
+    season = None
+    show = None
+    parentId = result['parent_id']
+    while parentId is not None:
+        cursor.execute(LEGACY_BY_ID_SQL, [parentId])
+        parent = BaseMetadata(cursor.fetchone())
+        if parent.type == MetadataType.SEASON:
+            season = parent
+        elif parent.type == MetadataType.SHOW:
+            show = parent
+        parentId = parent.parentId
+
+    return EpisodeMetadata(result, season, show)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=20)
+    parser.add_argument('--seasons', type=int, default=5)
+    parser.add_argument('--episodes', type=int, default=40)
+    parser.add_argument('--files', type=int, default=500, help="Number of files to look up")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as libraryPath:
+        files = createLibrary(libraryPath, args.shows, args.seasons, args.episodes)
+        lookups = random.Random(1).sample(files, min(args.files, len(files)))
+
+        dao = PlexDao(libraryPath)
+
+        legacyCounter = QueryCounter()
+        start = time.perf_counter()
+        legacy = [legacyLookup(dao.dbPath, f, legacyCounter) for f in lookups]
+        legacyTime = time.perf_counter() - start
+
+        # open the shared connection first, so the count only covers the lookups
+        connection = plexDaoModule.getConnection(dao.dbPath)
+        connection.query('SELECT 1')
+        counter = QueryCounter()
+        connection.conn.set_trace_callback(counter)
+
+        start = time.perf_counter()
+        current = [dao.getMetadataForEpisodeFile(f) for f in lookups]
+        currentTime = time.perf_counter() - start
+        currentQueries = counter.count
+
+        bulkDao = PlexDao(libraryPath)
+        counter.count = 0
+        start = time.perf_counter()
+        bulkDao.prefetchDirectory(os.path.dirname(os.path.dirname(os.path.dirname(files[0]))))
+        bulk = [bulkDao.getMetadataForEpisodeFile(f) for f in lookups]
+        bulkTime = time.perf_counter() - start
+        bulkQueries = counter.count
+        dao.close()
+
+        for old, new, prefetched in zip(legacy, current, bulk):
+            assert (old.id, old.season.id, old.show.id) == (new.id, new.season.id, new.show.id)
+            assert (old.id, old.season.id, old.show.id) == (prefetched.id, prefetched.season.id, prefetched.show.id)
+
+        print(f"{len(files)} episodes in library, {len(lookups)} lookups")
+        print(f"{'':>8} {'queries/file':>13} {'ms/file':>9}")
+        results = [('before', legacyCounter.count, legacyTime), ('after', currentQueries, currentTime),
+                   ('bulk', bulkQueries, bulkTime)]
+        for name, queries, elapsed in results:
+            print(f"{name:>8} {queries / len(lookups):>13.1f} {elapsed * 1000 / len(lookups):>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
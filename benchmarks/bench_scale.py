@@ -0,0 +1,336 @@
+"""End-to-end benchmarks for pdst commands against a synthetic Plex library
+
+Generates a Plex-schema database and a matching media tree (on tmpfs, where there is one) and runs each benchmark
+in a fresh process, on a fresh copy of the tree. Reports wall time, filesystem calls, database queries and peak RSS
+for each as JSON, which can be saved and compared against a run from another commit.
+
+    python benchmarks/bench_scale.py run [--shows N] [--seasons N] [--episodes N] [--only NAME] [--out FILE]
+    python benchmarks/bench_scale.py compare BEFORE.json AFTER.json
+"""
+import argparse
+import collections
+import contextlib
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+
+import simplejson as json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pdst.db.PlexDao import PlexDao  # noqa: E402
+
+from synthetic_plex import createLibrary, createMediaTree  # noqa: E402
+
+RESULTS_VERSION = 1
+
+# python audit events for filesystem calls, counted along with os.stat/os.lstat (which don't raise events)
+AUDITED_CALLS = {
+    'open': 'open',
+    'os.scandir': 'scandir',
+    'os.listdir': 'listdir',
+    'os.mkdir': 'mkdir',
+    'os.rename': 'rename',
+    'os.link': 'link',
+    'os.remove': 'remove',
+    'shutil.copyfile': 'copy',
+}
+
+# metrics shown by compare, as (label, how to get it from a result)
+COMPARED = [
+    ('wall s', lambda r: r['wall']),
+    ('queries', lambda r: r['queries']),
+    ('stat', lambda r: r['fs'].get('stat', 0)),
+    ('open', lambda r: r['fs'].get('open', 0)),
+    ('peak MB', lambda r: r['peakRss'] / (1024 * 1024)),
+]
+
+
+class Counters:
+    """Counts filesystem calls and database queries made by this process"""
+
+    def __init__(self):
+        self.fs = collections.Counter()
+        self.queries = 0
+
+    def install(self):
+        realStat = os.stat
+        realLstat = os.lstat
+
+        def stat(*args, **kwargs):
+            self.fs['stat'] += 1
+            return realStat(*args, **kwargs)
+
+        def lstat(*args, **kwargs):
+            self.fs['stat'] += 1
+            return realLstat(*args, **kwargs)
+
+        realConnect = sqlite3.connect
+
+        def connect(*args, **kwargs):
+            conn = realConnect(*args, **kwargs)
+            conn.set_trace_callback(self.__trace)
+            return conn
+
+        os.stat = stat
+        os.lstat = lstat
+        sqlite3.connect = connect
+        sys.addaudithook(self.__audit)
+
+    def __audit(self, event, args):
+        name = AUDITED_CALLS.get(event)
+        if name is not None:
+            self.fs[name] += 1
+
+    def __trace(self, statement):
+        # the trace callback also sees the statements sqlite runs for PRAGMAs, only count real queries
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            self.queries += 1
+
+
+def peakRss():
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports KB, macOS bytes
+    return maxRss if sys.platform == 'darwin' else maxRss * 1024
+
+
+def runCommand(workDir, command, *args):
+    from pdst.cli import cli
+    cli.main([command, '-c', os.path.join(workDir, 'config.json'), *args], prog_name='pdst', standalone_mode=False)
+
+
+def benchPlexDao(workDir, files):
+    dao = PlexDao(os.path.join(workDir, 'library'))
+    for f in files:
+        dao.getMetadataForEpisodeFile(f)
+
+
+def benchPlexDaoPrefetch(workDir, files):
+    dao = PlexDao(os.path.join(workDir, 'library'))
+    dao.prefetchDirectory(os.path.join(workDir, 'dvr'))
+    for f in files:
+        dao.getMetadataForEpisodeFile(f)
+
+
+def benchPlexDaoSection(workDir, files):
+    dao = PlexDao(os.path.join(workDir, 'library'))
+    dao.loadSection(1)
+    for f in files:
+        dao.getMetadataForEpisodeFile(f)
+
+
+def benchMetadataService(workDir, files):
+    from pdst.cli import Environment
+    ctx = Environment()
+    ctx.configFile = os.path.join(workDir, 'config.json')
+    for f in files:
+        ctx.metadataService.getMetadataForEpisodeFile(f, readFromFile=False)
+
+
+# name -> function(workDir, list of media files), run in the benchmark process
+BENCHMARKS = collections.OrderedDict([
+    ('plexdao', benchPlexDao),
+    ('plexdao-prefetch', benchPlexDaoPrefetch),
+    ('plexdao-section', benchPlexDaoSection),
+    ('metadata', benchMetadataService),
+    ('meta-export', lambda workDir, files: runCommand(workDir, 'meta-export', '-R', '-f',
+                                                      os.path.join(workDir, 'dvr'))),
+    ('move', lambda workDir, files: runCommand(workDir, 'move', '-R', os.path.join(workDir, 'dvr'))),
+    ('clean', lambda workDir, files: runCommand(workDir, 'clean', '-R', os.path.join(workDir, 'dvr'))),
+])
+
+
+def runChild(name, workDir):
+    """Runs a single benchmark in this process, and writes its measurements to result.json in the work dir"""
+    with open(os.path.join(workDir, 'files.json')) as f:
+        files = json.load(f)
+
+    # fuzzywuzzy warns about its pure python fallback on import, which isn't news here
+    warnings.filterwarnings('ignore', message='Using slow pure-python SequenceMatcher')
+
+    counters = Counters()
+    counters.install()
+
+    error = None
+    start = time.perf_counter()
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            BENCHMARKS[name](workDir, files)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - start
+
+    result = {'wall': wall, 'queries': counters.queries, 'fs': dict(counters.fs), 'peakRss': peakRss(),
+              'error': error}
+    with open(os.path.join(workDir, 'result.json'), 'w') as f:
+        json.dump(result, f)
+
+
+def defaultRoot():
+    shm = '/dev/shm'
+    return shm if os.path.isdir(shm) and os.access(shm, os.W_OK) else None
+
+
+def gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(__file__),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def writeConfig(workDir, shows):
+    config = {
+        'plexLibrary': os.path.join(workDir, 'library'),
+        'moveTarget': os.path.join(workDir, 'library-out'),
+        'colorCache': False,
+        'sports': [{'name': f"Sport {i:03d}", 'matches': [f"Sport {i:03d}"]} for i in range(shows)],
+    }
+    with open(os.path.join(workDir, 'config.json'), 'w') as f:
+        json.dump(config, f, indent=2)
+
+
+def prepareWorkDir(root, templateDb, mediaRoot, files, args):
+    """A fresh copy of the library and media tree, since some of the commands change them
+
+    The media files are created under the work dir, and the copied database is updated to match.
+    """
+    workDir = tempfile.mkdtemp(prefix='pdst-bench-', dir=root)
+    dbPath = os.path.join(workDir, 'library', PlexDao.PLEX_DB_PATH)
+    os.makedirs(os.path.dirname(dbPath))
+    os.makedirs(os.path.join(workDir, 'library-out'))
+    shutil.copy(templateDb, dbPath)
+
+    workMediaRoot = os.path.join(workDir, 'dvr')
+    conn = sqlite3.connect(dbPath)
+    with conn:
+        conn.execute("UPDATE media_parts SET file = ? || substr(file, ?)", [workMediaRoot, len(mediaRoot) + 1])
+    conn.close()
+
+    workFiles = [workMediaRoot + f[len(mediaRoot):] for f in files]
+    createMediaTree(workFiles, orphans=args.orphans)
+    writeConfig(workDir, args.shows)
+    with open(os.path.join(workDir, 'files.json'), 'w') as f:
+        json.dump(workFiles, f)
+
+    return workDir
+
+
+def run(args):
+    root = args.root if args.root is not None else defaultRoot()
+    names = args.only if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"Unknown benchmark(s): {', '.join(unknown)}. Choose from {', '.join(BENCHMARKS)}")
+
+    results = collections.OrderedDict()
+    with tempfile.TemporaryDirectory(prefix='pdst-bench-', dir=root) as baseDir:
+        mediaRoot = '/media/dvr'
+        templateLibrary = os.path.join(baseDir, 'template')
+        start = time.perf_counter()
+        files = createLibrary(templateLibrary, args.shows, args.seasons, args.episodes, mediaRoot=mediaRoot)
+        templateDb = os.path.join(templateLibrary, PlexDao.PLEX_DB_PATH)
+        print(f"Created {len(files)} episode library in {time.perf_counter() - start:.1f}s under {baseDir}",
+              file=sys.stderr)
+
+        for name in names:
+            workDir = prepareWorkDir(baseDir, templateDb, mediaRoot, files, args)
+
+            start = time.perf_counter()
+            subprocess.run([sys.executable, __file__, 'child', name, workDir], check=True)
+            elapsed = time.perf_counter() - start
+
+            with open(os.path.join(workDir, 'result.json')) as f:
+                result = json.load(f)
+            result['process'] = elapsed
+            results[name] = result
+            shutil.rmtree(workDir)
+
+            status = f" FAILED: {result['error']}" if result['error'] else ''
+            print(f"{name:>18} {result['wall']:>8.2f}s {result['queries']:>8} queries "
+                  f"{result['fs'].get('stat', 0):>8} stats {result['peakRss'] / (1024 * 1024):>7.1f}MB{status}",
+                  file=sys.stderr)
+
+    output = {
+        'version': RESULTS_VERSION,
+        'commit': gitCommit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'library': {'shows': args.shows, 'seasons': args.seasons, 'episodesPerSeason': args.episodes,
+                    'episodes': len(files), 'orphans': args.orphans, 'root': root},
+        'results': results,
+    }
+
+    text = json.dumps(output, indent=2)
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+def compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    if before['library'] != after['library']:
+        print("WARNING: the runs used different libraries, the numbers may not be comparable", file=sys.stderr)
+
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    print(f"{'benchmark':>18} {'metric':>8} {'before':>10} {'after':>10} {'change':>8}")
+    for name, afterResult in after['results'].items():
+        beforeResult = before['results'].get(name)
+        if beforeResult is None:
+            continue
+
+        for label, metric in COMPARED:
+            old = metric(beforeResult)
+            new = metric(afterResult)
+            change = f"{(new - old) / old * 100:+.0f}%" if old else ''
+            print(f"{name:>18} {label:>8} {old:>10.2f} {new:>10.2f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='action', required=True)
+
+    runParser = subparsers.add_parser('run', help="Run the benchmarks")
+    runParser.add_argument('--shows', type=int, default=20)
+    runParser.add_argument('--seasons', type=int, default=5)
+    runParser.add_argument('--episodes', type=int, default=10, help="Episodes per season")
+    runParser.add_argument('--orphans', type=float, default=0.1,
+                           help="Fraction of recordings that leave orphaned files for clean")
+    runParser.add_argument('--only', action='append', help="Only run this benchmark, can be passed more than once")
+    runParser.add_argument('--root', help="Where to create the library, defaults to /dev/shm when available")
+    runParser.add_argument('--out', help="Write the JSON results to this file instead of stdout")
+
+    compareParser = subparsers.add_parser('compare', help="Compare two saved runs")
+    compareParser.add_argument('before')
+    compareParser.add_argument('after')
+
+    childParser = subparsers.add_parser('child')
+    childParser.add_argument('name')
+    childParser.add_argument('workDir')
+
+    args = parser.parse_args()
+    if args.action == 'run':
+        run(args)
+    elif args.action == 'compare':
+        compare(args)
+    else:
+        runChild(args.name, args.workDir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark for drawing logo strokes
+
+Draws a stroke around a test logo, resized to a typical thumbnail slot, on a thumbnail-sized canvas for a range of
+stroke sizes, with the original method (the mask pasted 8 * size times around a circle) and with the disk dilation
+that replaced it. Reports the time per stroke for each, and how much their output differs.
+
+    python benchmarks/bench_stroke.py [--logo FILE] [--logo-size PX] [--sizes N [N ...]] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+from math import radians, cos, sin
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pdst.image import drawing  # noqa: E402
+from pdst.image.spec import StrokeSpec  # noqa: E402
+
+CANVAS_SIZE = (800, 450)
+
+
+def circleStroke(baseImage, strokeSpec, drawPoint, maskImg):
+    """The original drawing.drawStroke"""
+    baseImage = baseImage.convert('RGBA')
+    pasteMask = maskImg if maskImg.mode in ['RGBA', 'L'] else None
+
+    transparent = strokeSpec.color + (0,)
+    strokeBase = Image.new('RGBA', baseImage.size, transparent)
+    strokeImg = Image.new('RGBA', maskImg.size, strokeSpec.color)
+    steps = 8 * strokeSpec.size
+    for ds in range(0, steps):
+        rad = radians(ds * (360 / steps))
+        point = (round(drawPoint[0] + strokeSpec.size * cos(rad)), round(drawPoint[1] + strokeSpec.size * sin(rad)))
+        strokeBase.paste(strokeImg, point, pasteMask)
+
+    strokeAlpha = Image.blend(Image.new('RGBA', baseImage.size, transparent), strokeBase, strokeSpec.opacity)
+    return Image.alpha_composite(baseImage, strokeAlpha)
+
+
+def timeStroke(stroke, base, strokeSpec, drawPoint, logo, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = stroke(base, strokeSpec, drawPoint, logo)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, out
+
+
+def main():
+    defaultLogo = os.path.join(os.path.dirname(__file__), '..', 'tests', 'test-files', 'logos', 'plain', 'Charlie.png')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logo', default=defaultLogo)
+    parser.add_argument('--logo-size', type=int, default=300, help="Size of the slot the logo is resized to")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 2, 4, 6, 10, 20])
+    parser.add_argument('--repeat', type=int, default=5, help="Best of this many strokes")
+    args = parser.parse_args()
+
+    logo = Image.open(args.logo)
+    logo.thumbnail((args.logo_size, args.logo_size), Image.LANCZOS)
+    base = Image.new('RGB', CANVAS_SIZE, (180, 230, 190))
+    drawPoint = ((CANVAS_SIZE[0] - logo.size[0]) // 2, (CANVAS_SIZE[1] - logo.size[1]) // 2)
+
+    print(f"{os.path.basename(args.logo)} at {logo.size[0]}x{logo.size[1]} on {CANVAS_SIZE[0]}x{CANVAS_SIZE[1]}, "
+          f"best of {args.repeat}")
+    print(f"{'size':>5} {'circle ms':>10} {'dilate ms':>10} {'speedup':>8} {'mse':>7} {'px >32':>7}")
+    for size in args.sizes:
+        strokeSpec = StrokeSpec(size, colorHex='222')
+        (circleTime, expected) = timeStroke(circleStroke, base, strokeSpec, drawPoint, logo, args.repeat)
+        (dilateTime, actual) = timeStroke(drawing.drawStroke, base, strokeSpec, drawPoint, logo, args.repeat)
+
+        expected = np.asarray(expected, dtype=np.int32)
+        actual = np.asarray(actual, dtype=np.int32)
+        mse = ((expected - actual) ** 2).sum() / (expected.shape[0] * expected.shape[1])
+        different = (np.abs(expected - actual).max(axis=2) > 32).sum()
+
+        print(f"{size:>5} {circleTime * 1000:>10.2f} {dilateTime * 1000:>10.2f} {circleTime / dilateTime:>7.1f}x "
+              f"{mse:>7.2f} {different:>7}")
+
+
+if __name__ == '__main__':
+    main()
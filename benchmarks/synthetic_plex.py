@@ -0,0 +1,123 @@
+"""Builds synthetic Plex library databases, and matching media trees, for benchmarks
+
+Only the tables (and columns) pdst reads are created, with the same definitions Plex uses.
+"""
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from pdst.db.PlexDao import PlexDao
+
+SCHEMA = [
+    """CREATE TABLE "metadata_items" ("id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, "library_section_id" integer,
+        "parent_id" integer, "metadata_type" integer, "guid" varchar(255), "media_item_count" integer,
+        "title" varchar(255), "title_sort" varchar(255), "summary" text, "index" integer, "duration" integer,
+        "user_thumb_url" varchar(255), "tags_genre" varchar(255), "originally_available_at" datetime,
+        "year" integer, "added_at" datetime, "created_at" datetime, "updated_at" datetime,
+        "extra_data" varchar(255), "hash" varchar(255))""",
+    """CREATE TABLE "media_items" ("id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, "library_section_id" integer,
+        "section_location_id" integer, "metadata_item_id" integer, "duration" integer, "created_at" datetime,
+        "updated_at" datetime, "extra_data" varchar(255))""",
+    """CREATE TABLE "media_parts" ("id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, "media_item_id" integer,
+        "directory_id" integer, "hash" varchar(255), "file" varchar(255), "size" integer(8), "duration" integer,
+        "created_at" datetime, "updated_at" datetime, "extra_data" varchar(255))""",
+    """CREATE TABLE "library_sections" ("id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, "name" varchar(255),
+        "section_type" integer)""",
+    """CREATE TABLE "section_locations" ("id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+        "library_section_id" integer, "root_path" varchar(255))""",
+    # Plex has these indexes, so lookups here should perform like they do against a real library
+    'CREATE INDEX "index_media_parts_on_file" ON "media_parts" ("file")',
+    'CREATE INDEX "index_media_parts_on_media_item_id" ON "media_parts" ("media_item_id")',
+    'CREATE INDEX "index_media_items_on_metadata_item_id" ON "media_items" ("metadata_item_id")',
+    'CREATE INDEX "index_metadata_items_on_parent_id" ON "metadata_items" ("parent_id")',
+]
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def createLibrary(libraryPath, shows=20, seasons=5, episodes=40, mediaRoot='/media/dvr', seed=1000):
+    """Creates a Plex library dir with a database of shows x seasons x episodes recordings
+
+    Returns the list of media file paths in the library, in insertion order
+    """
+    rng = random.Random(seed)
+    dbPath = os.path.join(libraryPath, PlexDao.PLEX_DB_PATH)
+    os.makedirs(os.path.dirname(dbPath), exist_ok=True)
+    if os.path.exists(dbPath):
+        os.remove(dbPath)
+
+    conn = sqlite3.connect(dbPath)
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+    conn.execute("INSERT INTO library_sections (id, name, section_type) VALUES (1, 'DVR', 2)")
+    conn.execute("INSERT INTO section_locations (id, library_section_id, root_path) VALUES (1, 1, ?)", [mediaRoot])
+
+    files = []
+    start = datetime(2020, 1, 1, 12)
+    for showNum in range(shows):
+        showTitle = f"Sport {showNum:03d} (2009)"
+        showId = insertMetadata(conn, None, 2, showTitle, None, start)
+
+        for seasonNum in range(seasons):
+            seasonIndex = 2020 + seasonNum
+            seasonId = insertMetadata(conn, showId, 3, None, seasonIndex, start)
+
+            for episodeNum in range(episodes):
+                aired = start + timedelta(days=seasonNum * 365 + episodeNum, hours=rng.randint(0, 10))
+                title = f"Team {rng.randint(0, 99):02d} vs. Team {rng.randint(0, 99):02d}"
+                episodeId = insertMetadata(conn, seasonId, 4, title, episodeNum + 1, aired)
+
+                path = os.path.join(mediaRoot, showTitle, f"Season {seasonIndex}",
+                                    f"{showTitle} - {aired.strftime('%Y-%m-%d %H %M %S')} - {title}.ts")
+                mediaItemId = conn.execute(
+                    "INSERT INTO media_items (library_section_id, section_location_id, metadata_item_id, duration, "
+                    "created_at, extra_data) VALUES (1, 1, ?, ?, ?, ?)",
+                    [episodeId, 7200000, aired.strftime(TIMESTAMP_FORMAT),
+                     f"mediaGrabBeginsAt={int(aired.timestamp())}"]).lastrowid
+                conn.execute(
+                    "INSERT INTO media_parts (media_item_id, file, size, duration, created_at) VALUES (?, ?, ?, ?, ?)",
+                    [mediaItemId, path, rng.randint(10 ** 9, 10 ** 10), 7200000, aired.strftime(TIMESTAMP_FORMAT)])
+                files.append(path)
+
+    conn.commit()
+    conn.close()
+    return files
+
+
+def createMediaTree(files, orphans=0.1, seed=1000):
+    """Creates the media files for a library made by createLibrary (whose mediaRoot must be a real, writable dir)
+
+    Each video gets a few bytes of content, so they stay cheap to create on tmpfs even for large libraries. A
+    fraction of the videos (`orphans`) also get a thumbnail and .metadata file left behind by an earlier recording
+    that has since been deleted, for `clean` to find. Returns the number of files created.
+    """
+    rng = random.Random(seed)
+    created = 0
+    for path in files:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'\x47' * 188)
+        created += 1
+
+        if rng.random() < orphans:
+            (root, ext) = os.path.splitext(path)
+            for orphanExt in ['png', 'metadata']:
+                with open(f"{root} (deleted).{orphanExt}", 'w') as f:
+                    f.write('orphan')
+                created += 1
+
+    return created
+
+
+def insertMetadata(conn, parentId, metadataType, title, index, when):
+    return conn.execute(
+        'INSERT INTO metadata_items (library_section_id, parent_id, metadata_type, guid, title, summary, "index", '
+        'duration, user_thumb_url, tags_genre, originally_available_at, year, added_at, created_at) '
+        'VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [parentId, metadataType, f"com.plexapp.agents.none://{metadataType}/{title}/{index}", title,
+         f"Summary of {title}", index, 7200000 if metadataType == 4 else None,
+         f"metadata://posters/synthetic_{metadataType}_{index}" if metadataType != 4 else None, 'Sport|Synthetic',
+         when.strftime(TIMESTAMP_FORMAT), when.year, when.strftime(TIMESTAMP_FORMAT),
+         when.strftime(TIMESTAMP_FORMAT)]).lastrowid
@@ -0,0 +1,225 @@
+import atexit
+import collections
+import logging
+import os
+import threading
+
+import simplejson as json
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+# images larger than this are downscaled before their colors are clustered. Defined here rather than in analysis
+# (which uses it too) so that reading the config doesn't have to import numpy and scipy
+DEFAULT_MAX_PIXELS = 250000
+# the cache is capped by entry count rather than bytes: an entry is a path and a handful of colors (~300 bytes of
+# JSON), so 5000 entries keeps the file to around 1.5MB
+DEFAULT_MAX_ENTRIES = 5000
+# write the cache out after this many new analyses, so long-running commands (e.g. watch) don't lose everything
+SAVE_EVERY = 25
+
+_default = None
+_defaultLock = threading.Lock()
+
+
+def defaultCacheFile():
+    cacheHome = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cacheHome, 'pdst', 'color-cache.json')
+
+
+class ColorCache:
+    """LRU cache of image color analysis results, optionally persisted to a JSON file
+
+    Entries are keyed by the image's real path and are only used while the file's size and mtime are unchanged.
+    Each entry holds the (ordered colors, percentages) result of analysis.getAllColors, separately for with and
+    without black & white. Results from a different maxPixels sampling budget are treated as stale.
+    """
+
+    def __init__(self, cacheFile=None, maxEntries=DEFAULT_MAX_ENTRIES, maxPixels=DEFAULT_MAX_PIXELS):
+        self.cacheFile = cacheFile
+        self.maxEntries = maxEntries
+        self.maxPixels = maxPixels
+        self.entries = collections.OrderedDict()
+        self.unsaved = 0
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+        if cacheFile is not None:
+            self.load()
+            atexit.register(self.save)
+
+    def load(self):
+        try:
+            with open(self.cacheFile) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            log.warning(f"Unable to read color cache {self.cacheFile}, starting fresh: {e}")
+            return False
+
+        if data.get('version') != CACHE_VERSION:
+            return False
+
+        with self.lock:
+            self.entries = collections.OrderedDict((path, entry) for path, entry in data.get('entries', []))
+            self.__evict()
+        return True
+
+    def save(self):
+        """Writes the cache to its file, if it has one and anything has changed"""
+        if self.cacheFile is None:
+            return False
+
+        with self.lock:
+            if self.unsaved == 0:
+                return False
+
+            data = {'version': CACHE_VERSION, 'entries': list(self.entries.items())}
+            tmpFile = f"{self.cacheFile}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.cacheFile), exist_ok=True)
+                with open(tmpFile, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmpFile, self.cacheFile)
+            except OSError as e:
+                log.warning(f"Unable to write color cache {self.cacheFile}: {e}")
+                return False
+
+            self.unsaved = 0
+        return True
+
+    def getAllColors(self, imagePath, noBlackWhite=False):
+        """Returns (ordered colors, percentages) for the image, analyzing it only if there is no valid cache entry"""
+        from pdst import analysis
+
+        cached = self.lookup(imagePath, noBlackWhite)
+        if cached is not None:
+            return cached
+
+        (colors, percents) = analysis.getAllColors(imagePath, noBlackWhite, maxPixels=self.maxPixels)
+        self.store(imagePath, noBlackWhite, colors, percents)
+
+        return list(colors), list(percents)
+
+    def getDominantColor(self, imagePath, noBlackWhite=False):
+        """Returns the dominant color of the image, analyzing it only if there is no valid cache entry"""
+        from pdst import analysis
+
+        cached = self.lookupDominant(imagePath, noBlackWhite)
+        if cached is not None:
+            return cached
+
+        color = analysis.getDominantColor(imagePath, noBlackWhite, maxPixels=self.maxPixels)
+        self.storeDominant(imagePath, noBlackWhite, color)
+
+        return color
+
+    def lookup(self, imagePath, noBlackWhite=False):
+        """Returns the cached (ordered colors, percentages) for the image, or None if there is no valid entry"""
+        cached = self.__lookup(imagePath, 'noBW' if noBlackWhite else 'all')
+        if cached is None:
+            return None
+
+        (colors, percents) = cached
+        return list(colors), list(percents)
+
+    def lookupDominant(self, imagePath, noBlackWhite=False):
+        """Returns the cached dominant color of the image, or None if there is no valid entry"""
+        return self.__lookup(imagePath, 'dominantNoBW' if noBlackWhite else 'dominant')
+
+    def store(self, imagePath, noBlackWhite, colors, percents):
+        """Records an analysis result for the image (e.g. one computed in another process)"""
+        self.__store(imagePath, 'noBW' if noBlackWhite else 'all', [list(colors), [int(p) for p in percents]])
+
+    def storeDominant(self, imagePath, noBlackWhite, color):
+        """Records the dominant color of the image, as store"""
+        self.__store(imagePath, 'dominantNoBW' if noBlackWhite else 'dominant', color)
+
+    def __lookup(self, imagePath, variant):
+        signature = self.__signature(imagePath)
+        if signature is None:
+            return None
+
+        (key, size, mtime) = signature
+        with self.lock:
+            entry = self.entries.get(key)
+            if self.__isCurrent(entry, size, mtime) and variant in entry['colors']:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry['colors'][variant]
+
+        self.misses += 1
+        return None
+
+    def __store(self, imagePath, variant, value):
+        signature = self.__signature(imagePath)
+        if signature is None:
+            return
+
+        (key, size, mtime) = signature
+        with self.lock:
+            entry = self.entries.get(key)
+            if not self.__isCurrent(entry, size, mtime):
+                entry = {'size': size, 'mtime': mtime, 'maxPixels': self.maxPixels, 'colors': {}}
+                self.entries[key] = entry
+            entry['colors'][variant] = value
+            self.entries.move_to_end(key)
+            self.__evict()
+
+            self.unsaved += 1
+            if self.unsaved >= SAVE_EVERY:
+                self.save()
+
+    def __isCurrent(self, entry, size, mtime):
+        return entry is not None and entry['size'] == size and entry['mtime'] == mtime \
+            and entry.get('maxPixels') == self.maxPixels
+
+    def __evict(self):
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def __signature(imagePath):
+        if imagePath is None:
+            return None
+
+        try:
+            stat = os.stat(imagePath)
+        except (OSError, TypeError, ValueError):
+            return None
+
+        return os.path.realpath(imagePath), stat.st_size, stat.st_mtime_ns
+
+
+def configure(cacheFile, maxEntries=DEFAULT_MAX_ENTRIES, maxPixels=DEFAULT_MAX_PIXELS):
+    """Sets up the process-wide color cache. A cacheFile of None keeps the cache in memory only"""
+    global _default
+    with _defaultLock:
+        if _default is not None:
+            _default.save()
+        _default = ColorCache(cacheFile, maxEntries, maxPixels)
+
+    return _default
+
+
+def getDefault():
+    """Returns the process-wide color cache, an in-memory one if it hasn't been configured"""
+    global _default
+    with _defaultLock:
+        if _default is None:
+            _default = ColorCache()
+
+    return _default
+
+
+def getAllColors(imagePath, noBlackWhite=False):
+    """Cached equivalent of analysis.getAllColors, this is what everything should call"""
+    return getDefault().getAllColors(imagePath, noBlackWhite)
+
+
+def getDominantColor(imagePath, noBlackWhite=False):
+    """Cached equivalent of analysis.getDominantColor"""
+    return getDefault().getDominantColor(imagePath, noBlackWhite)
@@ -5,13 +5,17 @@ import re
 from enum import Enum, auto
 
 import simplejson as json
-from fuzzywuzzy import fuzz
 
+from pdst import ColorCache, RenderCache
+from pdst.image import LogoCache
 from pdst.db.PlexDao import PlexDao
 from pdst.parsing import convertSpacesToRegex
 
 log = logging.getLogger(__name__)
 
+# backreferences are numbered per pattern, so patterns that use them can't be joined into one alternation
+BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+
 
 class Config:
 
@@ -46,6 +50,28 @@ class Config:
         os.umask(self.umask)
 
         self.preventSimilarColors = self.__getConfigOrDefault('preventSimilarColors', True)
+        self.saveLogoIndex = self.__getConfigOrDefault('saveLogoIndex', False)
+        self.compositingBackend = self.__getConfigOrDefault('compositingBackend', 'pil').lower()
+
+        colorCache = self.__getConfigOrDefault('colorCache', False)
+        if colorCache is True:
+            colorCache = ColorCache.defaultCacheFile()
+        self.colorCacheFile = colorCache if colorCache else None
+        self.colorCacheSize = self.__getConfigOrDefault('colorCacheSize', ColorCache.DEFAULT_MAX_ENTRIES)
+        self.colorAnalysisMaxPixels = self.__getConfigOrDefault('colorAnalysisMaxPixels',
+                                                                ColorCache.DEFAULT_MAX_PIXELS)
+
+        renderCache = self.__getConfigOrDefault('renderCache', False)
+        if renderCache is True:
+            renderCache = RenderCache.defaultCacheDir()
+        self.renderCacheDir = renderCache if renderCache else None
+        self.renderCacheSize = self.__getConfigOrDefault('renderCacheSize', RenderCache.DEFAULT_MAX_MEGABYTES)
+
+        logoCache = self.__getConfigOrDefault('logoCache', False)
+        if logoCache is True:
+            logoCache = LogoCache.defaultCacheDir()
+        self.logoCacheDir = logoCache if logoCache else None
+        self.logoCacheSize = self.__getConfigOrDefault('logoCacheSize', LogoCache.DEFAULT_MAX_MEGABYTES)
 
     def __getConfigOrDefault(self, configKey, default):
         if self.rawConfig is not None and configKey in self.rawConfig:
@@ -85,6 +111,7 @@ class SportConfigEntry:
         self.background = sportEntry['background'] if 'background' in sportEntry else None
 
         self.__processMatches()
+        self.nameCounts = collections.Counter(self.name)
 
     def __processMatches(self):
         """Process the ingested matches to add whitespace/separator handling regexes"""
@@ -96,6 +123,8 @@ class SportConfigEntry:
         self.matches = processed
 
     def matchFor(self, searchStr):
+        from fuzzywuzzy import fuzz
+
         log.debug(f"[{self.name}] Trying to get a match for {searchStr}")
         bestMatch = None
         bestScore = 0
@@ -115,7 +144,26 @@ class SportConfigEntry:
         log.debug(f"Best we could find was ({bestMatch}, {bestScore})")
         return bestMatch, bestScore
 
+    def couldScoreAbove(self, searchStr, score):
+        """Cheap check for whether matchFor could return a score higher than the given one
+
+        Entries with matches are decided by their regexes, which score 100 whenever they hit. Entries without are
+        fuzzy matched on the name: partial_ratio compares the shorter string (length n) with a window of the longer
+        one no longer than it, so with c characters in common it can't score better than 2c / (n + c).
+        """
+        if len(self.matches) > 0:
+            return True
+
+        shorter = min(len(searchStr), len(self.name))
+        if shorter == 0:
+            return False
+
+        common = sum((collections.Counter(searchStr) & self.nameCounts).values())
+        return common * 200 > score * (shorter + common)
+
     def matchObjectFor(self, searchStr):
+        from fuzzywuzzy import fuzz
+
         log.debug(f"Trying to get match object for {searchStr}")
         bestMatchEntry = None
         bestScore = 0
@@ -176,11 +224,18 @@ class SportMatchEntry:
         else:
             self.matchRegex = convertSpacesToRegex(configEntry)
 
+        self.pattern = re.compile(self.matchRegex, re.IGNORECASE) if self.matchRegex is not None else None
+
     def getMatchScore(self, matchAgainst):
+        from fuzzywuzzy import fuzz
+
         score = 0
         matchStr = None
 
-        match = re.search(rf"{self.matchRegex}", matchAgainst, re.IGNORECASE)
+        if self.pattern is None:
+            return matchStr, score
+
+        match = self.pattern.search(matchAgainst)
         log.debug(f"regex matched {match} from {self.matchRegex}")
         if match is not None:
             matchStr = match[0]
@@ -188,3 +243,16 @@ class SportMatchEntry:
             log.debug(f" ^ scored {score}")
 
         return matchStr, score
+
+
+def combinedPattern(matchEntries):
+    """One case-insensitive alternation of all the entries' regexes, which finds whether any of them match in a
+    single scan. Returns None if they can't be combined (e.g. they use backreferences or inline flags)"""
+    regexes = [entry.matchRegex for entry in matchEntries if entry.pattern is not None]
+    if len(regexes) == 0 or any(BACKREFERENCE.search(regex) for regex in regexes):
+        return None
+
+    try:
+        return re.compile('|'.join(f"(?:{regex})" for regex in regexes), re.IGNORECASE)
+    except re.error:
+        return None
@@ -1,21 +1,151 @@
 from datetime import datetime
+import collections
 import logging
 import os
+import sqlite3
+import threading
 
-from pdst import filetools
+from pdst import filetools, parsing
 from pdst.Config import DateOverrideMode
 from pdst.db.metadata import EpisodeMetadata
+from pdst.util import removeNones
 
 log = logging.getLogger(__name__)
 
+DEFAULT_CACHE_SIZE = 1024
+
+
+def fileVersion(path):
+    """(size, mtime) of the file, or None if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class EpisodeContext:
+    """Everything worked out about a single video file, each part resolved at most once, when it's first needed
+
+    Made for each file being processed, and handed to everything that needs the file's sport, metadata, etc.
+    """
+
+    def __init__(self, filePath, metadataService, sportService):
+        self.filePath = filePath
+        self.metadataService = metadataService
+        self.sportService = sportService
+        self.__resolved = {}
+
+    def __get(self, name, resolve):
+        if name not in self.__resolved:
+            self.__resolved[name] = resolve()
+        return self.__resolved[name]
+
+    @property
+    def sportEntry(self):
+        """The sport entry matching the file path"""
+        return self.__get('sportEntry', lambda: self.sportService.getSportFor(self.filePath))
+
+    @property
+    def matchEntry(self):
+        """The sport entry's match entry for the file path"""
+        def resolve():
+            sportEntry = self.sportEntry
+            return sportEntry.matchObjectFor(self.filePath)[0] if sportEntry is not None else None
+
+        return self.__get('matchEntry', resolve)
+
+    @property
+    def metadata(self):
+        return self.__get('metadata', lambda: self.metadataService.getMetadataForEpisodeFile(self.filePath,
+                                                                                             context=self))
+
+    @property
+    def teamNames(self):
+        """The (up to two) team names in the filename"""
+        return self.__get('teamNames', lambda: removeNones(
+            list(parsing.teamNamesFromFilename(os.path.basename(self.filePath)))))
+
+    @property
+    def title(self):
+        """The event title from the filename"""
+        return self.__get('title', lambda: parsing.titleFromFilename(self.filePath))
+
 
 class MetadataService:
 
-    def __init__(self, plexDao, sportService):
+    def __init__(self, plexDao, sportService, cacheSize=DEFAULT_CACHE_SIZE):
         self.plexDao = plexDao
         self.sportService = sportService
 
-    def getMetadataForEpisodeFile(self, filePath, readFromFile=True):
+        # (path, readFromFile, video version, .metadata version) -> EpisodeMetadata, most recently used last
+        self.cache = collections.OrderedDict()
+        self.cacheSize = cacheSize
+        self.cacheLock = threading.Lock()
+
+    def getContext(self, filePath):
+        """Returns a new EpisodeContext for the file"""
+        return EpisodeContext(filePath, self, self.sportService)
+
+    def prefetchDirectory(self, dirPath, recursive=True):
+        """Loads the DB metadata for every file under the directory in one go, so the per-file lookups that follow
+        don't each query the DB. Returns the number of files found"""
+        return self.__prefetch(dirPath, lambda: self.plexDao.prefetchDirectory(dirPath, recursive))
+
+    def prefetchFiles(self, filePaths):
+        """Loads the DB metadata for the given files in one go, as prefetchDirectory"""
+        return self.__prefetch(f"{len(filePaths)} files", lambda: self.plexDao.prefetchFiles(filePaths))
+
+    def prefetchSections(self, sectionIds):
+        """Loads the DB metadata for every episode in the given library sections, as prefetchDirectory"""
+        sectionIds = sorted(sectionIds)
+        return self.__prefetch(f"library sections {sectionIds}",
+                               lambda: [f for sectionId in sectionIds for f in self.plexDao.loadSection(sectionId)])
+
+    @staticmethod
+    def __prefetch(description, load):
+        try:
+            found = load()
+        except sqlite3.Error as e:
+            # not fatal, the per-file lookups will hit (and report) the same problem if they actually need the DB
+            log.debug(f"Unable to prefetch metadata for {description}: {e}")
+            return 0
+
+        log.debug(f"Prefetched DB metadata for {len(found)} files ({description})")
+        return len(found)
+
+    def getMetadataForEpisodeFile(self, filePath, readFromFile=True, context=None):
+        """Returns the metadata for the video, from its .metadata file (if readFromFile and it has one) or the DB
+
+        Results are cached until the video or its .metadata file changes. Every call gets its own copy, which the
+        caller is free to change. context is the file's EpisodeContext, if it has one, so a sport entry it has already
+        worked out for the file path isn't worked out again.
+        """
+        key = self.__cacheKey(filePath, readFromFile)
+        with self.cacheLock:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache.move_to_end(key)
+
+        if cached is not None:
+            log.debug(f"Using cached metadata for {filePath}")
+            return cached.copy()
+
+        metadata = self.__resolveMetadata(filePath, readFromFile, context)
+        if metadata is not None:
+            with self.cacheLock:
+                self.cache[key] = metadata.copy()
+                while len(self.cache) > self.cacheSize:
+                    self.cache.popitem(last=False)
+
+        return metadata
+
+    @staticmethod
+    def __cacheKey(filePath, readFromFile):
+        metadataVersion = fileVersion(filetools.getMetadataFilename(filePath)) if readFromFile else None
+        return filePath, readFromFile, fileVersion(filePath), metadataVersion
+
+    def __resolveMetadata(self, filePath, readFromFile, context):
         log.debug(f"Getting Metadata for {filePath}")
 
         if readFromFile:
@@ -49,7 +179,10 @@ class MetadataService:
         else:
             searchString = metadata.show.title
 
-        sportEntry = self.sportService.getSportFor(searchString)
+        if context is not None and searchString == context.filePath:
+            sportEntry = context.sportEntry
+        else:
+            sportEntry = self.sportService.getSportFor(searchString)
 
         if sportEntry is not None:
             log.debug(f"Sport Config Entry: {sportEntry.name}")
@@ -65,7 +198,10 @@ class MetadataService:
                 newShow = sportOverrideShow if isinstance(sportOverrideShow, str) else sportEntry.name
                 metadata.show.title = newShow
 
-            match, score = sportEntry.matchObjectFor(searchString)
+            if context is not None and searchString == context.filePath:
+                match = context.matchEntry
+            else:
+                match, score = sportEntry.matchObjectFor(searchString)
             log.debug(f"Match entry: {match}")
             if match is not None and match.overrideShow:
                 newShow = match.overrideShow if isinstance(match.overrideShow, str) else sportEntry.name
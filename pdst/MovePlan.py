@@ -0,0 +1,239 @@
+import collections
+import logging
+import os
+import threading
+
+import simplejson as json
+
+from pdst import filetools
+
+log = logging.getLogger(__name__)
+
+JOURNAL_VERSION = 1
+
+MKDIR = 'mkdir'
+COPY = 'copy'
+MOVE = 'move'
+
+
+class MoveOperation:
+    """A single step of a move: creating a directory, copying a show poster, or moving one of a video's files"""
+
+    def __init__(self, kind, dst, src=None, video=None):
+        self.kind = kind
+        self.dst = dst
+        self.src = src
+        self.video = video
+
+    def toJson(self):
+        return {'op': self.kind, 'dst': self.dst, 'src': self.src, 'video': self.video}
+
+    @staticmethod
+    def fromJson(data):
+        return MoveOperation(data['op'], data['dst'], src=data.get('src'), video=data.get('video'))
+
+    def isDone(self):
+        """Whether this has already happened, e.g. before a run that was interrupted part way through it"""
+        if self.kind == MKDIR:
+            return os.path.isdir(self.dst)
+        if self.kind == COPY:
+            return os.path.exists(self.dst)
+
+        return not os.path.lexists(self.src) and os.path.lexists(self.dst)
+
+    def run(self, ctx):
+        if self.kind == MKDIR:
+            ctx.vlog(f"Creating destination directories: {self.dst}")
+            os.makedirs(self.dst, exist_ok=True)
+
+        elif self.kind == COPY:
+            ctx.vlog(f"Copying 'old' library show poster: {self.src}")
+            filetools.copyFile(self.src, self.dst)
+
+        else:
+            if filetools.moveFile(self.src, self.dst):
+                ctx.vlog(f"{self.src} -> {self.dst} (copied across filesystems)")
+            else:
+                ctx.vlog(f"{self.src} -> {self.dst}")
+
+    def __str__(self):
+        if self.kind == MKDIR:
+            return f"mkdir {self.dst}"
+        return f"{self.kind} {self.src} -> {self.dst}"
+
+
+class MovePlan:
+    """Everything a move will do, worked out up front: the directories to create, show posters to copy, and the
+    files to move, grouped by the video they belong to"""
+
+    def __init__(self, resuming=False):
+        self.operations = []
+        self.dirs = set()
+        self.posters = set()
+        # a plan picked up from an interrupted run, where some operations may have already happened
+        self.resuming = resuming
+        self.__videos = None
+
+    def add(self, operation):
+        if operation.kind == MKDIR:
+            if operation.dst in self.dirs:
+                return
+            self.dirs.add(operation.dst)
+        elif operation.kind == COPY:
+            if operation.dst in self.posters:
+                return
+            self.posters.add(operation.dst)
+
+        self.operations.append(operation)
+        self.__videos = None
+
+    def getVideos(self):
+        """Video path -> its MOVE operations, in the order the videos were planned"""
+        if self.__videos is None:
+            videos = collections.OrderedDict()
+            for operation in self.operations:
+                if operation.kind == MOVE:
+                    videos.setdefault(operation.video, []).append(operation)
+            self.__videos = videos
+        return self.__videos
+
+    def getSetup(self):
+        """The MKDIR and COPY operations, which have to happen before any files are moved"""
+        return [op for op in self.operations if op.kind != MOVE]
+
+    def __len__(self):
+        return len(self.operations)
+
+
+class MovePlanner:
+    """Works out the operations needed to move videos (and their associated files) into the target library"""
+
+    def __init__(self, ctx, plan):
+        self.ctx = ctx
+        self.plan = plan
+        self.destinationIndex = ctx.destinationIndex if ctx.destinationIndex is not None \
+            else filetools.DestinationIndex()
+
+    def planVideo(self, ctx, videoPath):
+        """Adds the operations for one video to the plan. Returns False if it can't be moved"""
+        ctx.vlog(f"Moving {videoPath} and associated files...")
+        metadata = ctx.metadataService.getMetadataForEpisodeFile(videoPath)
+
+        if metadata is None:
+            ctx.log(f"NO metadata found for {videoPath}! Not Moving", err=True)
+            return False
+
+        newRootPath = ctx.config.moveTarget
+        newShowDirName = metadata.show.title
+        newSeasonDirName = f"Season {metadata.season.index}"
+        destinationDir = os.path.join(newRootPath, newShowDirName, newSeasonDirName)
+
+        if not os.path.exists(destinationDir):
+            self.plan.add(MoveOperation(MKDIR, destinationDir))
+
+        showPosterFile = os.path.join(newRootPath, newShowDirName, 'poster.jpg')
+        if showPosterFile not in self.plan.posters and not os.path.exists(showPosterFile):
+            ctx.vlog(f"Destination show does not have an existing poster")
+            existingThumb = os.path.join(ctx.config.plexLibPath, filetools.getRealThumbPath(metadata.show))
+            if os.path.exists(existingThumb):
+                self.plan.add(MoveOperation(COPY, showPosterFile, src=existingThumb))
+            else:
+                ctx.vlog(f"{existingThumb} doesn't seem to exist?")
+
+        renamed = filetools.getMoveDestinationFilename(videoPath, metadata, destinationDir, self.destinationIndex)
+        for filePath in sorted(filetools.getPlexAssociatedFiles(videoPath)):
+            thisExt = os.path.splitext(filePath)[1]
+            if thisExt[1:] not in ctx.skipExt:
+                newPath = os.path.join(destinationDir, renamed + thisExt)
+                self.plan.add(MoveOperation(MOVE, newPath, src=filePath, video=videoPath))
+            else:
+                ctx.vlog(f"Skipping {filePath}")
+
+        return True
+
+
+class MoveJournal:
+    """Records a plan and its progress in a JSON lines file, so an interrupted move can be picked up again
+
+    The first line holds the plan's operations, each later line the index of one that has finished. The file is
+    removed once everything in the plan is done.
+    """
+
+    def __init__(self, journalFile):
+        self.journalFile = journalFile
+        self.operations = []
+        self.indexes = {}
+        self.done = set()
+        self.lock = threading.Lock()
+        self.out = None
+
+    def load(self):
+        """Reads a previous run's plan, returning the operations it didn't finish (empty if there is nothing to
+        resume)"""
+        try:
+            with open(self.journalFile) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return []
+        except OSError as e:
+            log.warning(f"Unable to read move journal {self.journalFile}: {e}")
+            return []
+
+        try:
+            header = json.loads(lines[0])
+            if header.get('version') != JOURNAL_VERSION:
+                return []
+            operations = [MoveOperation.fromJson(op) for op in header['operations']]
+        except (IndexError, KeyError, ValueError) as e:
+            log.warning(f"Unable to read move journal {self.journalFile}: {e}")
+            return []
+
+        done = set()
+        for line in lines[1:]:
+            try:
+                done.add(json.loads(line)['done'])
+            except (KeyError, ValueError):
+                # cut short by whatever interrupted the run
+                continue
+
+        return [op for i, op in enumerate(operations) if i not in done]
+
+    def start(self, plan):
+        self.close()
+        self.operations = list(plan.operations)
+        self.indexes = {id(op): i for i, op in enumerate(self.operations)}
+        self.done = set()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.journalFile)), exist_ok=True)
+        self.out = open(self.journalFile, 'w', buffering=1)
+        self.out.write(json.dumps({'version': JOURNAL_VERSION,
+                                   'operations': [op.toJson() for op in self.operations]}) + '\n')
+        self.out.flush()
+
+    def markDone(self, operations):
+        with self.lock:
+            for operation in operations:
+                index = self.indexes[id(operation)]
+                self.done.add(index)
+                self.out.write(json.dumps({'done': index}) + '\n')
+
+    def finish(self):
+        """Closes the journal, removing it if the plan was completed"""
+        complete = len(self.done) == len(self.operations)
+        self.close()
+        if complete and os.path.exists(self.journalFile):
+            os.remove(self.journalFile)
+        return complete
+
+    def close(self):
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+
+def runOperations(ctx, operations, resuming=False):
+    for operation in operations:
+        if resuming and operation.isDone():
+            ctx.vlog(f"Already done: {operation}")
+            continue
+        operation.run(ctx)
@@ -0,0 +1,232 @@
+import collections
+import hashlib
+import logging
+import os
+import threading
+
+import simplejson as json
+
+from pdst import filetools
+from pdst.__version__ import __version__
+
+log = logging.getLogger(__name__)
+
+# bump whenever a change to the rendering code changes the images it produces, so older renders aren't reused
+CACHE_VERSION = 4
+DEFAULT_MAX_MEGABYTES = 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def defaultCacheDir():
+    cacheHome = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cacheHome, 'pdst', 'renders')
+
+
+def _tempPath(path):
+    """A name next to path to write to before replacing it, keeping the extension so PIL knows the format"""
+    (root, ext) = os.path.splitext(path)
+    return f"{root}.{os.getpid()}-{threading.get_ident()}.tmp{ext}"
+
+
+def _linkOrCopy(src, dst):
+    """Puts src at dst, as a hardlink where possible. dst is replaced, never written through, since it may itself be
+    a hardlink to a cache entry or another output"""
+    tmpPath = _tempPath(dst)
+    try:
+        try:
+            os.link(src, tmpPath)
+        except OSError:
+            # a different filesystem, or one without hardlinks
+            filetools.copyFile(src, tmpPath)
+        os.replace(tmpPath, dst)
+    except BaseException:
+        if os.path.lexists(tmpPath):
+            os.remove(tmpPath)
+        raise
+
+
+def saveImage(image, path):
+    """Saves the image to path by writing a new file and renaming it into place
+
+    Saving straight to an existing path writes through to its inode, which would also change every cache entry and
+    output hardlinked to it.
+    """
+    tmpPath = _tempPath(path)
+    try:
+        image.save(tmpPath)
+        os.replace(tmpPath, path)
+    except BaseException:
+        if os.path.lexists(tmpPath):
+            os.remove(tmpPath)
+        raise
+
+
+class RenderCache:
+    """Directory of rendered images, keyed by a hash of everything that goes into rendering them
+
+    The key covers the contents and names of the source images, the resolved ImageSpecs, the CompositeSpec, the
+    config settings the renderer uses, and the pdst version, so an entry can be reused for any output with the same
+    inputs. Hits are hardlinked (or copied, across filesystems) into place. The least recently used entries are
+    removed once the directory grows past maxBytes.
+    """
+
+    def __init__(self, cacheDir, maxBytes=DEFAULT_MAX_MEGABYTES * 1024 * 1024):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        # entry name -> size, least recently used first
+        self.entries = collections.OrderedDict()
+        self.totalBytes = 0
+        self.lock = threading.RLock()
+        # (real path, size, mtime) -> content hash of the source images
+        self.digests = {}
+
+        self.hits = 0
+        self.misses = 0
+
+        self.scan()
+
+    def scan(self):
+        """Reads the existing entries, oldest first"""
+        found = []
+        try:
+            with os.scandir(self.cacheDir) as shards:
+                for shard in shards:
+                    if not shard.is_dir(follow_symlinks=False):
+                        continue
+                    with os.scandir(shard.path) as files:
+                        for entry in files:
+                            if '.tmp' in entry.name or not entry.is_file(follow_symlinks=False):
+                                continue
+                            stat = entry.stat(follow_symlinks=False)
+                            found.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning(f"Unable to read render cache {self.cacheDir}: {e}")
+
+        with self.lock:
+            self.entries = collections.OrderedDict((name, size) for (mtime, name, size) in sorted(found))
+            self.totalBytes = sum(self.entries.values())
+            self.__evict()
+
+    def keyFor(self, compositeSpec, imageSpecs, config, extension):
+        """Returns the cache key for rendering the specs to an image with the given extension, or None if one of the
+        source images can't be read (in which case the render shouldn't be cached)"""
+        images = []
+        for spec in imageSpecs:
+            digest = self.__fileDigest(spec.imageFile)
+            if digest is None:
+                return None
+            images.append({
+                'file': digest,
+                # filename hints are read from the name when rendering
+                'name': os.path.basename(spec.imageFile),
+                'isLogo': spec.isLogo,
+                'colors': spec.colors,
+                'bg': spec.bg,
+                'invert': spec.invert,
+                'stroke': None if spec.strokeSpec is None else [spec.strokeSpec.size, spec.strokeSpec.colorHex,
+                                                                spec.strokeSpec.color, spec.strokeSpec.opacity],
+                'mask': None if spec.maskSpec is None else [spec.maskSpec.colorHex, spec.maskSpec.color,
+                                                            spec.maskSpec.opacity],
+            })
+
+        inputs = {
+            'version': CACHE_VERSION,
+            'pdst': __version__,
+            'size': list(compositeSpec.size),
+            'text': compositeSpec.text,
+            'fallbackColor': config.fallbackColor,
+            'preventSimilarColors': bool(config.preventSimilarColors),
+            # logos are analyzed for other colors during the render when theirs are too similar
+            'colorAnalysisMaxPixels': config.colorAnalysisMaxPixels,
+            'compositingBackend': config.compositingBackend,
+            'extension': extension.lower(),
+            'images': images,
+        }
+        canonical = json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest() + '.' + extension.lower()
+
+    def place(self, key, destPath):
+        """Puts the cached render for key at destPath, returning False (a miss) if there isn't one"""
+        entryPath = self.__entryPath(key)
+        try:
+            if not (os.path.exists(destPath) and os.path.samefile(entryPath, destPath)):
+                _linkOrCopy(entryPath, destPath)
+            # the mtime is what orders entries for eviction, across runs
+            os.utime(entryPath)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+                self.__forget(key)
+            return False
+
+        with self.lock:
+            self.hits += 1
+            if key in self.entries:
+                self.entries.move_to_end(key)
+        return True
+
+    def store(self, key, image, destPath):
+        """Saves a freshly rendered image to destPath, and keeps it in the cache under key"""
+        saveImage(image, destPath)
+
+        entryPath = self.__entryPath(key)
+        try:
+            os.makedirs(os.path.dirname(entryPath), exist_ok=True)
+            _linkOrCopy(destPath, entryPath)
+            size = os.path.getsize(entryPath)
+        except OSError as e:
+            log.warning(f"Unable to add {destPath} to the render cache: {e}")
+            return
+
+        with self.lock:
+            self.__forget(key)
+            self.entries[key] = size
+            self.totalBytes += size
+            self.__evict()
+
+    def __entryPath(self, key):
+        return os.path.join(self.cacheDir, key[:2], key)
+
+    def __forget(self, key):
+        size = self.entries.pop(key, None)
+        if size is not None:
+            self.totalBytes -= size
+
+    def __evict(self):
+        while self.totalBytes > self.maxBytes and len(self.entries) > 0:
+            (key, size) = self.entries.popitem(last=False)
+            self.totalBytes -= size
+            try:
+                os.remove(self.__entryPath(key))
+            except FileNotFoundError:
+                # already evicted by another process sharing the cache
+                pass
+            except OSError as e:
+                log.warning(f"Unable to remove render cache entry {key}: {e}")
+
+    def __fileDigest(self, imageFile):
+        if imageFile is None:
+            return None
+
+        try:
+            realPath = os.path.realpath(imageFile)
+            stat = os.stat(realPath)
+        except (OSError, TypeError, ValueError):
+            return None
+
+        signature = (realPath, stat.st_size, stat.st_mtime_ns)
+        digest = self.digests.get(signature)
+        if digest is None:
+            sha = hashlib.sha256()
+            try:
+                with open(realPath, 'rb') as f:
+                    for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                        sha.update(chunk)
+            except OSError:
+                return None
+            digest = sha.hexdigest()
+            self.digests[signature] = digest
+
+        return digest
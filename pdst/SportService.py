@@ -1,12 +1,26 @@
+import collections
 import logging
+import threading
+
+from pdst.Config import combinedPattern
 
 log = logging.getLogger(__name__)
 
+MIN_SCORE = 60
+PERFECT_SCORE = 100
+DEFAULT_MEMO_SIZE = 4096
+
 
 class SportService:
 
-    def __init__(self, config):
+    def __init__(self, config, memoSize=DEFAULT_MEMO_SIZE):
         self.sports = config.sports if config is not None else []
+        # finds whether any sport's regexes match at all, so a miss skips every regex-matched sport at once
+        self.anyMatchPattern = combinedPattern([match for sport in self.sports for match in sport.matches])
+
+        self.memoSize = memoSize
+        self.memo = collections.OrderedDict()
+        self.memoLock = threading.Lock()
 
     def getSportFor(self, inStr):
         log.debug(f"Getting sport for {inStr}")
@@ -14,11 +28,36 @@ class SportService:
         if inStr is None:
             return None
 
+        with self.memoLock:
+            if inStr in self.memo:
+                self.memo.move_to_end(inStr)
+                return self.memo[inStr]
+
+        sport = self.__findSport(inStr)
+
+        with self.memoLock:
+            self.memo[inStr] = sport
+            while len(self.memo) > self.memoSize:
+                self.memo.popitem(last=False)
+
+        return sport
+
+    def __findSport(self, inStr):
+        regexesMatch = self.anyMatchPattern is None or self.anyMatchPattern.search(inStr) is not None
+
         sportMatches = {}
         bestMatch = None
         bestScore = 0
 
         for sport in self.sports:
+            # the first sport to score highest wins, so nothing after a perfect score can replace it
+            if bestScore >= PERFECT_SCORE:
+                break
+            if len(sport.matches) > 0 and not regexesMatch:
+                continue
+            if not sport.couldScoreAbove(inStr, max(bestScore, MIN_SCORE)):
+                continue
+
             (match, score) = sport.matchFor(inStr)
             sportMatches[sport.name] = (match, score)
             if score > bestScore:
@@ -31,4 +70,4 @@ class SportService:
             log.debug(sportMatches)
             log.debug(f"Best is {bestMatch.name} ({bestScore})")
 
-        return bestMatch if bestScore > 60 else None
+        return bestMatch if bestScore > MIN_SCORE else None
@@ -1,6 +1,7 @@
 import binascii
 import logging
 import warnings
+from math import sqrt
 
 import numpy
 import numpy as np
@@ -9,6 +10,8 @@ import scipy.cluster
 import scipy.misc
 from PIL import Image
 
+from pdst.ColorCache import DEFAULT_MAX_PIXELS
+
 log = logging.getLogger(__name__)
 
 
@@ -50,7 +53,13 @@ def codeToIntArray(byteArr):
     return [round(c) for c in byteArr]
 
 
-def getColorCounts(filename):
+def getColorCounts(filename, maxPixels=DEFAULT_MAX_PIXELS):
+    """Clusters the colors of the image, returning the cluster colors and how many pixels fall in each
+
+    Images with more than maxPixels pixels are downscaled (nearest neighbor, so no new blended colors are
+    introduced) to roughly that many before clustering. Pass None to always use the full image. Fully transparent
+    pixels are left out of the clustering entirely.
+    """
     log.debug(f"Finding color occurrence for {filename}")
 
     im = Image.open(filename)
@@ -60,15 +69,27 @@ def getColorCounts(filename):
 
     NUM_CLUSTERS = 16
 
+    im = downscaleToPixels(im, maxPixels)
+
     ar = np.asarray(im)
     shape = ar.shape
-    ar = ar.reshape(numpy.product(shape[:2]), shape[2]).astype(float)
+    ar = ar.reshape(-1, shape[2])
+    if shape[2] > 3:
+        ar = ar[ar[:, 3] > 0]
+
+    if len(ar) == 0:
+        log.debug(f"{filename} has no visible pixels")
+        return [], []
+
+    ar = ar.astype(np.float32)
 
     with warnings.catch_warnings():
         warnings.simplefilter('ignore')
-        codes, dist = scipy.cluster.vq.kmeans2(ar, NUM_CLUSTERS, minit='++')
+        codes, dist = scipy.cluster.vq.kmeans2(ar, min(NUM_CLUSTERS, len(ar)), minit='++')
+        # float32 centroids of large clusters can drift just outside the valid channel range
+        codes = np.clip(codes, 0, 255)
         vecs, dist = scipy.cluster.vq.vq(ar, codes)  # assign codes
-        counts, bins = numpy.histogram(vecs, len(codes))  # count occurrences
+        counts = np.bincount(vecs, minlength=len(codes))  # count occurrences
 
     log.debug('colors:')
     colors = [codeToIntArray(code) for code in codes]
@@ -80,6 +101,18 @@ def getColorCounts(filename):
     return colors, counts
 
 
+def downscaleToPixels(im, maxPixels):
+    """Returns the image shrunk (keeping its aspect ratio) to have at most about maxPixels pixels"""
+    (width, height) = im.size
+    if maxPixels is None or maxPixels <= 0 or width * height <= maxPixels:
+        return im
+
+    scale = sqrt(maxPixels / (width * height))
+    newSize = (max(1, int(width * scale)), max(1, int(height * scale)))
+    log.debug(f"Downscaling {im.size} to {newSize} for color analysis")
+    return im.resize(newSize, Image.NEAREST)
+
+
 def mergeSimilar(colors, counts):
     mergedColors = []
     mergedCounts = []
@@ -111,8 +144,8 @@ def nearlyEqual(arr1, arr2):
     return diff < 5
 
 
-def getAllColors(filename, noBlackWhite=False):
-    (colors, counts) = getColorCounts(filename)
+def getAllColors(filename, noBlackWhite=False, maxPixels=DEFAULT_MAX_PIXELS):
+    (colors, counts) = getColorCounts(filename, maxPixels)
 
     orderedColors1 = []
     orderedCounts1 = []
@@ -170,11 +203,11 @@ def getAllColors(filename, noBlackWhite=False):
     return finalColors, percents
 
 
-def getDominantColor(filename, noBlackWhite=False):
+def getDominantColor(filename, noBlackWhite=False, maxPixels=DEFAULT_MAX_PIXELS):
     log.debug(f"Finding dominant color for {filename}")
     if noBlackWhite: log.debug("Ignoring Black and White")
 
-    (colors, counts) = getColorCounts(filename)
+    (colors, counts) = getColorCounts(filename, maxPixels)
 
     colorsFound = 0
 
@@ -1,38 +1,146 @@
 import logging
 import os
 import sys
+import threading
+from contextlib import contextmanager
 from enum import Enum, auto
 
 import click
 
-from pdst.Config import Config
-from pdst.MetadataService import MetadataService
-from pdst.db.PlexDao import PlexDao
-from pdst.image.ImageGenerator import ImageGenerator
-from pdst.image.ImageService import ImageService
-from pdst.SportService import SportService
-
 log = logging.getLogger(__name__)
 
 CONTEXT_SETTINGS = dict(auto_envvar_prefix="PDST")
 
+# per-thread buffer that Environment.log writes to instead of the console, see Environment.captureOutput
+_captured = threading.local()
+
 
 class Environment:
+    """Shared state for a single CLI invocation
+
+    The config and services are only constructed the first time a command actually uses them, and the
+    modules they live in are only imported at that point, so that light commands (e.g. `clean`, `move`,
+    `--help`) don't pay for PIL/scipy/fuzzywuzzy imports or building an image pipeline they never use.
+    """
     def __init__(self):
         self.verbose = 0
-        self.config = None
+        self.configFile = None
         self.force = None
         self.recurse = False
         self.mode = None
+        self.jobs = 1
+        self.pool = None
+        # set by commands that move many files in one run, see filetools.DestinationIndex
+        self.destinationIndex = None
 
-        self.sportService = None
-        self.imageService = None
         self.outDir = os.getcwd()
 
+        self.__config = None
+        self.__imageGenerator = None
+        self.__sportService = None
+        self.__metadataService = None
+        self.__imageService = None
+        self.__renderCache = None
+
+    @property
+    def config(self):
+        if self.__config is None:
+            from pdst import ColorCache
+            from pdst.Config import Config
+            self.__config = Config(self.configFile)
+            ColorCache.configure(self.__config.colorCacheFile, self.__config.colorCacheSize,
+                                 self.__config.colorAnalysisMaxPixels)
+        return self.__config
+
+    @config.setter
+    def config(self, value):
+        self.__config = value
+
+    @property
+    def imageGenerator(self):
+        if self.__imageGenerator is None:
+            from pdst.image import LogoCache
+            from pdst.image.ImageGenerator import ImageGenerator
+            LogoCache.configure(self.config.logoCacheDir, self.config.logoCacheSize * 1024 * 1024)
+            self.__imageGenerator = ImageGenerator(self.config)
+        return self.__imageGenerator
+
+    @imageGenerator.setter
+    def imageGenerator(self, value):
+        self.__imageGenerator = value
+
+    @property
+    def sportService(self):
+        if self.__sportService is None:
+            from pdst.SportService import SportService
+            self.__sportService = SportService(self.config)
+        return self.__sportService
+
+    @sportService.setter
+    def sportService(self, value):
+        self.__sportService = value
+
+    @property
+    def metadataService(self):
+        if self.__metadataService is None:
+            from pdst.MetadataService import MetadataService
+            from pdst.db.PlexDao import PlexDao
+            self.__metadataService = MetadataService(PlexDao(self.config.plexLibPath), self.sportService)
+        return self.__metadataService
+
+    @metadataService.setter
+    def metadataService(self, value):
+        self.__metadataService = value
+
+    @property
+    def imageService(self):
+        if self.__imageService is None:
+            from pdst.image.ImageService import ImageService
+            self.__imageService = ImageService(self.config,
+                                               imageGen=self.imageGenerator,
+                                               sportService=self.sportService,
+                                               metadataService=self.metadataService)
+        return self.__imageService
+
+    @imageService.setter
+    def imageService(self, value):
+        self.__imageService = value
+
+    @property
+    def renderCache(self):
+        """The cache of rendered thumbnails, or None if it isn't enabled in the config"""
+        if self.__renderCache is None and self.config.renderCacheDir is not None:
+            from pdst.RenderCache import RenderCache
+            self.__renderCache = RenderCache(self.config.renderCacheDir, self.config.renderCacheSize * 1024 * 1024)
+        return self.__renderCache
+
+    @renderCache.setter
+    def renderCache(self, value):
+        self.__renderCache = value
+
     def log(self, msg, *args, **kwargs):
         if args:
             msg %= args
-        click.echo(msg, **kwargs)
+
+        buffer = getattr(_captured, 'buffer', None)
+        if buffer is not None:
+            buffer.append((msg, kwargs))
+        else:
+            click.echo(msg, **kwargs)
+
+    @contextmanager
+    def captureOutput(self):
+        """Collects everything logged from the current thread into a list of (msg, kwargs) instead of printing it"""
+        previous = getattr(_captured, 'buffer', None)
+        _captured.buffer = []
+        try:
+            yield _captured.buffer
+        finally:
+            _captured.buffer = previous
+
+    def replayOutput(self, captured):
+        for msg, kwargs in captured:
+            self.log(msg, **kwargs)
 
     def vlog(self, msg, *args, **kwargs):
         if self.verbose > 0:
@@ -83,15 +191,9 @@ def verbosity_option(f):
 def config_option(f):
     def callback(ctx, param, value):
         env = ctx.ensure_object(Environment)
+        # Config and services are built lazily by Environment on first use
         env.configFile = value
-        env.config = Config(value)
-        env.imageGenerator = ImageGenerator(env.config)
-        env.sportService = SportService(env.config)
-        env.metadataService = MetadataService(PlexDao(env.config.plexLibPath), env.sportService)
-        env.imageService = ImageService(env.config,
-                                        imageGen=env.imageGenerator,
-                                        sportService=env.sportService,
-                                        metadataService=env.metadataService)
+        env.config = None
 
         return value
 
@@ -141,6 +243,25 @@ def force_option(f):
                         expose_value=False, callback=callback)(f)
 
 
+def jobs_option(f):
+    def jobsCallback(ctx, param, value):
+        env = ctx.ensure_object(Environment)
+        env.jobs = value
+        return value
+
+    def poolCallback(ctx, param, value):
+        env = ctx.ensure_object(Environment)
+        env.pool = value
+        return value
+
+    f = click.option("--pool", type=click.Choice(['thread', 'process'], case_sensitive=False),
+                     help="Run '--jobs' on threads or processes. By default this depends on the command",
+                     expose_value=False, callback=poolCallback)(f)
+    return click.option("-j", "--jobs", type=click.IntRange(min=1), default=1,
+                        help="Number of files to process at the same time",
+                        expose_value=False, callback=jobsCallback)(f)
+
+
 def mode_option(f):
     def callback(ctx, param, value):
         env = ctx.ensure_object(Environment)
@@ -3,11 +3,14 @@ import os
 import click
 from PIL import ImageColor
 
-from pdst import parsing, analysis
+from pdst import parsing, analysis, ColorCache
 from pdst.image.ImageMatcher import ImageMatcher
-from pdst.cli import pass_environment, common_options, OpMode
+from pdst.cli import pass_environment, common_options, jobs_option, OpMode
 from pdst.commands import helpers
 
+# color clustering is CPU work
+HANDLER_BOUND = helpers.CPU_BOUND
+
 
 def shouldProcessFile(ctx, path):
     shouldProcess = False
@@ -60,7 +63,7 @@ def analyzeVideo(ctx, videoPath):
         ctx.log(f"---- {filename} ----")
         ctx.log(f"{sportEntry.name}: {sportEntry.getDefaultImage()}")
     else:
-        m = ImageMatcher(sportEntry.imageRoot)
+        m = ImageMatcher(sportEntry.imageRoot, saveIndex=ctx.config.saveLogoIndex)
         (logo1, logo2) = m.findBestMatches(team1, team2, parentDir, grandparentDir)
 
         ctx.log(f"---- {filename} ----")
@@ -68,11 +71,29 @@ def analyzeVideo(ctx, videoPath):
         ctx.log(f"{sportEntry.name}/{team2}: {logo2}")
 
 
-def analyzeImage(ctx, imageFile):
+def getImageColors(ctx, imageFile):
+    """The CPU-heavy part of analyzing an image, which doesn't touch the console or the file
+
+    Returns (ordered colors, percentages) with '--all-colors', otherwise just the dominant color
+    """
+    ctx.vlog(f"Analyzing {imageFile}")
+    if ctx.allColors:
+        return ColorCache.getAllColors(imageFile, ctx.noBW)
+    else:
+        return ColorCache.getDominantColor(imageFile, ctx.noBW)
+
+
+def analyzeImage(ctx, imageFile, imageColors=None):
+    """Reports (and optionally renames the file with) the colors of the image
+
+    imageColors is the result of getImageColors, if it has already been done elsewhere
+    """
     invert = False
+    if imageColors is None:
+        imageColors = getImageColors(ctx, imageFile)
 
     if ctx.allColors:
-        (orderedColors, percents) = analysis.getAllColors(imageFile, ctx.noBW)
+        (orderedColors, percents) = imageColors
 
         ctx.log(f"Colors in {imageFile} from most to least common:")
         for i in range(len(orderedColors)):
@@ -107,7 +128,7 @@ def analyzeImage(ctx, imageFile):
                             color = orderedColors[0]
 
     else:
-        color = analysis.getDominantColor(imageFile, ctx.noBW)
+        color = imageColors
         ctx.log(f"The most common color in {imageFile} is #{color}")
 
     if ctx.tint:  # pragma: no cover
@@ -125,8 +146,50 @@ def analyzeImage(ctx, imageFile):
     # TODO: how to handle color = None at this point? is that really even possible outside bad images?
     if ctx.rename:
         newFileName = parsing.setColorInFilename(imageFile, color, invert)
-        os.rename(imageFile, newFileName)  # TODO: use os.replace() instead?
-        ctx.log(f"{imageFile} -> {newFileName}")
+        renameImage(ctx, imageFile, newFileName)
+
+
+def renameImage(ctx, imageFile, newFileName):
+    """Renames the image, refusing to overwrite any other file that already has the new name"""
+    if os.path.abspath(newFileName) == os.path.abspath(imageFile):
+        ctx.vlog(f"{imageFile} already has the right name")
+        return False
+
+    try:
+        # link + unlink rather than rename, so that an existing file is never silently replaced
+        os.link(imageFile, newFileName)
+    except FileExistsError:
+        ctx.log(f"Not renaming {imageFile}, {newFileName} already exists", err=True)
+        return False
+    except OSError:
+        # no hard link support, fall back to check-then-rename
+        if os.path.exists(newFileName):
+            ctx.log(f"Not renaming {imageFile}, {newFileName} already exists", err=True)
+            return False
+        os.rename(imageFile, newFileName)
+    else:
+        os.unlink(imageFile)
+
+    ctx.log(f"{imageFile} -> {newFileName}")
+    return True
+
+
+def reportImageColors(ctx, fileResult):
+    """Reports the colors worked out by getImageColors (possibly in another process) for an image"""
+    if fileResult.error is not None:
+        return
+
+    (imageFile, imageColors) = (fileResult.path, fileResult.result)
+    # results from a worker process didn't make it into this process' cache. Only store a miss, as storing marks
+    # the cache as needing to be written out again
+    cache = ColorCache.getDefault()
+    if ctx.allColors:
+        if cache.lookup(imageFile, ctx.noBW) is None:
+            cache.store(imageFile, ctx.noBW, *imageColors)
+    elif cache.lookupDominant(imageFile, ctx.noBW) is None:
+        cache.storeDominant(imageFile, ctx.noBW, imageColors)
+
+    analyzeImage(ctx, imageFile, imageColors)
 
 
 @click.command("analyze", short_help="Analysis utilities")
@@ -141,6 +204,7 @@ def analyzeImage(ctx, imageFile):
                    "Implies '--all-colors' and '--rename'")
 @click.option("-t", "--tint", type=float, help="Tint analyzed colors to X% white value. should be (0.0-1.0)")
 @common_options
+@jobs_option
 @pass_environment
 def cli(ctx, path, no_black_white, all_colors, rename, interactive, tint):
     # ctx.force = True
@@ -154,7 +218,15 @@ def cli(ctx, path, no_black_white, all_colors, rename, interactive, tint):
         ctx.mode = OpMode.IMAGE
         ctx.outDir = os.getcwd()
 
-    for p in path:
-        # fmtPath = os.path.abspath(click.format_filename(p))
-        fmtPath = click.format_filename(p)
-        helpers.handlePath(ctx, fmtPath, checkFile=shouldProcessFile, handleFile=analyzeSingleFile)
+    if interactive:
+        ctx.jobs = 1
+
+    # fmtPath = os.path.abspath(click.format_filename(p))
+    paths = [click.format_filename(p) for p in path]
+    if ctx.mode is OpMode.IMAGE:
+        # only the analysis itself is farmed out, reporting and renaming happen here, in order
+        helpers.handlePaths(ctx, paths, checkFile=shouldProcessFile, handleFile=getImageColors, bound=HANDLER_BOUND,
+                            onResult=lambda r: reportImageColors(ctx, r))
+    else:
+        helpers.handlePaths(ctx, paths, checkFile=shouldProcessFile, handleFile=analyzeSingleFile,
+                            bound=HANDLER_BOUND)
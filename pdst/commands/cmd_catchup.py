@@ -0,0 +1,196 @@
+import logging
+import os
+from functools import partial
+
+import click
+import simplejson as json
+
+import pdst.commands.helpers as helpers
+from pdst import filetools
+from pdst.cli import pass_environment, common_options, jobs_option, OpMode
+from pdst.commands import cmd_watch
+
+log = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+# the stages are a mix of DB reads, image generation and file moves, run them on threads like `watch` does
+HANDLER_BOUND = helpers.IO_BOUND
+
+
+def defaultStateFile():
+    stateHome = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(stateHome, 'pdst', 'catchup.json')
+
+
+class HighWaterMark:
+    """The newest Plex media part that has been processed, per library database, persisted to a JSON state file
+
+    media_parts ids only ever increase, so the id of the last processed part is enough to find everything added
+    since. The metadata item's added_at is kept alongside it for reference.
+    """
+
+    def __init__(self, stateFile, dbPath):
+        self.stateFile = stateFile
+        self.key = os.path.realpath(dbPath)
+        self.libraries = {}
+
+    @property
+    def partId(self):
+        """The last processed media part id, or None if nothing has been recorded for this library"""
+        entry = self.libraries.get(self.key)
+        return entry['partId'] if entry is not None else None
+
+    @property
+    def addedAt(self):
+        entry = self.libraries.get(self.key)
+        return entry['addedAt'] if entry is not None else None
+
+    def load(self):
+        try:
+            with open(self.stateFile) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            log.warning(f"Unable to read catch-up state {self.stateFile}, starting fresh: {e}")
+            return False
+
+        if data.get('version') != STATE_VERSION:
+            return False
+
+        self.libraries = data.get('libraries', {})
+        return True
+
+    def advance(self, partId, addedAt):
+        if self.partId is not None and partId <= self.partId:
+            return False
+
+        self.libraries[self.key] = {'partId': partId, 'addedAt': addedAt}
+        return True
+
+    def save(self):
+        data = {'version': STATE_VERSION, 'libraries': self.libraries}
+        tmpFile = f"{self.stateFile}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(self.stateFile)), exist_ok=True)
+        with open(tmpFile, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmpFile, self.stateFile)
+
+
+def isWatchedFile(ctx, filePath, roots):
+    """Whether the file is under one of the roots, the same way `watch` would find it"""
+    if not filePath:
+        return False
+
+    for root in roots:
+        if filePath == root:
+            return True
+
+        prefix = os.path.join(root, '')
+        if not filePath.startswith(prefix):
+            continue
+
+        relPath = filePath[len(prefix):]
+        dirs = os.path.dirname(relPath).split(os.sep) if os.path.dirname(relPath) else []
+        if not ctx.recurse and len(dirs) > 0:
+            continue
+        if any(d in filetools.IGNORED_DIRS or d.startswith('.') for d in dirs):
+            continue
+
+        return True
+
+    return False
+
+
+def advanceMark(mark, parts, done):
+    """Moves the mark up to just before the first part that still needs processing"""
+    last = None
+    for part in parts:
+        if part['id'] not in done:
+            break
+        last = part
+
+    if last is not None:
+        mark.advance(last['id'], last['added_at'])
+
+
+@click.command("catchup", short_help="Process recordings Plex added since the last run")
+@click.option("--state-file", type=click.Path(dir_okay=False),
+              help="Where to keep track of what has been processed. Defaults to "
+                   "$XDG_STATE_HOME/pdst/catchup.json")
+@click.option("--init", is_flag=True, help="Don't process anything, just record everything currently in Plex as "
+                                           "already processed")
+@click.option("--no-move", is_flag=True, help="Only export metadata and generate thumbnails, don't move files")
+@click.option("--skip-ext", multiple=True, help="When moving files, skip ones with this extension. "
+                                                "Can be passed multiple times to skip more than one "
+                                                "extension.")
+@click.argument("path", required=True, nargs=-1)
+@common_options
+@jobs_option
+@pass_environment
+def cli(ctx, state_file, init, no_move, skip_ext, path):
+    ctx.mode = OpMode.VIDEO
+    ctx.skipExt = skip_ext
+    ctx.destinationIndex = filetools.DestinationIndex()
+
+    plexDao = ctx.metadataService.plexDao
+    mark = HighWaterMark(state_file if state_file is not None else defaultStateFile(), plexDao.dbPath)
+    mark.load()
+
+    if init:
+        last = plexDao.getLastPart()
+        if last is not None:
+            mark.advance(last['id'], last['added_at'])
+            mark.save()
+        ctx.log(f"Recorded media part {mark.partId} as the last one processed")
+        return
+
+    if mark.partId is None:
+        ctx.log("No previous run recorded, processing everything Plex has under the given paths")
+
+    paths = [os.path.abspath(click.format_filename(p)) for p in path]
+    parts = plexDao.getPartsAfter(mark.partId if mark.partId is not None else 0)
+
+    # part ids that are finished with, either processed or not ours to process
+    done = set()
+    files = {}
+    for part in parts:
+        if isWatchedFile(ctx, part['file'], paths) and helpers.isVideoFile(ctx, part['file']):
+            files.setdefault(part['file'], []).append(part['id'])
+        else:
+            done.add(part['id'])
+
+    ctx.log(f"{len(files)} new recordings since media part {mark.partId}")
+    if len(files) == 0:
+        advanceMark(mark, parts, done)
+        mark.save()
+        return
+
+    # build everything up front, once, instead of racing to do it from the worker threads
+    ctx.imageService
+    if mark.partId is None:
+        # everything Plex has is new, which whole library sections load quicker than file by file
+        ctx.metadataService.prefetchSections(set(part['library_section_id'] for part in parts
+                                                 if part['file'] in files and part['library_section_id'] is not None))
+    else:
+        ctx.metadataService.prefetchFiles(list(files))
+
+    def onResult(result):
+        if result.error is None:
+            done.update(files[result.path])
+
+    handleFile = partial(cmd_watch.runStages, stages=cmd_watch.getStages(no_move))
+    try:
+        with helpers.FileExecutor(ctx, handleFile, ctx.jobs, bound=HANDLER_BOUND, pool=ctx.pool,
+                                  onResult=onResult) as executor:
+            for filePath in files:
+                executor.submit(filePath)
+    finally:
+        # a failed file holds the mark back, so it (and anything after it) is tried again next time
+        advanceMark(mark, parts, done)
+        mark.save()
+
+    failed = [r for r in executor.results if r.error is not None]
+    if len(failed) > 0:
+        raise click.ClickException(f"{len(failed)} of {len(files)} files failed, they will be retried next run")
@@ -4,37 +4,134 @@ from datetime import datetime
 import click
 
 import pdst.commands.helpers as helpers
-from pdst import filetools, parsing
-from pdst.cli import pass_environment, common_options
+from pdst import parsing
+from pdst.cli import pass_environment, common_options, jobs_option
 
+# cleaning is all filesystem calls
+HANDLER_BOUND = helpers.IO_BOUND
 
-def checkFile(ctx, filePath):
-    isPoster = helpers.isPosterImage(filePath)
+SIZE_UNITS = ['B', 'KB', 'MB', 'GB', 'TB']
 
-    hasMatchingVideo = False
-    videoPath = None
-    for path in filetools.getPlexAssociatedFiles(filePath):
-        if helpers.isVideoFile(ctx, path):
-            hasMatchingVideo = True
-            videoPath = path
-            break
+
+class StemGroup:
+    """The files in one directory that share a base name (e.g. an episode's video, .metadata and thumbnail)
+
+    Holds the os.DirEntry for each file, which caches its stat results, so deciding whether the group is orphaned
+    and how much space it takes doesn't go back to the filesystem.
+    """
+
+    def __init__(self, dirPath, stem):
+        self.dirPath = dirPath
+        self.stem = stem
+        self.entries = []
+
+    @property
+    def basePath(self):
+        return os.path.join(self.dirPath, self.stem)
+
+    def getVideo(self, ctx):
+        return next((e for e in self.entries if e.is_file() and isVideoExtension(ctx, e.name)), None)
+
+    def getSize(self):
+        total = 0
+        for entry in self.entries:
+            try:
+                total += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                pass
+        return total
+
+
+def isVideoExtension(ctx, name):
+    return os.path.splitext(name)[1][1:] in ctx.config.videoExtensions
+
+
+def listDirectory(dirPath):
+    """Lists the directory once, returning its subdirectories and its other entries grouped by base name"""
+    subdirs = []
+    groups = {}
+    for entry in os.scandir(dirPath):
+        if entry.is_dir():
+            subdirs.append(entry.path)
+            continue
+
+        stem = os.path.splitext(entry.name)[0]
+        group = groups.get(stem)
+        if group is None:
+            group = groups[stem] = StemGroup(dirPath, stem)
+        group.entries.append(entry)
+
+    return subdirs, groups
+
+
+def shouldClean(ctx, group):
+    video = group.getVideo(ctx)
 
     old = True
-    if videoPath is not None:
-        filetime = datetime.fromtimestamp(os.path.getmtime(videoPath))
-        if filetime is not None and ctx.cutoffTime is not None:
-            old = filetime < ctx.cutoffTime
+    if video is not None and ctx.cutoffTime is not None:
+        old = datetime.fromtimestamp(video.stat().st_mtime) < ctx.cutoffTime
+
+    return not helpers.isPosterImage(group.stem) and old and (ctx.force or video is None)
+
 
-    process = not isPoster and old and (ctx.force or not hasMatchingVideo)
-    if not process:
-        ctx.vlog(f"Skipping {filePath}")
-    return process
+def findGroupsToClean(ctx, paths):
+    """Returns the StemGroups under the given paths that should be cleaned, listing each directory only once"""
+    listings = {}
 
+    def getListing(dirPath):
+        if dirPath not in listings:
+            ctx.vlog(f"Processing directory: {dirPath}")
+            listings[dirPath] = listDirectory(dirPath)
+        return listings[dirPath]
 
-def cleanAssociatedFiles(ctx, filePath):
-    for path in filetools.getPlexAssociatedFiles(filePath):
-        ctx.vlog(f"Deleting {path}")
-        os.remove(path)
+    toClean = {}
+
+    def checkGroup(group):
+        if group.basePath in toClean:
+            return
+        if shouldClean(ctx, group):
+            toClean[group.basePath] = group
+        else:
+            for entry in group.entries:
+                ctx.vlog(f"Skipping {entry.path}")
+
+    pending = list(paths)
+    while pending:
+        path = pending.pop(0)
+        if os.path.isdir(path):
+            (subdirs, groups) = getListing(path)
+            for group in groups.values():
+                checkGroup(group)
+            if ctx.recurse:
+                pending[0:0] = subdirs
+
+        elif os.path.lexists(path):
+            (dirPath, name) = os.path.split(path)
+            group = getListing(dirPath)[1].get(os.path.splitext(name)[0])
+            if group is not None:
+                checkGroup(group)
+
+    return toClean
+
+
+def cleanGroup(ctx, basePath):
+    """Deletes all the files in the group, returning (files deleted, bytes freed)"""
+    group = ctx.cleanGroups[basePath]
+    size = group.getSize()
+
+    for entry in group.entries:
+        ctx.vlog(f"Deleting {entry.path}")
+        os.remove(entry.path)
+
+    return len(group.entries), size
+
+
+def formatSize(size):
+    for unit in SIZE_UNITS[:-1]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} {SIZE_UNITS[-1]}"
 
 
 @click.command("clean", short_help="Cleanup orhpaned files")
@@ -44,6 +141,7 @@ def cleanAssociatedFiles(ctx, filePath):
 @click.option("--older",  help="Only clean files older than the given age. Implies '--force'")
 @click.argument("path", required=True, nargs=-1)
 @common_options
+@jobs_option
 @pass_environment
 def cli(ctx, older, path):
 
@@ -54,6 +152,23 @@ def cli(ctx, older, path):
         now = datetime.now()
         ctx.cutoffTime = now - delta
 
-    for p in path:
-        fmtPath = os.path.abspath(click.format_filename(p))
-        helpers.handlePath(ctx, fmtPath, checkFile=checkFile, handleFile=cleanAssociatedFiles)
+    paths = [os.path.abspath(click.format_filename(p)) for p in path]
+    ctx.cleanGroups = findGroupsToClean(ctx, paths)
+
+    removed = [0, 0]
+
+    def onResult(result):
+        if result.error is None:
+            removed[0] += result.result[0]
+            removed[1] += result.result[1]
+
+    with helpers.FileExecutor(ctx, cleanGroup, ctx.jobs, bound=HANDLER_BOUND, pool=ctx.pool,
+                              onResult=onResult) as executor:
+        for basePath in ctx.cleanGroups:
+            executor.submit(basePath)
+
+    ctx.log(f"Removed {removed[0]} files, freeing {formatSize(removed[1])}")
+
+    failed = [r for r in executor.results if r.error is not None]
+    if len(failed) > 0:
+        raise click.ClickException(f"{len(failed)} of {len(executor.results)} files failed")
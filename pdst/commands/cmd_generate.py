@@ -1,14 +1,18 @@
+import collections
 import os
 import pathlib
 
 import click
 
-from pdst import parsing, analysis
+from pdst import parsing, analysis, ColorCache, RenderCache
 from pdst.image import ImageGenerationException
-from pdst.cli import pass_environment, common_options, OpMode
+from pdst.cli import pass_environment, common_options, jobs_option, OpMode
 from pdst.commands import helpers
 from pdst.image.spec import ImageSpec, ColorOverlaySpec, StrokeSpec, CompositeSpec
 
+# rendering (and any color analysis) is CPU work
+HANDLER_BOUND = helpers.CPU_BOUND
+
 
 def shouldProcessFile(ctx, path):
     process = False
@@ -37,16 +41,18 @@ def shouldProcessFile(ctx, path):
 
 def processSingleFile(ctx, inFile):
     if ctx.mode is OpMode.VIDEO:
-        processVideoFile(ctx, inFile)
+        return processVideoFile(ctx, inFile)
     else:
         processImageFile(ctx, inFile)
 
 
 def processVideoFile(ctx, inFile):
+    """Generates the thumbnail for a video file. Returns whether it came from the render cache (None if there is
+    no render cache, or nothing was saved)"""
     ctx.vlog(f"Processing video file: {os.path.basename(inFile)}")
 
     try:
-        thumb = ctx.imageService.generateEventThumbnail(inFile)
+        (compositeSpec, imageSpecs) = ctx.imageService.getEventThumbnailSpecs(inFile)
         imageName = ctx.imageService.getMatchingImageName(inFile)
         (originalDir, imageFile) = os.path.split(imageName)
 
@@ -54,11 +60,32 @@ def processVideoFile(ctx, inFile):
             imageName = os.path.join(ctx.outDir, imageFile)
 
         ctx.log(f"Saving {imageFile}")
-        thumb.save(imageName)
+        return renderToFile(ctx, compositeSpec, imageSpecs, imageName)
     except ImageGenerationException as e:
         ctx.log(f"There was a problem generating the image: {e}")
 
 
+def renderToFile(ctx, compositeSpec, imageSpecs, imagePath):
+    """Renders the specs and saves the result to imagePath, reusing an earlier render of exactly the same inputs
+    when the render cache is enabled. Returns whether the cache was hit, or None if there is no render cache"""
+    cache = ctx.renderCache
+    key = None
+    if cache is not None:
+        extension = os.path.splitext(imagePath)[1][1:]
+        key = cache.keyFor(compositeSpec, imageSpecs, ctx.config, extension)
+        if key is not None and cache.place(key, imagePath):
+            ctx.vlog(f"Reused cached render for {os.path.basename(imagePath)}")
+            return True
+
+    image = ctx.imageGenerator.generateImage(compositeSpec, imageSpecs)
+    if key is not None:
+        cache.store(key, image, imagePath)
+    else:
+        RenderCache.saveImage(image, imagePath)
+
+    return None if cache is None else False
+
+
 def processImageFile(ctx, inFile):
     ctx.vlog(f"Processing image file: {os.path.basename(inFile)}")
 
@@ -68,7 +95,7 @@ def processImageFile(ctx, inFile):
     # need to figure out how the trial/error workflow will work with the new
     # ImageGenerator and backgrounds and stuff
     if ctx.allColors and detectColors:  # pragma: no cover
-        (orderedColors, percents) = analysis.getAllColors(inFile)
+        (orderedColors, percents) = ColorCache.getAllColors(inFile)
 
         # use existing color from filename if present in case it *isn't* in logo
         if colorInName:
@@ -94,7 +121,6 @@ def generateAndSaveLogoImage(ctx, logoFile, color, invert=False, index=None):
         imageSpec = ImageSpec(logoFile, colors=[color], invert=invert, bg='solid')
 
     compSpec = CompositeSpec(imageSize, ctx.text)
-    teamImg = ctx.imageGenerator.generateImage(compSpec, [imageSpec])
 
     imageFile = os.path.split(logoFile)[1]
     nameBase = parsing.cleanImageHints(imageFile)
@@ -110,17 +136,13 @@ def generateAndSaveLogoImage(ctx, logoFile, color, invert=False, index=None):
             imageName += 'i'
 
     imageName += '.' + ctx.config.createdImageExtension
-    saveImage(ctx, teamImg, imageName)
-
-
-def saveImage(ctx, image, imageName):
     if ctx.outDir is not None:
         finalPath = os.path.join(ctx.outDir, imageName)
     else:
         finalPath = os.path.join(os.getcwd(), imageName)
 
     ctx.log(f"Saving {finalPath}")
-    image.save(finalPath)
+    renderToFile(ctx, compSpec, [imageSpec], finalPath)
 
 
 def processTeamsSpecs(ctx, teamSpecs):
@@ -134,7 +156,7 @@ def processTeamsSpecs(ctx, teamSpecs):
         ctx.outDir = os.getcwd()
 
     fullOutPath = os.path.join(ctx.outDir, filename)
-    img.save(fullOutPath)
+    RenderCache.saveImage(img, fullOutPath)
 
 
 def getImageSpecOverride(ctx):
@@ -185,6 +207,7 @@ class PathOrSpecifier(click.ParamType):
 @click.option("--text", help="Overlay the given text onto the image")
 @click.argument("source", required=False, type=PathOrSpecifier(), nargs=-1)
 @common_options
+@jobs_option
 @pass_environment
 def cli(ctx, all_colors, color, inversion, background, size, mask, stroke, text, source):
     ctx.allColors = all_colors
@@ -204,9 +227,22 @@ def cli(ctx, all_colors, color, inversion, background, size, mask, stroke, text,
     else:
         ctx.imageSize = size
 
+    # opened before any workers are started, so they all share what it read from the cache directory
+    renderCache = ctx.renderCache
+    # tallied from the results, since with a process pool the cache's own counters are in the workers
+    cacheCounts = collections.Counter()
+
+    def onResult(result):
+        if result.result is not None:
+            cacheCounts['hits' if result.result else 'misses'] += 1
+
     for s in source:
         if isinstance(s, pathlib.Path):
             p = str(s)
-            helpers.handlePath(ctx, p, checkFile=shouldProcessFile, handleFile=processSingleFile)
+            helpers.handlePaths(ctx, [p], checkFile=shouldProcessFile, handleFile=processSingleFile,
+                                bound=HANDLER_BOUND, onResult=onResult)
         else:
             processTeamsSpecs(ctx, s)
+
+    if renderCache is not None and len(cacheCounts) > 0:
+        ctx.log(f"Render cache: {cacheCounts['hits']} hits, {cacheCounts['misses']} misses")
@@ -0,0 +1,71 @@
+import os
+
+import click
+
+from pdst.cli import pass_environment, common_options
+from pdst.image.LogoIndex import LogoIndex
+
+
+def getConfiguredImageRoots(config):
+    roots = []
+    for root in [config.imageRoot] + [s.imageRoot for s in config.sports]:
+        if root is not None and root not in roots:
+            roots.append(root)
+
+    return roots
+
+
+def buildIndex(ctx, rootDir):
+    index = LogoIndex(rootDir)
+    if not ctx.force:
+        index.load()
+
+    updated = index.refresh()
+    index.save()
+
+    ctx.log(f"Indexed {len(index.getAllImages())} images in {rootDir} ({updated} directories updated)")
+
+
+def verifyIndex(ctx, rootDir):
+    index = LogoIndex(rootDir)
+    if not index.load():
+        ctx.log(f"{rootDir} does not have a usable index")
+        return False
+
+    missing, stale = index.verify()
+    for path in missing:
+        ctx.vlog(f"Not in index: {path}")
+    for path in stale:
+        ctx.vlog(f"No longer exists: {path}")
+
+    if len(missing) > 0 or len(stale) > 0:
+        ctx.log(f"Index for {rootDir} is out of date: {len(missing)} new and {len(stale)} removed images")
+        return False
+
+    ctx.log(f"Index for {rootDir} is up to date")
+    return True
+
+
+@click.command("index", short_help="Build or verify logo image indexes")
+@click.option("--verify", is_flag=True, help="Check existing indexes against the image files without updating them")
+@click.argument("path", required=False, nargs=-1, type=click.Path(exists=True, file_okay=False))
+@common_options
+@pass_environment
+def cli(ctx, verify, path):
+    roots = [click.format_filename(p) for p in path]
+    if len(roots) == 0:
+        roots = getConfiguredImageRoots(ctx.config)
+
+    allOk = True
+    for root in roots:
+        if not os.path.isdir(root):
+            ctx.log(f"Image root {root} does not exist, skipping")
+            continue
+
+        if verify:
+            allOk = verifyIndex(ctx, root) and allOk
+        else:
+            buildIndex(ctx, root)
+
+    if not allOk:
+        click.get_current_context().exit(1)
@@ -3,9 +3,12 @@ import os
 import click
 
 import pdst.commands.helpers as helpers
-from pdst.cli import pass_environment, common_options
+from pdst.cli import pass_environment, common_options, jobs_option
 from pdst.filetools import getMetadataFilename
 
+# exporting is a database read and a small file write
+HANDLER_BOUND = helpers.IO_BOUND
+
 
 def shouldProcess(ctx, filePath):
     process = False
@@ -48,8 +51,9 @@ def processFile(ctx, filePath):
 @click.command("meta-export", short_help="Plex Metadata Export")
 @click.argument("path", required=True, nargs=-1)
 @common_options
+@jobs_option
 @pass_environment
 def cli(ctx, path):
-    for p in path:
-        fmtPath = os.path.abspath(click.format_filename(p))
-        helpers.handlePath(ctx, fmtPath, checkFile=shouldProcess, handleFile=processFile)
+    paths = [os.path.abspath(click.format_filename(p)) for p in path]
+    helpers.prefetchMetadata(ctx, paths)
+    helpers.handlePaths(ctx, paths, checkFile=shouldProcess, handleFile=processFile, bound=HANDLER_BOUND)
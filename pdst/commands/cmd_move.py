@@ -1,53 +1,73 @@
 import os
-import shutil
 
 import click
 
 import pdst.commands.helpers as helpers
 from pdst import filetools
-from pdst.cli import pass_environment, common_options
+from pdst.MovePlan import MovePlan, MovePlanner, MoveJournal, runOperations
+from pdst.cli import pass_environment, common_options, jobs_option
+
+# moving is all filesystem calls
+HANDLER_BOUND = helpers.IO_BOUND
 
 
 def moveAssociatedFiles(ctx, videoPath):
-    ctx.vlog(f"Moving {videoPath} and associated files...")
-    metadata = ctx.metadataService.getMetadataForEpisodeFile(videoPath)
+    """Moves a single video and its associated files, planning and running the move in one go"""
+    plan = MovePlan()
+    if MovePlanner(ctx, plan).planVideo(ctx, videoPath):
+        os.umask(ctx.config.umask)
+        runOperations(ctx, plan.operations)
+
+
+def moveVideo(ctx, videoPath):
+    """Runs the planned moves for one video of ctx.movePlan"""
+    runOperations(ctx, ctx.movePlan.getVideos()[videoPath], resuming=ctx.movePlan.resuming)
 
-    if metadata is None:
-        ctx.log(f"NO metadata found for {videoPath}! Not Moving", err=True)
-        return
 
-    # Should already be set when Config was loaded, but make sure since we might be
-    # about to create a bunch of dirs/files
+def runPlan(ctx, plan, journal=None):
+    """Creates the planned directories and copies posters, then moves each video's files, up to ctx.jobs videos at
+    the same time. Returns the list of FileResults for the videos, or None when run serially"""
+    # Should already be set when Config was loaded, but make sure since we're about to create a bunch of dirs/files
     os.umask(ctx.config.umask)
 
-    newRootPath = ctx.config.moveTarget
-    newShowDirName = metadata.show.title
-    newSeasonDirName = f"Season {metadata.season.index}"
-    destinationDir = os.path.join(newRootPath, newShowDirName, newSeasonDirName)
-
-    if not os.path.exists(destinationDir):
-        ctx.vlog(f"Creating destination directories: {destinationDir}")
-        os.makedirs(destinationDir)
-
-    showPosterFile = os.path.join(newRootPath, newShowDirName, 'poster.jpg')
-    if not os.path.exists(showPosterFile):
-        ctx.vlog(f"Destination show does not have an existing poster")
-        existingThumb = os.path.join(ctx.config.plexLibPath, filetools.getRealThumbPath(metadata.show))
-        if os.path.exists(existingThumb):
-            ctx.vlog(f"Copying 'old' library show poster: {existingThumb}")
-            shutil.copy(existingThumb, showPosterFile)
-        else:
-            ctx.vlog(f"{existingThumb} doesn't seem to exist?")
-
-    renamed = filetools.getMoveDestinationFilename(videoPath, metadata, destinationDir)
-    for filePath in filetools.getPlexAssociatedFiles(videoPath):
-        thisExt = os.path.splitext(filePath)[1]
-        if thisExt[1:] not in ctx.skipExt:
-            newPath = os.path.join(destinationDir, renamed + thisExt)
-            os.rename(filePath, newPath)
-            ctx.vlog(f"{filePath} -> {newPath}")
-        else:
-            ctx.vlog(f"Skipping {filePath}")
+    if journal is not None:
+        journal.start(plan)
+
+    videos = plan.getVideos()
+    try:
+        setup = plan.getSetup()
+        runOperations(ctx, setup, resuming=plan.resuming)
+        if journal is not None:
+            journal.markDone(setup)
+
+        if len(videos) == 0:
+            return None
+
+        if ctx.jobs <= 1 and journal is None:
+            for operations in videos.values():
+                runOperations(ctx, operations, resuming=plan.resuming)
+            return None
+
+        def onResult(result):
+            if result.error is None and journal is not None:
+                journal.markDone(videos[result.path])
+
+        ctx.movePlan = plan
+        with helpers.FileExecutor(ctx, moveVideo, ctx.jobs, bound=HANDLER_BOUND, pool=ctx.pool,
+                                  onResult=onResult) as executor:
+            for videoPath in videos:
+                executor.submit(videoPath)
+
+    finally:
+        if journal is not None and not journal.finish():
+            ctx.log(f"Not everything was moved, run again with '--journal {journal.journalFile}' to pick up where "
+                    f"this left off", err=True)
+
+    failed = [r for r in executor.results if r.error is not None]
+    if len(failed) > 0:
+        raise click.ClickException(f"{len(failed)} of {len(executor.results)} files failed")
+
+    return executor.results
 
 
 @click.command("move", short_help="Move media")
@@ -57,15 +77,60 @@ def moveAssociatedFiles(ctx, videoPath):
 @click.option("--target-root", type=click.Path(exists=True), help="Root of the library to move to. "
                                                                   "If not passed, pulls from config "
                                                                   "entry 'moveTarget'.")
+@click.option("--dry-run", is_flag=True, help="Print what would be done, without changing anything")
+@click.option("--journal", type=click.Path(dir_okay=False), help="Keep track of the move's progress in this file. "
+                                                                 "If it holds a move that was interrupted, that "
+                                                                 "is finished first.")
 @click.argument("path", required=True, nargs=-1)
 @common_options
+@jobs_option
 @pass_environment
-def cli(ctx, skip_ext, target_root, path):
+def cli(ctx, skip_ext, target_root, dry_run, journal, path):
     ctx.skipExt = skip_ext
+    ctx.destinationIndex = filetools.DestinationIndex()
 
     if target_root is not None:
         ctx.config.moveTarget = target_root
 
-    for p in path:
-        fmtPath = os.path.abspath(click.format_filename(p))
-        helpers.handlePath(ctx, fmtPath, checkFile=helpers.isVideoFile, handleFile=moveAssociatedFiles)
+    # videos the interrupted move covers, which aren't planned again (a dry run would otherwise list them twice)
+    resumedVideos = set()
+    moveJournal = MoveJournal(journal) if journal is not None else None
+    if moveJournal is not None:
+        leftover = moveJournal.load()
+        if len(leftover) > 0:
+            ctx.log(f"Resuming an interrupted move, {len(leftover)} operations left")
+            resumed = MovePlan(resuming=True)
+            for operation in leftover:
+                resumed.add(operation)
+            resumedVideos = set(resumed.getVideos())
+
+            if dry_run:
+                printPlan(ctx, resumed)
+            else:
+                runPlan(ctx, resumed, moveJournal)
+
+    paths = [os.path.abspath(click.format_filename(p)) for p in path]
+    helpers.prefetchMetadata(ctx, paths)
+
+    plan = MovePlan()
+    planner = MovePlanner(ctx, plan)
+
+    def planVideo(c, videoPath):
+        if videoPath in resumedVideos:
+            c.vlog(f"{videoPath} is part of the interrupted move, not planning it again")
+            return True
+        return planner.planVideo(c, videoPath)
+
+    for p in paths:
+        helpers.handlePath(ctx, p, checkFile=helpers.isVideoFile, handleFile=planVideo)
+
+    if dry_run:
+        printPlan(ctx, plan)
+    else:
+        runPlan(ctx, plan, moveJournal)
+
+
+def printPlan(ctx, plan):
+    for operation in plan.operations:
+        ctx.log(str(operation))
+    ctx.log(f"{len(plan.getVideos())} videos, {len(plan)} operations")
@@ -0,0 +1,218 @@
+import importlib
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+import pdst.commands.helpers as helpers
+from pdst import filetools
+from pdst.cli import pass_environment, common_options, OpMode
+from pdst.commands import cmd_generate, cmd_move
+
+log = logging.getLogger(__name__)
+
+metaExport = importlib.import_module('pdst.commands.cmd_meta-export')
+
+# destination directories whose timestamps are kept between files, the least recently used are listed again if needed
+MAX_DESTINATION_DIRS = 64
+
+
+class DirectoryPoller:
+    """Tracks video files under a set of directories and reports the ones that have settled
+
+    A file is 'settled' once its size and mtime have not changed for `settleTime` seconds, which debounces the
+    burst of create/modify/move activity while a recording is still being written or moved into place.
+    """
+
+    def __init__(self, ctx, paths, settleTime, includeExisting=True):
+        self.ctx = ctx
+        self.paths = paths
+        self.settleTime = settleTime
+
+        # path -> ((size, mtime), time the signature was first seen)
+        self.pending = {}
+        # path -> signature when it was handed off for processing
+        self.handled = {}
+
+        if not includeExisting:
+            for path, signature in self.__scan():
+                self.handled[path] = signature
+
+    def poll(self, now=None):
+        """Scans the watched paths and returns the list of newly settled files"""
+        if now is None:
+            now = time.monotonic()
+
+        seen = set()
+        settled = []
+        for path, signature in self.__scan():
+            seen.add(path)
+            if self.handled.get(path) == signature:
+                continue
+
+            previous = self.pending.get(path)
+            if previous is None or previous[0] != signature:
+                self.pending[path] = (signature, now)
+                previous = self.pending[path]
+
+            if now - previous[1] >= self.settleTime:
+                settled.append(path)
+                self.handled[path] = signature
+                del self.pending[path]
+
+        for gone in [p for p in self.pending if p not in seen]:
+            del self.pending[gone]
+        for gone in [p for p in self.handled if p not in seen]:
+            del self.handled[gone]
+
+        settled.sort()
+        return settled
+
+    def hasPending(self):
+        return len(self.pending) > 0
+
+    def __scan(self):
+        for path in self.paths:
+            if os.path.isdir(path):
+                yield from self.__scanDir(path)
+            elif helpers.isVideoFile(self.ctx, path):
+                yield path, self.__signature(path)
+
+    def __scanDir(self, path):
+        try:
+            entries = list(os.scandir(path))
+        except FileNotFoundError:
+            return
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if self.ctx.recurse and filetools.notIgnoredDir(entry) and not entry.name.startswith('.'):
+                    yield from self.__scanDir(entry.path)
+            elif self.__isVideoName(entry.name):
+                signature = self.__signature(entry.path)
+                if signature is not None:
+                    yield entry.path, signature
+
+    def __isVideoName(self, name):
+        return os.path.splitext(name)[1][1:] in self.ctx.config.videoExtensions
+
+    @staticmethod
+    def __signature(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+
+class WatchPipeline:
+    """Runs the export -> generate -> move stages for settled files on a bounded pool of worker threads"""
+
+    def __init__(self, ctx, jobs, stages):
+        self.ctx = ctx
+        self.jobs = jobs
+        self.stages = stages
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.inFlight = {}
+
+    def submit(self, path):
+        if path in self.inFlight:
+            return
+        self.inFlight[path] = self.executor.submit(self.process, path)
+
+    def hasCapacity(self):
+        self.__reap()
+        return len(self.inFlight) < self.jobs
+
+    def isIdle(self):
+        self.__reap()
+        return len(self.inFlight) == 0
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.__reap()
+
+    def process(self, path):
+        runStages(self.ctx, path, self.stages)
+
+    def __reap(self):
+        for path, future in list(self.inFlight.items()):
+            if future.done():
+                del self.inFlight[path]
+                error = future.exception()
+                if error is not None:
+                    self.ctx.log(f"Failed processing {path}: {error}", err=True)
+
+
+def runStages(ctx, path, stages):
+    """Runs each (name, checkFile, handleFile) stage that applies to the file, in order"""
+    for name, checkFile, handleFile in stages:
+        if not os.path.exists(path):
+            ctx.vlog(f"{path} is gone, skipping remaining stages")
+            return
+        if checkFile(ctx, path):
+            ctx.vlog(f"[{name}] {path}")
+            handleFile(ctx, path)
+
+
+def getStages(noMove):
+    stages = [
+        ('meta-export', metaExport.shouldProcess, metaExport.processFile),
+        ('generate', cmd_generate.shouldProcessFile, cmd_generate.processVideoFile),
+    ]
+    if not noMove:
+        stages.append(('move', helpers.isVideoFile, cmd_move.moveAssociatedFiles))
+
+    return stages
+
+
+@click.command("watch", short_help="Watch directories and process new recordings")
+@click.option("-j", "--jobs", type=click.IntRange(min=1), default=2,
+              help="Maximum number of files to process at the same time")
+@click.option("--settle", type=float, default=10.0,
+              help="Seconds a file must go unchanged before it is processed")
+@click.option("--interval", type=float, default=2.0, help="Seconds between directory scans")
+@click.option("--existing", is_flag=True, help="Also process files that were already present at startup")
+@click.option("--once", is_flag=True, help="Process everything currently present, then exit. Implies '--existing'")
+@click.option("--no-move", is_flag=True, help="Only export metadata and generate thumbnails, don't move files")
+@click.option("--skip-ext", multiple=True, help="When moving files, skip ones with this extension. "
+                                                "Can be passed multiple times to skip more than one "
+                                                "extension.")
+@click.argument("path", required=True, nargs=-1)
+@common_options
+@pass_environment
+def cli(ctx, jobs, settle, interval, existing, once, no_move, skip_ext, path):
+    ctx.mode = OpMode.VIDEO
+    ctx.skipExt = skip_ext
+    # shared by the workers, so files moved into the same directory at the same time can't claim the same name. Each
+    # file is moved as soon as it's named, so only a bounded number of directories need to be kept
+    ctx.destinationIndex = filetools.DestinationIndex(maxDirectories=MAX_DESTINATION_DIRS)
+
+    # build everything up front, once, instead of racing to do it from the worker threads
+    ctx.imageService
+    ctx.metadataService
+
+    paths = [os.path.abspath(click.format_filename(p)) for p in path]
+    poller = DirectoryPoller(ctx, paths, settle, includeExisting=existing or once)
+    pipeline = WatchPipeline(ctx, jobs, getStages(no_move))
+
+    ctx.log(f"Watching {', '.join(paths)}")
+    backlog = []
+    try:
+        while True:
+            backlog.extend(p for p in poller.poll() if p not in backlog)
+            while backlog and pipeline.hasCapacity():
+                pipeline.submit(backlog.pop(0))
+
+            if once and not backlog and not poller.hasPending() and pipeline.isIdle():
+                break
+
+            time.sleep(min(interval, settle) if once else interval)
+
+    except KeyboardInterrupt:  # pragma: no cover
+        ctx.log("Stopping, waiting for in-progress files to finish...")
+
+    finally:
+        pipeline.shutdown()
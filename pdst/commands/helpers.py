@@ -1,4 +1,16 @@
+import multiprocessing
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+
+import click
+
+# how a command's file handler spends its time, which decides the default kind of pool used for '--jobs'
+IO_BOUND = 'io'
+CPU_BOUND = 'cpu'
+
+# the Environment used by handlers running in a worker process (inherited from the parent when the pool forks)
+_workerCtx = None
 
 
 def basicCheckFile(ctx, filePath):
@@ -38,6 +50,158 @@ def handlePath(ctx, path, handleDir=basicHandleDir, checkFile=basicCheckFile, ha
         handleFile(ctx, path)
 
 
+def prefetchMetadata(ctx, paths):
+    """Bulk loads the DB metadata for any directories in paths, ahead of handling the files in them one by one"""
+    for path in paths:
+        if os.path.isdir(path):
+            ctx.metadataService.prefetchDirectory(path, recursive=ctx.recurse)
+
+
+def handlePaths(ctx, paths, checkFile=basicCheckFile, handleFile=basicHandleFile, bound=IO_BOUND, onResult=None):
+    """handlePath for each of the given paths, running handleFile for up to ctx.jobs files at the same time
+
+    With more than one job, each file's output is printed together, in the order the files were found, and a
+    failure in one file doesn't stop the others. onResult, if given, is called (in this process and thread, in
+    the same order) with the FileResult for each file. Returns the list of FileResults, or None when run serially.
+    """
+    if ctx.jobs <= 1:
+        if onResult is not None:
+            def handleAndReport(c, f):
+                onResult(FileResult(f, result=handleFile(c, f)))
+
+            handler = handleAndReport
+        else:
+            handler = handleFile
+
+        for path in paths:
+            handlePath(ctx, path, checkFile=checkFile, handleFile=handler)
+        return None
+
+    with FileExecutor(ctx, handleFile, ctx.jobs, bound=bound, pool=ctx.pool, onResult=onResult) as executor:
+        for path in paths:
+            handlePath(ctx, path, checkFile=checkFile, handleFile=lambda c, f: executor.submit(f))
+
+    failed = [r for r in executor.results if r.error is not None]
+    if len(failed) > 0:
+        raise click.ClickException(f"{len(failed)} of {len(executor.results)} files failed")
+
+    return executor.results
+
+
+class FileResult:
+
+    def __init__(self, path, result=None, error=None, output=None):
+        self.path = path
+        self.result = result
+        self.error = error
+        self.output = output if output is not None else []
+
+    def __repr__(self):
+        return f"FileResult({self.path}, result={self.result}, error={self.error})"
+
+
+class FileExecutor:
+    """Runs a file handler over many files on a pool of threads or processes
+
+    At most `maxInFlight` files are submitted to the pool at once, submit() blocks until there is room. Results are
+    collected (and each file's captured output printed, and onResult called) strictly in submission order.
+
+    Process pools are only used where they can be forked, so handlers see the same ctx as the parent; elsewhere
+    (and for I/O-bound handlers, by default) threads are used.
+    """
+
+    def __init__(self, ctx, handleFile, jobs, bound=IO_BOUND, pool=None, maxInFlight=None, onResult=None):
+        self.ctx = ctx
+        self.handleFile = handleFile
+        self.onResult = onResult
+        self.jobs = jobs
+        self.maxInFlight = maxInFlight if maxInFlight is not None else jobs * 2
+        self.results = []
+        self.inFlight = deque()
+
+        if pool is None:
+            pool = 'process' if bound == CPU_BOUND else 'thread'
+        if pool == 'process' and 'fork' not in multiprocessing.get_all_start_methods():
+            ctx.vlog("Process pools need fork support, using threads instead")
+            pool = 'thread'
+        self.pool = pool
+
+        if pool == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork'),
+                                                initializer=_initWorker, initargs=(ctx,))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=jobs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        try:
+            if excType is None:
+                self.drain()
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def submit(self, path):
+        while len(self.inFlight) >= self.maxInFlight:
+            self.__collect(block=True)
+
+        if self.pool == 'process':
+            future = self.executor.submit(_runInWorker, self.handleFile, path)
+        else:
+            future = self.executor.submit(_runHandler, self.ctx, self.handleFile, path)
+        self.inFlight.append((path, future))
+        self.__collect(block=False)
+
+    def drain(self):
+        while len(self.inFlight) > 0:
+            self.__collect(block=True)
+        return self.results
+
+    def __collect(self, block):
+        """Records finished files from the front of the queue, optionally waiting for the first one to finish"""
+        while len(self.inFlight) > 0:
+            (path, future) = self.inFlight[0]
+            if not future.done():
+                if not block:
+                    return
+                wait([future])
+
+            self.inFlight.popleft()
+            block = False
+
+            try:
+                result = future.result()
+            except Exception as e:
+                # the worker itself broke, rather than the handler raising
+                result = FileResult(path, error=e)
+
+            self.ctx.replayOutput(result.output)
+            if result.error is not None:
+                self.ctx.log(f"Failed processing {path}: {result.error}", err=True)
+            self.results.append(result)
+
+            if self.onResult is not None:
+                self.onResult(result)
+
+
+def _runHandler(ctx, handleFile, path):
+    with ctx.captureOutput() as output:
+        try:
+            return FileResult(path, result=handleFile(ctx, path), output=output)
+        except Exception as e:
+            return FileResult(path, error=e, output=output)
+
+
+def _initWorker(ctx):
+    global _workerCtx
+    _workerCtx = ctx
+
+
+def _runInWorker(handleFile, path):
+    return _runHandler(_workerCtx, handleFile, path)
+
+
 def isPosterImage(path):
     basename = os.path.split(path)[1]
     return os.path.splitext(basename)[0].lower() in ['folder', 'poster', 'show']
@@ -1,32 +1,157 @@
+import atexit
 import logging
 import os
 import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
 
 from pdst.db.metadata import MetadataType, BaseMetadata, EpisodeMetadata
 
 log = logging.getLogger(__name__)
 
+# (pid, real db path) -> PlexConnection
+_connections = {}
+_connectionsLock = threading.Lock()
 
-class PlexDao:
 
-    PLEX_DB_PATH = os.path.join('Plug-in Support', 'Databases', 'com.plexapp.plugins.library.db')
+class PlexConnection:
+    """A single long-lived, read-only connection to a Plex library database
 
-    def __init__(self, libraryPath):
-        self.dbPath = self.PLEX_DB_PATH
-        if libraryPath is not None:
-            self.dbPath = os.path.join(libraryPath, self.PLEX_DB_PATH)
+    Shared by every PlexDao for the same database in a process (and reopened, rather than reused, in a forked
+    child). Queries are serialized on the connection, and retried with backoff while Plex holds a write lock.
+    """
+
+    MMAP_SIZE = 256 * 1024 * 1024
+    CACHE_SIZE_KB = 64 * 1024
+    CACHED_STATEMENTS = 64
+    # seconds sqlite itself will wait on a lock, before we get a SQLITE_BUSY and back off
+    BUSY_TIMEOUT = 1.0
+    BUSY_RETRIES = 5
+    BUSY_BACKOFF = 0.1
 
-    def __getDbCursor(self):
-        conn = sqlite3.connect(self.dbPath)
+    def __init__(self, dbPath):
+        self.dbPath = dbPath
+        self.lock = threading.RLock()
+        self.conn = None
+
+    def __connect(self):
+        uri = f"file:{pathname2url(self.dbPath)}?mode=ro"
+        log.debug(f"Opening Plex database {uri}")
+
+        conn = sqlite3.connect(uri, uri=True, timeout=self.BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=self.CACHED_STATEMENTS)
         conn.row_factory = sqlite3.Row
-        return conn.cursor()
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {self.MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = -{self.CACHE_SIZE_KB}")
+        return conn
 
-    def getMetadataForEpisodeFile(self, filePath):
-        log.debug(f"Getting Metadata from DB for {filePath}")
+    def query(self, sql, params=()):
+        """Runs the (read-only) statement and returns all of its rows"""
+        delay = self.BUSY_BACKOFF
+        for attempt in range(self.BUSY_RETRIES + 1):
+            try:
+                with self.lock:
+                    if self.conn is None:
+                        self.conn = self.__connect()
+                    return self.conn.execute(sql, params).fetchall()
+
+            except sqlite3.OperationalError as e:
+                if not isBusyError(e) or attempt == self.BUSY_RETRIES:
+                    raise
+
+                log.debug(f"Plex database is busy, retrying in {delay}s")
+                time.sleep(delay)
+                delay *= 2
+
+    def queryOne(self, sql, params=()):
+        rows = self.query(sql, params)
+        return rows[0] if len(rows) > 0 else None
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+def isBusyError(error):
+    name = getattr(error, 'sqlite_errorname', None)
+    if name is not None:
+        return name.startswith('SQLITE_BUSY') or name.startswith('SQLITE_LOCKED')
+
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def getConnection(dbPath):
+    """Returns this process' shared connection to the given database"""
+    key = (os.getpid(), os.path.realpath(dbPath))
+    with _connectionsLock:
+        connection = _connections.get(key)
+        if connection is None:
+            # anything still here from another pid was inherited through a fork, and isn't ours to use or close
+            for stale in [k for k in _connections if k[0] != key[0]]:
+                del _connections[stale]
+
+            connection = PlexConnection(dbPath)
+            _connections[key] = connection
+
+    return connection
+
+
+def closeConnections():
+    """Closes every Plex database connection opened by this process"""
+    pid = os.getpid()
+    with _connectionsLock:
+        for key, connection in list(_connections.items()):
+            if key[0] == pid:
+                connection.close()
+            del _connections[key]
+
+
+atexit.register(closeConnections)
 
-        cursor = self.__getDbCursor()
 
-        cursor.execute("""SELECT 
+# the metadata_items columns every metadata row is read with
+METADATA_COLUMNS = """meta.id,
+            meta.library_section_id,
+            meta.parent_id,
+            meta.metadata_type,
+            meta.guid,
+            meta.title,
+            meta.summary,
+            meta.tags_genre as genres,
+            meta.year,
+            meta."index",
+            meta.user_thumb_url,
+            meta.duration,
+            meta.originally_available_at,
+            meta.added_at,
+            meta.created_at,
+            meta.hash"""
+
+# the episode for a media file, followed by each of its ancestors (season, show), nearest first. Only the episode's
+# row carries the media item/part extra_data
+EPISODE_CHAIN_FOR_FILE_SQL = """WITH RECURSIVE
+            part(metadata_item_id, extra_data, part_extra_data) AS (
+                SELECT mi.metadata_item_id, mi.extra_data, mp.extra_data
+                from media_parts mp
+                join media_items mi on mi.id = mp.media_item_id
+                where mp.file=?
+                limit 1
+            ),
+            chain(id, depth) AS (
+                SELECT metadata_item_id, 0 from part
+                UNION ALL
+                SELECT meta.parent_id, chain.depth + 1
+                from chain
+                join metadata_items meta on meta.id = chain.id
+                where meta.parent_id is not null and chain.depth < 8
+            )
+        SELECT 
+            chain.depth,
             meta.id,
             meta.library_section_id,
             meta.parent_id,
@@ -43,68 +168,247 @@ class PlexDao:
             meta.added_at,
             meta.created_at,
             meta.hash,
+            case when chain.depth = 0 then part.extra_data end as extra_data,
+            case when chain.depth = 0 then part.part_extra_data end as part_extra_data
+            from chain
+            join metadata_items meta on meta.id = chain.id
+            cross join part
+            order by chain.depth"""
+
+# the episode rows (with their file) for many media files at once, {params} is filled in with the placeholders
+EPISODES_FOR_FILES_SQL = """SELECT
+            mp.file,
+            """ + METADATA_COLUMNS + """,
             mi.extra_data,
             mp.extra_data as part_extra_data
             from media_parts mp
             join media_items mi on mi.id = mp.media_item_id
             join metadata_items meta on meta.id = mi.metadata_item_id
-            where mp.file=?""", [filePath])
+            where mp.file in ({params})
+            order by mp.id"""
+
+# the episode rows for every media file in a path range (i.e. everything under a directory)
+EPISODES_FOR_FILE_RANGE_SQL = """SELECT
+            mp.file,
+            """ + METADATA_COLUMNS + """,
+            mi.extra_data,
+            mp.extra_data as part_extra_data
+            from media_parts mp
+            join media_items mi on mi.id = mp.media_item_id
+            join metadata_items meta on meta.id = mi.metadata_item_id
+            where mp.file >= ? and mp.file < ?
+            order by mp.id"""
+
+# the episode rows for every media file in a library section
+EPISODES_FOR_SECTION_SQL = """SELECT
+            mp.file,
+            """ + METADATA_COLUMNS + """,
+            mi.extra_data,
+            mp.extra_data as part_extra_data
+            from metadata_items meta
+            join media_items mi on mi.metadata_item_id = meta.id
+            join media_parts mp on mp.media_item_id = mi.id
+            where meta.library_section_id = ? and meta.metadata_type = ?
+            order by mp.id"""
+
+# the given metadata items and all of their ancestors, {params} is filled in with the placeholders
+ANCESTORS_SQL = """WITH RECURSIVE
+            chain(id) AS (
+                SELECT id from metadata_items where id in ({params})
+                UNION
+                SELECT meta.parent_id
+                from chain
+                join metadata_items meta on meta.id = chain.id
+                where meta.parent_id is not null
+            )
+        SELECT
+            """ + METADATA_COLUMNS + """
+            from chain
+            join metadata_items meta on meta.id = chain.id"""
 
-        result = cursor.fetchone()
+# the (potential) parents of every episode in a library section
+SECTION_PARENTS_SQL = """SELECT
+            """ + METADATA_COLUMNS + """
+            from metadata_items meta
+            where meta.library_section_id = ? and meta.metadata_type in (?, ?)"""
+
+# media parts newer than a given one, with when their metadata item was added and its library section, oldest first
+PARTS_AFTER_SQL = """SELECT mp.id, mp.file, meta.added_at, mi.library_section_id
+            from media_parts mp
+            join media_items mi on mi.id = mp.media_item_id
+            left join metadata_items meta on meta.id = mi.metadata_item_id
+            where mp.id > ?
+            order by mp.id"""
+
+LAST_PART_SQL = """SELECT mp.id, meta.added_at
+            from media_parts mp
+            left join media_items mi on mi.id = mp.media_item_id
+            left join metadata_items meta on meta.id = mi.metadata_item_id
+            order by mp.id desc
+            limit 1"""
+
+# keep IN lists well under sqlite's (older) default limit of 999 bound parameters
+IN_CHUNK_SIZE = 500
+# episode -> season -> show, with room to spare
+MAX_CHAIN_DEPTH = 8
+
+
+class PlexDao:
+
+    PLEX_DB_PATH = os.path.join('Plug-in Support', 'Databases', 'com.plexapp.plugins.library.db')
+
+    def __init__(self, libraryPath):
+        self.dbPath = self.PLEX_DB_PATH
+        if libraryPath is not None:
+            self.dbPath = os.path.join(libraryPath, self.PLEX_DB_PATH)
+
+        # file path -> episode row followed by its ancestor rows, for files looked up in bulk
+        self.prefetched = {}
+        # metadata id -> row, for the ancestors of prefetched episodes
+        self.parents = {}
+        self.prefetchLock = threading.Lock()
+
+    def __getConnection(self):
+        return getConnection(self.dbPath)
+
+    def close(self):
+        """Closes the (shared) connection to this library's database. It will be reopened if used again"""
+        self.__getConnection().close()
+
+    def getMetadataForEpisodeFile(self, filePath):
+        log.debug(f"Getting Metadata from DB for {filePath}")
+
+        rows = self.prefetched.get(filePath)
+        if rows is not None:
+            return episodeFromChain(rows)
+
+        rows = self.__getConnection().query(EPISODE_CHAIN_FOR_FILE_SQL, [filePath])
 
         metadata = None
-        if result is None:
+        if len(rows) == 0:
             log.info(f"Did not find a matching media_part entry for {filePath}")
+        elif rows[0]['metadata_type'] != MetadataType.EPISODE:
+            log.warning(f"Metadata for {filePath} is somehow NOT an episode??")
         else:
-            if result['metadata_type'] != MetadataType.EPISODE:
-                log.warning(f"Metadata for {filePath} is somehow NOT an episode??")
-            else:
-                epRow = result
-                season = None
-                show = None
-
-                parentId = result['parent_id']
-                while parentId is not None:
-                    parent = self.__getMetadataById(parentId, cursor)
-                    if parent.type == MetadataType.SEASON:
-                        season = parent
-                    elif parent.type == MetadataType.SHOW:
-                        show = parent
-                    else:
-                        log.warning(f"Unable to get metadata for {parentId}!")
-                        log.warning(f"Got: {parent}")
-
-                    parentId = parent.parentId
-
-                metadata = EpisodeMetadata(epRow, season, show)
+            metadata = episodeFromChain(rows)
 
         return metadata
 
-    def __getMetadataById(self, metadataId, cursor):
-        cursor.execute("""SELECT 
-            id,
-            library_section_id,
-            parent_id,
-            metadata_type,
-            guid,
-            title,
-            summary,
-            tags_genre as genres,
-            year,
-            "index",
-            user_thumb_url,
-            duration,
-            originally_available_at,
-            added_at,
-            created_at,
-            hash
-            from metadata_items
-            where id=?""", [metadataId])
-
-        result = cursor.fetchone()
+    def getMetadataForFiles(self, filePaths):
+        """Looks up the metadata for many files in a few queries, instead of one per file
 
-        metadata = None
-        if result is not None:
-            metadata = BaseMetadata(result)
+        Returns a dict of file path -> EpisodeMetadata for the files that were found. The results are also kept,
+        so later getMetadataForEpisodeFile calls for these files don't go back to the database.
+        """
+        return {filePath: episodeFromChain(self.prefetched[filePath]) for filePath in self.prefetchFiles(filePaths)}
 
-        return metadata
+    def prefetchFiles(self, filePaths):
+        """Loads the rows for the given files, as prefetchDirectory. Returns the file paths that were found"""
+        filePaths = list(dict.fromkeys(filePaths))
+        connection = self.__getConnection()
+
+        rows = []
+        for start in range(0, len(filePaths), IN_CHUNK_SIZE):
+            chunk = filePaths[start:start + IN_CHUNK_SIZE]
+            rows.extend(connection.query(EPISODES_FOR_FILES_SQL.format(params=placeholders(chunk)), chunk))
+
+        return self.__prefetchRows(rows)
+
+    def prefetchDirectory(self, dirPath, recursive=True):
+        """Loads the rows for every file the database has under the given directory in a couple of queries, so
+        later getMetadataForEpisodeFile calls for them don't go back to the database. Returns the file paths"""
+        prefix = os.path.join(dirPath, '')
+        # everything starting with the prefix sorts between it and the prefix with its last character incremented,
+        # which (unlike LIKE) can use the index on media_parts.file
+        upperBound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        rows = self.__getConnection().query(EPISODES_FOR_FILE_RANGE_SQL, [prefix, upperBound])
+
+        if not recursive:
+            rows = [row for row in rows if os.path.dirname(row['file']) == os.path.dirname(prefix)]
+
+        return self.__prefetchRows(rows)
+
+    def loadSection(self, librarySectionId):
+        """Loads the rows for every episode file in a library section in two queries, as prefetchDirectory"""
+        connection = self.__getConnection()
+
+        parents = connection.query(SECTION_PARENTS_SQL,
+                                   [librarySectionId, MetadataType.SEASON.value, MetadataType.SHOW.value])
+        with self.prefetchLock:
+            for row in parents:
+                self.parents[row['id']] = row
+
+        rows = connection.query(EPISODES_FOR_SECTION_SQL, [librarySectionId, MetadataType.EPISODE.value])
+        return self.__prefetchRows(rows)
+
+    def getPartsAfter(self, partId):
+        """Returns (id, file, added_at, library_section_id) rows for every media part newer than the given one,
+        oldest first
+
+        media_parts ids only ever increase, so this is everything Plex has added since that part.
+        """
+        return self.__getConnection().query(PARTS_AFTER_SQL, [partId])
+
+    def getLastPart(self):
+        """Returns the (id, added_at) row of the newest media part, or None for an empty library"""
+        return self.__getConnection().queryOne(LAST_PART_SQL)
+
+    def __prefetchRows(self, rows):
+        episodes = {}
+        for row in rows:
+            if row['file'] in episodes:
+                continue
+            if row['metadata_type'] != MetadataType.EPISODE:
+                log.warning(f"Metadata for {row['file']} is somehow NOT an episode??")
+                continue
+            episodes[row['file']] = row
+
+        self.__loadParents(set(row['parent_id'] for row in episodes.values() if row['parent_id'] is not None))
+
+        # only the rows are kept, the (comparatively slow to build) metadata objects are made as they're asked for
+        with self.prefetchLock:
+            for filePath, row in episodes.items():
+                chain = [row]
+                parentId = row['parent_id']
+                while parentId is not None and parentId in self.parents and len(chain) < MAX_CHAIN_DEPTH:
+                    parent = self.parents[parentId]
+                    chain.append(parent)
+                    parentId = parent['parent_id']
+
+                self.prefetched[filePath] = chain
+
+        log.debug(f"Prefetched metadata for {len(episodes)} files")
+        return list(episodes)
+
+    def __loadParents(self, parentIds):
+        with self.prefetchLock:
+            missing = [i for i in parentIds if i not in self.parents]
+
+        connection = self.__getConnection()
+        for start in range(0, len(missing), IN_CHUNK_SIZE):
+            chunk = missing[start:start + IN_CHUNK_SIZE]
+            rows = connection.query(ANCESTORS_SQL.format(params=placeholders(chunk)), chunk)
+            with self.prefetchLock:
+                for row in rows:
+                    self.parents[row['id']] = row
+
+
+def placeholders(values):
+    return ','.join('?' * len(values))
+
+
+def episodeFromChain(rows):
+    """Builds the EpisodeMetadata from an episode row followed by its ancestor rows"""
+    season = None
+    show = None
+
+    for row in rows[1:]:
+        parent = BaseMetadata(row)
+        if parent.type == MetadataType.SEASON:
+            season = parent
+        elif parent.type == MetadataType.SHOW:
+            show = parent
+        else:
+            log.warning(f"Unexpected parent metadata for episode {rows[0]['id']}: {parent}")
+
+    return EpisodeMetadata(rows[0], season, show)
@@ -1,3 +1,5 @@
+import copy
+import functools
 import re
 from configparser import ConfigParser, ExtendedInterpolation
 from datetime import datetime, timedelta, date, time
@@ -5,6 +7,11 @@ from enum import IntEnum
 
 from pdst import parsing
 
+PLEX_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+PLEX_TIMESTAMP = re.compile(r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d')
+GENRE_SEPARATOR = re.compile(r'[|,]\s?')
+MEDIA_GRAB_BEGINS = re.compile(r'mediaGrabBeginsAt=(\d+)', re.IGNORECASE)
+
 
 class MetadataType(IntEnum):
     SHOW = 2,
@@ -28,6 +35,65 @@ def byKeyOrNone(rowData, key):
     return result
 
 
+@functools.lru_cache(maxsize=4096)
+def parseTimestamp(value):
+    """Parses a Plex timestamp ('%Y-%m-%d %H:%M:%S'). The same few values come up over and over (e.g. for every
+    episode of a show), so results are cached"""
+    if PLEX_TIMESTAMP.fullmatch(value):
+        return datetime.fromisoformat(value)
+
+    return datetime.strptime(value, PLEX_TIMESTAMP_FORMAT)
+
+
+class MetadataSection(dict):
+    """Values from one section of a .metadata file, looked up case-insensitively like a ConfigParser section"""
+
+    def __missing__(self, key):
+        lowerKey = key.lower()
+        if lowerKey == key:
+            raise KeyError(key)
+        return self[lowerKey]
+
+
+def readMetadataSections(filename):
+    """Reads a .metadata file in the format writeToFile produces, without ConfigParser
+
+    Returns a dict of section name to MetadataSection, or None if the file uses anything beyond that format (comments
+    aside) and should be read with ConfigParser instead: continuation lines, interpolation, duplicates, etc.
+    """
+    try:
+        with open(filename) as f:
+            lines = f.read().split('\n')
+    except OSError:
+        return None
+
+    sections = {}
+    section = None
+    for line in lines:
+        if line == '' or line.isspace():
+            continue
+        if line[0].isspace():
+            return None
+
+        if line[0] == '[':
+            name = line.rstrip()
+            if name[-1] != ']' or name in ('[]', '[DEFAULT]') or name[1:-1] in sections:
+                return None
+            section = sections[name[1:-1]] = MetadataSection()
+            continue
+
+        if line[0] in '#;':
+            continue
+
+        (key, separator, value) = line.partition('=')
+        key = key.strip().lower()
+        if section is None or separator == '' or key == '' or ':' in key or '$' in value or key in section:
+            return None
+        section[key] = value.strip()
+
+    return sections
+
+
 class BaseMetadata:
 
     def __init__(self, rowData):
@@ -45,7 +111,7 @@ class BaseMetadata:
             self.summary = byKeyOrNone(rowData, 'summary')
 
             genres = byKeyOrNone(rowData, 'genres')
-            self.genres = re.split(r'[|,]\s?', genres) if genres is not None else []
+            self.genres = GENRE_SEPARATOR.split(genres) if genres is not None else []
 
             self.year = convertToIntOrNone(rowData, 'year')
             self.index = convertToIntOrNone(rowData, 'index')
@@ -56,24 +122,19 @@ class BaseMetadata:
             duration = convertToIntOrNone(rowData, 'duration')
             self.duration = timedelta(milliseconds=duration) if duration is not None else None
 
-            plex_timestamp_format = '%Y-%m-%d %H:%M:%S'
-
             origAvail = byKeyOrNone(rowData, 'originally_available_at')
-            self.originallyAvailable = datetime.strptime(origAvail, plex_timestamp_format) \
-                if origAvail is not None else None
+            self.originallyAvailable = parseTimestamp(origAvail) if origAvail is not None else None
 
             added = byKeyOrNone(rowData, 'added_at')
-            self.added = datetime.strptime(added, plex_timestamp_format) \
-                if added is not None else None
+            self.added = parseTimestamp(added) if added is not None else None
 
             created = byKeyOrNone(rowData, 'created_at')
-            self.created = datetime.strptime(created, plex_timestamp_format) \
-                if created is not None else None
+            self.created = parseTimestamp(created) if created is not None else None
 
             release = byKeyOrNone(rowData, 'release')
             releaseTime = byKeyOrNone(rowData, 'releaseTime')
             if release is not None and releaseTime is not None:
-                self.release = datetime.strptime(f"{release} {releaseTime}", plex_timestamp_format)
+                self.release = parseTimestamp(f"{release} {releaseTime}")
             else:
                 self.release = None
 
@@ -95,7 +156,7 @@ class EpisodeMetadata(BaseMetadata):
         self.partExtraData = byKeyOrNone(rowData, 'part_extra_data')
 
         if self.extraData is not None:
-            grabBegin = re.search(r'mediaGrabBeginsAt=(\d+)', self.extraData, re.IGNORECASE)
+            grabBegin = MEDIA_GRAB_BEGINS.search(self.extraData)
             if grabBegin is not None:
                 timestamp = grabBegin.groups(1)[0]
                 self.mediaGrabBegan = datetime.fromtimestamp(int(timestamp))
@@ -106,6 +167,13 @@ class EpisodeMetadata(BaseMetadata):
         self.season = seasonMetadata
         self.show = showMetadata
 
+    def copy(self):
+        """Returns a copy (along with its season and show) that can be changed without affecting this one"""
+        result = copy.copy(self)
+        result.season = copy.copy(self.season)
+        result.show = copy.copy(self.show)
+        return result
+
     def __getOriginalTimestampGuess(self):
         # better TIME data
         bestTimesOrder = [self.release, self.mediaGrabBegan, self.recordingStarted, self.added, self.originallyAvailable]
@@ -172,8 +240,10 @@ class EpisodeMetadata(BaseMetadata):
 
     @staticmethod
     def fromFile(filename):
-        config = ConfigParser(interpolation=ExtendedInterpolation())
-        config.read(filename)
+        config = readMetadataSections(filename)
+        if config is None:
+            config = ConfigParser(interpolation=ExtendedInterpolation())
+            config.read(filename)
 
         episodeData = config['metadata'] if 'metadata' in config else {}
         seasonData = config['Season'] if 'Season' in config else {}
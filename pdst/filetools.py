@@ -1,6 +1,10 @@
+import collections
+import errno
 import glob
 import logging
 import os
+import shutil
+import threading
 from datetime import datetime, timedelta
 
 from unidecode import unidecode
@@ -10,6 +14,15 @@ from pdst import parsing
 log = logging.getLogger(__name__)
 
 FILE_DATETIME_FORMAT = '%Y-%m-%d %H %M %S'
+ONE_SECOND = timedelta(seconds=1)
+
+# bytes handed to the kernel per copy_file_range/sendfile call
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+# errors from copy_file_range/sendfile that mean they can't be used for these files, rather than a failed copy
+UNSUPPORTED_COPY_ERRORS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+PARTIAL_SUFFIX = '.pdst-part'
+# directories Plex makes alongside the media, which are never searched for media or logos
+IGNORED_DIRS = ['Plex Versions']
 
 
 def getBetterFilename(metadata):
@@ -31,24 +44,133 @@ def getBetterFilename(metadata):
     return unaccented
 
 
-def getMoveDestinationFilename(originalFilename, metadata, destinationDir):
-    originalBase = os.path.basename(originalFilename)
+class TimestampIndex:
+    """The timestamps taken by the files in one directory, for picking names that don't collide with them
+
+    The directory is listed when the index is created, and listed again by claim() whenever its mtime has changed
+    since, so files put there by anything else are seen too. Names picked with claim() (and anything passed to add())
+    are recorded as they are handed out, so they stay taken before the files are moved in.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        # timestamp -> names of the files with it
+        self.taken = {}
+        self.names = set()
+        # timestamp -> the last free timestamp found starting from it, so runs of taken seconds are only walked once
+        self.hints = {}
+        self.lock = threading.RLock()
+        # of the directory when it was last listed, None if it didn't exist
+        self.mtime = None
+
+        self.__list()
+
+    def __list(self):
+        try:
+            self.mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            self.mtime = None
 
-    destNames = [os.path.basename(f) for f in os.scandir(destinationDir)]
-    matchingTimestamp = True
+        try:
+            for entry in os.scandir(self.directory):
+                self.add(os.path.basename(entry))
+        except FileNotFoundError:
+            # not created yet, e.g. when planning a move
+            pass
+
+    def refresh(self):
+        """Lists the directory again if it has changed since it was last listed. Names are only ever added, so
+        claimed names stay taken. Returns True if it was listed again"""
+        with self.lock:
+            try:
+                mtime = os.stat(self.directory).st_mtime_ns
+            except FileNotFoundError:
+                return False
+
+            if mtime == self.mtime:
+                return False
+
+            self.hints = {}
+            self.__list()
+        return True
+
+    def add(self, name):
+        with self.lock:
+            self.names.add(name)
+            self.taken.setdefault(getTimestampFromFilename(name), set()).add(name)
+
+    def isTaken(self, timestamp, ignoreName=None):
+        names = self.taken.get(timestamp)
+        return names is not None and len(names - {ignoreName}) > 0
+
+    def nextFree(self, timestamp, ignoreName=None):
+        """The first second, starting at the given timestamp, that no file (other than ignoreName) has"""
+        with self.lock:
+            # a hint could skip over a second that is only taken by the ignored file, so don't use them for it
+            useHints = ignoreName not in self.names
+            candidate = self.hints.get(timestamp, timestamp) if useHints else timestamp
+            while self.isTaken(candidate, ignoreName):
+                candidate = candidate + ONE_SECOND
+
+            if useHints:
+                self.hints[timestamp] = candidate
+            return candidate
+
+    def claim(self, metadata, ignoreName=None):
+        """Returns the better filename for the metadata, with its release moved forward until its timestamp is free,
+        and records it as taken"""
+        with self.lock:
+            self.refresh()
+            while True:
+                destFilename = getBetterFilename(metadata)
+                destTs = getTimestampFromFilename(destFilename)
+                if destTs is None:
+                    break
+
+                freeTs = self.nextFree(destTs, ignoreName)
+                if freeTs == destTs:
+                    break
+                metadata.release = metadata.release + (freeTs - destTs)
+
+            self.add(destFilename)
+            return destFilename
+
+
+class DestinationIndex:
+    """TimestampIndexes for every directory files are moved into during a run, each built the first time it's used
+
+    With maxDirectories, only that many of the most recently used are kept. That's only safe when each file is moved
+    right after its name is claimed (as watch does), since a dropped index forgets names claimed but not yet moved.
+    """
+
+    def __init__(self, maxDirectories=None):
+        self.indexes = collections.OrderedDict()
+        self.maxDirectories = maxDirectories
+        self.lock = threading.Lock()
+
+    def get(self, directory):
+        with self.lock:
+            index = self.indexes.get(directory)
+            if index is None:
+                index = self.indexes[directory] = TimestampIndex(directory)
+            self.indexes.move_to_end(directory)
 
-    while matchingTimestamp:
-        matchingTimestamp = False
-        destFilename = getBetterFilename(metadata)
-        destTs = getTimestampFromFilename(destFilename)
+            if self.maxDirectories is not None:
+                while len(self.indexes) > self.maxDirectories:
+                    self.indexes.popitem(last=False)
+            return index
 
-        for checkFile in destNames:
-            checkTs = getTimestampFromFilename(checkFile)
-            if checkTs == destTs and originalBase != checkFile:
-                matchingTimestamp = True
-                metadata.release = metadata.release + timedelta(seconds=1)
 
-    return destFilename
+def getMoveDestinationFilename(originalFilename, metadata, destinationDir, destinationIndex=None):
+    """Returns the better filename for the metadata, with the release pushed forward a second at a time until it
+    doesn't share a timestamp with anything else in the destination
+
+    Pass a DestinationIndex when moving many files, so each destination directory is only listed once.
+    """
+    originalBase = os.path.basename(originalFilename)
+
+    index = destinationIndex.get(destinationDir) if destinationIndex is not None else TimestampIndex(destinationDir)
+    return index.claim(metadata, ignoreName=originalBase)
 
 
 def getTimestampFromFilename(filename):
@@ -97,7 +219,7 @@ def getImageFilesInDir(path):
 
 
 def notIgnoredDir(dirEntry):
-    return dirEntry.is_dir() and dirEntry.name not in ['Plex Versions']
+    return dirEntry.is_dir() and dirEntry.name not in IGNORED_DIRS
 
 
 def getAllImageFilesInHierarchy(path):
@@ -137,6 +259,100 @@ def getPlexAssociatedFiles(filePath):
     return glob.iglob(fileBase + ".*")
 
 
+def _copyFileRange(srcFd, dstFd):
+    while os.copy_file_range(srcFd, dstFd, COPY_CHUNK_SIZE) > 0:
+        pass
+
+
+def _sendfile(srcFd, dstFd):
+    while os.sendfile(dstFd, srcFd, None, COPY_CHUNK_SIZE) > 0:
+        pass
+
+
+def copyFileContents(src, dst):
+    """Copies the contents of src to dst inside the kernel where it can (copy_file_range, then sendfile), without
+    passing the data through python, falling back to a plain read/write loop"""
+    copiers = []
+    if hasattr(os, 'copy_file_range'):
+        copiers.append(_copyFileRange)
+    if hasattr(os, 'sendfile'):
+        copiers.append(_sendfile)
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        for copier in copiers:
+            try:
+                copier(fsrc.fileno(), fdst.fileno())
+                return
+            except OSError as e:
+                # only try something else if nothing has been copied yet
+                if e.errno not in UNSUPPORTED_COPY_ERRORS or os.lseek(fdst.fileno(), 0, os.SEEK_CUR) != 0:
+                    raise
+                log.debug(f"{copier.__name__} can't copy {src} to {dst}: {e}")
+
+        shutil.copyfileobj(fsrc, fdst, COPY_CHUNK_SIZE)
+
+
+def copyFile(src, dst):
+    """Like shutil.copy (contents and permission bits), using copyFileContents"""
+    copyFileContents(src, dst)
+    shutil.copymode(src, dst)
+
+
+def renameWithoutReplacing(src, dst):
+    """os.rename, except that it raises FileExistsError rather than replacing an existing (different) dst
+
+    Hard links src to dst and removes src, which fails if dst exists. Where hard links aren't supported, falls back to
+    checking for dst before renaming.
+    """
+    try:
+        os.link(src, dst, follow_symlinks=False)
+    except FileExistsError:
+        if not os.path.samefile(src, dst):
+            raise
+        os.rename(src, dst)
+        return
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            raise
+        # no hard link support, fall back to check-then-rename
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+        os.rename(src, dst)
+        return
+
+    os.unlink(src)
+
+
+def moveFile(src, dst):
+    """Renames src to dst, or when they are on different filesystems, copies it and then deletes the original
+
+    Raises FileExistsError rather than replacing an existing dst. A cross-device copy is written next to dst and
+    renamed into place once complete, so dst never holds a partial file. Returns True if the file had to be copied.
+    """
+    try:
+        renameWithoutReplacing(src, dst)
+        return False
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    if os.path.lexists(dst):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+
+    partial = dst + PARTIAL_SUFFIX
+    try:
+        copyFileContents(src, partial)
+        shutil.copystat(src, partial)
+        renameWithoutReplacing(partial, dst)
+    except BaseException:
+        if os.path.lexists(partial):
+            os.remove(partial)
+        raise
+
+    os.remove(src)
+    return True
+
+
 def getResourceFilePath(resourceRelativeFilePath):
     moduleDir = os.path.dirname(__file__)
     return os.path.abspath(os.path.join(moduleDir, 'resources', resourceRelativeFilePath))
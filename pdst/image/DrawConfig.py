@@ -3,7 +3,7 @@ import logging
 from PIL import ImageColor, Image
 
 from pdst import parsing, analysis
-from pdst.image import generators, util
+from pdst.image import generators, util, LogoCache
 from pdst.image.spec import StrokeSpec, ColorOverlaySpec
 from pdst.image.util import fitToBounds, getLightness
 
@@ -26,15 +26,17 @@ class LogoDrawConfig:
         else:
             self.colors = imageSpec.colors
 
+        hints = parsing.getImageHints(imageSpec.imageFile)
+
         bg = imageSpec.bg
         if bg is None:
-            bg = parsing.getBgPatternHint(imageSpec.imageFile)
+            bg = hints.bg
 
         self.bgGenerator = generators.bgGenFromString(bg)
         self.resizeFunction = fitToBounds
 
         if imageSpec.invert is None:
-            self.invertLogo = parsing.isColorInverted(imageSpec.imageFile)
+            self.invertLogo = hints.isInverted()
         else:
             self.invertLogo = imageSpec.invert
 
@@ -49,6 +51,12 @@ class LogoDrawConfig:
             self.logoResizedDimensions = self.resizeFunction(self.getLogoImage().size, self.logoBounds)
         return self.logoResizedDimensions
 
+    def getLogoResized(self, size=None):
+        """The logo resized to size (getLogoResizedSize() by default), from the logo cache where possible"""
+        if size is None:
+            size = self.getLogoResizedSize()
+        return LogoCache.getResized(self.imageSpec.imageFile, size)
+
     def __getColors(self, imagePath):
         log.debug(f"Trying to get colors from {imagePath}")
 
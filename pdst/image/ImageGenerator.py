@@ -11,6 +11,8 @@ from pdst.image.util import calculateTopLeftCentered
 
 log = logging.getLogger(__name__)
 
+COMPOSITING_BACKENDS = ['pil', 'numpy']
+
 
 class ImageGenerator:
 
@@ -19,6 +21,17 @@ class ImageGenerator:
         self.thumbnailSize = config.thumbnailSize
         self.fallbackColor = config.fallbackColor
         self.preventSimilarColors = config.preventSimilarColors
+        self.drawLayers = self.__getDrawLayers(config.compositingBackend)
+
+    @staticmethod
+    def __getDrawLayers(backend):
+        if backend == 'numpy':
+            from pdst.image import arraydrawing
+            return arraydrawing.drawLayers
+        elif backend == 'pil':
+            return drawLayers
+        else:
+            raise ValueError(f"Unknown compositingBackend '{backend}', expected one of {COMPOSITING_BACKENDS}")
 
     def generateImage(self, compositeSpec, imageSpecs):
         numImages = len(imageSpecs)
@@ -51,7 +64,7 @@ class ImageGenerator:
             logoGroup.offset = compositor.getPartTopLeft(i)
             specs.append(logoGroup)
 
-        outImage = drawLayers(baseImage, specs)
+        outImage = self.drawLayers(baseImage, specs)
         return outImage
 
     def __drawLogoAndBackground(self, compositor, partNum):
@@ -84,9 +97,8 @@ class ImageGenerator:
         return LayerGroupSpec([backgroundLayerSpec, logoLayerSpec])
 
     def __getLayerSpec(self, drawCfg):
-        logo = drawCfg.getLogoImage()
         logoSize = drawCfg.getLogoResizedSize()
-        logoResized = logo.resize(logoSize, Image.LANCZOS)
+        logoResized = drawCfg.getLogoResized(logoSize)
         centerXY = drawCfg.logoCenterXY
         logoPosition = calculateTopLeftCentered(logoSize, centerXY[0], centerXY[1])
 
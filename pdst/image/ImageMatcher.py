@@ -1,9 +1,11 @@
 import logging
 import os
 
-from fuzzywuzzy import process, fuzz
+from fuzzywuzzy import process
 
-from pdst import parsing, filetools
+from pdst import filetools
+from pdst.image.LogoIndex import LogoIndex
+from pdst.image.matching import CandidateNames
 
 log = logging.getLogger(__name__)
 
@@ -13,9 +15,36 @@ class ImageMatcher:
     GOOD_MATCH_THRESHOLD = 60  # TODO: make this configurable!
     GREAT_MATCH_THRESHOLD = 85  # TODO: make this configurable!
 
-    def __init__(self, rootDir):
+    def __init__(self, rootDir, logoIndex=None, saveIndex=False):
         log.debug(f"ImageMatcher root image dir is {rootDir}")
         self.rootDir = rootDir
+        self.logoIndex = logoIndex if logoIndex is not None else LogoIndex.forRoot(rootDir, persist=saveIndex)
+
+    def __getSubdirs(self, relDir):
+        subdirs = None
+        if self.logoIndex is not None:
+            subdirs = self.logoIndex.getSubdirs(relDir)
+
+        if subdirs is None:
+            subdirs = filetools.getSubdirs(os.path.join(self.rootDir, relDir))
+
+        return subdirs
+
+    def __getImagesInDir(self, relDir):
+        candidates = None
+        if self.logoIndex is not None:
+            candidates = self.logoIndex.getCandidates(relDir)
+
+        if candidates is None:
+            candidates = CandidateNames(filetools.getImageFilesInDir(os.path.join(self.rootDir, relDir)))
+
+        return candidates
+
+    def __getAllImages(self):
+        if self.logoIndex is not None:
+            return self.logoIndex.getAllCandidates()
+
+        return CandidateNames(filetools.getAllImageFilesInHierarchy(self.rootDir))
 
     def findMatchingImageDirs(self, refParentDir, refGrandparentDir):
         """Tries to find corresponding image directories in the image tree to match the given parent and 
@@ -23,7 +52,7 @@ class ImageMatcher:
         """
         log.debug(f"Searching for matching image dirs to match {refParentDir} and {refGrandparentDir}")
 
-        topLevelDirs = filetools.getSubdirs(self.rootDir)
+        topLevelDirs = self.__getSubdirs('')
 
         if topLevelDirs is None or len(topLevelDirs) == 0:
             return (None, None)
@@ -43,7 +72,7 @@ class ImageMatcher:
         if gpMatch[1] > pMatch[1] and self.__isGoodMatch(gpMatch):
             # refGrandparentDir is probably sport, look for refParentDir match in its subdirectories
             sportDir = gpMatch[0]
-            secondLevelDirs = filetools.getSubdirs(os.path.join(self.rootDir, sportDir))
+            secondLevelDirs = self.__getSubdirs(sportDir)
 
             if secondLevelDirs is not None and len(secondLevelDirs) > 0:
                 bestSecondMatch = process.extractOne(refParentDir, secondLevelDirs)
@@ -97,7 +126,7 @@ class ImageMatcher:
         bestMatch = None
         if sportDir:
             fullSportDir = os.path.join(self.rootDir, sportDir)
-            sportsDirImages = filetools.getImageFilesInDir(fullSportDir)
+            sportsDirImages = self.__getImagesInDir(sportDir)
 
             sportDirMatch = self.__extractImageMatch(team, sportsDirImages)
             log.debug(f"Sport Dir Match: {sportDirMatch}")
@@ -107,7 +136,7 @@ class ImageMatcher:
 
             if seasonDir is not None:
                 fullSeasonDir = os.path.join(fullSportDir, seasonDir)
-                seasonDirImages = filetools.getImageFilesInDir(fullSeasonDir)
+                seasonDirImages = self.__getImagesInDir(os.path.join(sportDir, seasonDir))
 
                 seasonDirMatch = self.__extractImageMatch(team, seasonDirImages)
                 log.debug(f"Season Dir Match: {seasonDirMatch}")
@@ -117,7 +146,7 @@ class ImageMatcher:
                     bestMatch = os.path.join(fullSeasonDir, seasonDirMatch[0])
 
         if bestMatch is None:  # TODO: This needs improvement
-            allImages = filetools.getAllImageFilesInHierarchy(self.rootDir)
+            allImages = self.__getAllImages()
             allImagesMatch = self.__extractImageMatch(team, allImages)
             log.debug(f"Best *all* images match: {allImagesMatch}")
             if self.__matchAtLeast(allImagesMatch, self.GOOD_IMAGE_MATCH_THRESHOLD):
@@ -126,34 +155,9 @@ class ImageMatcher:
         log.debug(f"Best (acceptable) logo match for {team} seems to be {bestMatch}")
         return bestMatch
 
-    def __extractImageMatch(self, searchTarget, images):
-        bestMatch = None
-        bestCleaned = None
-        bestScore = 0
-
-        for dirtyFilename in images:
-            cleaned = parsing.cleanImageHints(dirtyFilename)
-            score = fuzz.partial_ratio(searchTarget, cleaned)
-            # log.debug(f'{cleaned} partial_ratio {score}')
-            if score > bestScore:
-                bestScore = score
-                bestMatch = dirtyFilename
-                bestCleaned = cleaned
-                # log.debug(f'current best is: {bestCleaned}')
-            elif score == bestScore:
-                # log.debug('same score as current best, comparing token_set_ratio as well')
-                thisTokenSetScore = fuzz.token_set_ratio(searchTarget, cleaned)
-                otherTokenSetScore = fuzz.token_set_ratio(searchTarget, bestCleaned)
-                # log.debug(f'{cleaned} token_set_ratio {thisTokenSetScore}')
-                # log.debug(f'{bestCleaned} token_set_ratio {otherTokenSetScore}')
-                if thisTokenSetScore > otherTokenSetScore:
-                    bestScore = score
-                    bestMatch = dirtyFilename
-                    bestCleaned = cleaned
-                    # log.debug(f'current best is: {bestCleaned}')
-
-        # log.debug(f'best match found: {bestMatch}')
-        return bestMatch, bestScore
+    def __extractImageMatch(self, searchTarget, candidates):
+        """Finds the best match for searchTarget in the given CandidateNames. Returns (image, score)"""
+        return candidates.bestMatch(searchTarget)
 
     def getLogo(self, teamSpec):
         return self.findBestMatch(teamSpec.teamName, teamSpec.sportName)
\ No newline at end of file
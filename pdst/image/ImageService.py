@@ -1,9 +1,8 @@
 import logging
 import os
 
-from pdst import parsing
 from pdst.Config import Config
-from pdst.MetadataService import MetadataService
+from pdst.MetadataService import MetadataService, EpisodeContext
 from pdst.SportService import SportService
 from pdst.db.PlexDao import PlexDao
 from pdst.image import ImageGenerationException
@@ -32,12 +31,18 @@ class ImageService:
     def generateEventThumbnail(self, filePath):
         log.debug(f"Generating thumbnail image for {filePath}")
 
-        imageSpecs = self.getImageSpecsForFilename(filePath)
+        (compositeSpec, imageSpecs) = self.getEventThumbnailSpecs(filePath)
+        return self.imageGen.generateImage(compositeSpec, imageSpecs)
+
+    def getEventThumbnailSpecs(self, filePath):
+        """Returns the (CompositeSpec, ImageSpecs) that the thumbnail for the file is rendered from"""
+        context = EpisodeContext(filePath, self.metadataService, self.sportService)
+        imageSpecs = self.getImageSpecsForFilename(filePath, context)
         if imageSpecs is None or len(imageSpecs) == 0:
             raise ImageGenerationException(f'No logos found for {filePath}')
 
-        compositeSpec = self.__getCompositeSpec(filePath)
-        return self.imageGen.generateImage(compositeSpec, imageSpecs)
+        compositeSpec = self.__getCompositeSpec(context)
+        return compositeSpec, imageSpecs
 
     def getMatchingImageName(self, inFile):
         return os.path.splitext(inFile)[0] + '.' + self.config.createdImageExtension
@@ -85,7 +90,7 @@ class ImageService:
                 if sportEntry.image is None:
                     log.debug(f"Sport {sportEntry.name} has no configured image or imageRoot")
             else:
-                matcher = ImageMatcher(sportEntry.imageRoot)
+                matcher = ImageMatcher(sportEntry.imageRoot, saveIndex=self.config.saveLogoIndex)
                 image = matcher.findBestMatch(teamName, sportEntry.name)
                 if image is None:
                     log.debug(f"No image match found for {teamName}")
@@ -97,26 +102,25 @@ class ImageService:
 
         return imageSpec
 
-    def getImageSpecsForFilename(self, filePath):
+    def getImageSpecsForFilename(self, filePath, context=None):
         log.debug(f"Getting image specs for {filePath}")
 
-        sportEntry = self.sportService.getSportFor(filePath)
+        if context is None:
+            context = EpisodeContext(filePath, self.metadataService, self.sportService)
+        sportEntry = context.sportEntry
 
         if sportEntry is None:
             raise ImageGenerationException(f"Unable to find a matching Sport entry for {filePath}!")
 
-        filename = os.path.split(filePath)[1]
-        (team1, team2) = parsing.teamNamesFromFilename(filename)
-        teamNames = removeNones([team1, team2])
         result = []
 
-        for team in teamNames:
+        for team in context.teamNames:
             teamSpec = self.__imageSpecFor(sportEntry, team)
             if teamSpec is not None:
                 result.append(teamSpec)
 
         if len(result) == 0:
-            title = parsing.titleFromFilename(filePath)
+            title = context.title
             if title is not None:
                 imageSpec = self.__imageSpecFor(sportEntry, title)
                 if imageSpec is not None:
@@ -135,14 +139,14 @@ class ImageService:
 
         return result
 
-    def __getCompositeSpec(self, filePath):
-        log.debug(f"Getting composite spec for {filePath}")
+    def __getCompositeSpec(self, context):
+        log.debug(f"Getting composite spec for {context.filePath}")
         dimensions = self.config.thumbnailSize
         text = None
 
-        metadata = self.metadataService.getMetadataForEpisodeFile(filePath)
-        sportEntry = self.sportService.getSportFor(filePath)
-        if metadata is not None and sportEntry is not None:
-            text = sportEntry.getImageTextFor(metadata)
+        sportEntry = context.sportEntry
+        # only sports with image text need the metadata at all
+        if sportEntry is not None and sportEntry.imageTextRegex is not None:
+            text = sportEntry.getImageTextFor(context.metadata)
 
         return CompositeSpec(dimensions, text)
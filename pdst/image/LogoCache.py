@@ -0,0 +1,187 @@
+import collections
+import hashlib
+import logging
+import os
+import threading
+
+import simplejson as json
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+DEFAULT_MAX_MEGABYTES = 128
+# sources at least this many times bigger than the target (in each direction) are shrunk by a whole factor (JPEG
+# while decoding, everything else with a box reduce) before the final resample, see Image.resize's reducing_gap
+REDUCING_GAP = 3.0
+# modes that survive a round trip through PNG unchanged, anything else is only cached in memory
+PERSISTED_MODES = ['RGBA', 'RGB', 'LA', 'L']
+
+_default = None
+_defaultLock = threading.Lock()
+
+
+def defaultCacheDir():
+    cacheHome = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cacheHome, 'pdst', 'logos')
+
+
+def _imageBytes(image):
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+
+class LogoCache:
+    """LRU cache of logos resized for drawing, bounded by the memory the images take up, optionally persisted to a
+    directory of PNGs
+
+    Entries are keyed by the logo's real path, size and mtime, along with the target size and resampling filter, so a
+    changed logo is never drawn from a stale entry. PIL is only imported once something is actually resized.
+    """
+
+    def __init__(self, cacheDir=None, maxBytes=DEFAULT_MAX_MEGABYTES * 1024 * 1024):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        # key -> resized image, least recently used first
+        self.entries = collections.OrderedDict()
+        self.totalBytes = 0
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def getResized(self, imageFile, size, resample=None):
+        """Returns a copy of the logo resized to size (with LANCZOS unless another filter is given), which the caller
+        is free to draw on"""
+        from PIL import Image
+
+        if resample is None:
+            resample = Image.LANCZOS
+        size = (int(size[0]), int(size[1]))
+
+        key = self.__key(imageFile, size, resample)
+        if key is None:
+            return self.__resize(imageFile, size, resample)
+
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return cached.copy()
+
+        cached = self.__loadPersisted(key)
+        if cached is None:
+            with self.lock:
+                self.misses += 1
+            cached = self.__resize(imageFile, size, resample)
+            self.__persist(key, cached)
+
+        self.__add(key, cached)
+        return cached.copy()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.totalBytes = 0
+
+    @staticmethod
+    def __resize(imageFile, size, resample):
+        from PIL import Image
+
+        with Image.open(imageFile) as image:
+            # only does anything for JPEGs, which can be decoded straight to a fraction of their full size
+            image.draft(image.mode, (int(size[0] * REDUCING_GAP), int(size[1] * REDUCING_GAP)))
+            resized = image.resize(size, resample, reducing_gap=REDUCING_GAP)
+        return resized
+
+    def __add(self, key, image):
+        size = _imageBytes(image)
+        if size > self.maxBytes:
+            return
+
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.totalBytes -= _imageBytes(previous)
+            self.entries[key] = image
+            self.totalBytes += size
+
+            while self.totalBytes > self.maxBytes:
+                (oldKey, oldImage) = self.entries.popitem(last=False)
+                self.totalBytes -= _imageBytes(oldImage)
+
+    def __persistedPath(self, key):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cacheDir, name[:2], name + '.png')
+
+    def __loadPersisted(self, key):
+        if self.cacheDir is None:
+            return None
+
+        from PIL import Image
+
+        path = self.__persistedPath(key)
+        try:
+            with Image.open(path) as image:
+                image.load()
+                if image.mode not in PERSISTED_MODES:
+                    return None
+                with self.lock:
+                    self.hits += 1
+                return image.copy()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning(f"Unable to read cached logo {path}: {e}")
+            return None
+
+    def __persist(self, key, image):
+        if self.cacheDir is None or image.mode not in PERSISTED_MODES:
+            return
+
+        path = self.__persistedPath(key)
+        tmpPath = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            image.save(tmpPath, format='PNG')
+            os.replace(tmpPath, path)
+        except OSError as e:
+            log.warning(f"Unable to write cached logo {path}: {e}")
+            if os.path.lexists(tmpPath):
+                os.remove(tmpPath)
+
+    @staticmethod
+    def __key(imageFile, size, resample):
+        if imageFile is None:
+            return None
+
+        try:
+            realPath = os.path.realpath(imageFile)
+            stat = os.stat(realPath)
+        except (OSError, TypeError, ValueError):
+            return None
+
+        return json.dumps([CACHE_VERSION, realPath, stat.st_size, stat.st_mtime_ns, size, int(resample)])
+
+
+def configure(cacheDir, maxBytes=DEFAULT_MAX_MEGABYTES * 1024 * 1024):
+    """Sets up the process-wide logo cache. A cacheDir of None keeps the cache in memory only"""
+    global _default
+    with _defaultLock:
+        _default = LogoCache(cacheDir, maxBytes)
+
+    return _default
+
+
+def getDefault():
+    """Returns the process-wide logo cache, an in-memory one if it hasn't been configured"""
+    global _default
+    with _defaultLock:
+        if _default is None:
+            _default = LogoCache()
+
+    return _default
+
+
+def getResized(imageFile, size, resample=None):
+    """Cached equivalent of opening imageFile and resizing it, this is what drawing code should call"""
+    return getDefault().getResized(imageFile, size, resample)
@@ -0,0 +1,351 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+import simplejson as json
+
+from pdst import parsing
+from pdst.filetools import IGNORED_DIRS
+from pdst.image.matching import CandidateNames
+
+log = logging.getLogger(__name__)
+
+INDEX_FILENAME = '.pdst-logo-index.json'
+INDEX_VERSION = 1
+
+IMAGE_EXTENSIONS = ['png', 'gif', 'jpg', 'jpeg']
+HIERARCHY_IMAGE_EXTENSIONS = ['png', 'jpg', 'jpeg']
+# a directory that's looked in is checked for changes (a stat) at most this often (in seconds), so logos added while a
+# long-running command is going are picked up, without every lookup having to stat its directories again
+REFRESH_INTERVAL = 5
+
+_indexes = {}
+_indexesLock = threading.Lock()
+
+
+class LogoIndex:
+    """Index of the logo images under an image root, optionally persisted to a sidecar file in the root directory
+
+    Holds, for each directory, its mtime, its subdirectories, and its image files along with their cleaned (team)
+    names and parsed filename hints. Directories are listed as they're looked in (or all at once by refresh), and
+    are only listed again once their mtime has changed.
+    """
+
+    def __init__(self, rootDir, indexFile=None):
+        self.rootDir = rootDir
+        self.indexFile = indexFile if indexFile is not None else os.path.join(rootDir, INDEX_FILENAME)
+        self.dirs = {}
+        self.dirty = False
+        # relDir (or None for the whole tree) -> CandidateNames, built on demand and dropped when the dir changes
+        self.candidates = {}
+        # relDir (or None for the whole tree) -> time.monotonic() of its last check against the disk
+        self.checked = {}
+        # whether changes are written back to the sidecar
+        self.persist = False
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def forRoot(rootDir, persist=False):
+        """Returns the index for the given image root, shared for the whole process
+
+        The index starts from the sidecar file if `pdst index` has written one, otherwise it's built up as
+        directories are looked in. With persist, changes are written back to the sidecar (on later calls, and at
+        exit).
+
+        Returns None if the root is not an existing directory
+        """
+        if rootDir is None or not os.path.isdir(rootDir):
+            return None
+
+        key = os.path.realpath(rootDir)
+        with _indexesLock:
+            index = _indexes.get(key)
+            if index is None:
+                index = LogoIndex(rootDir)
+                index.load()
+                _indexes[key] = index
+
+            if persist and not index.persist:
+                index.persist = True
+                atexit.register(index.saveChanges)
+
+        if index.persist:
+            index.saveChanges()
+
+        return index
+
+    def load(self):
+        """Loads the sidecar index file, if there is a usable one"""
+        try:
+            with open(self.indexFile) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            log.debug(f"No logo index at {self.indexFile}")
+            return False
+        except (OSError, ValueError) as e:
+            log.warning(f"Unable to read logo index {self.indexFile}, it will be rebuilt: {e}")
+            return False
+
+        if data.get('version') != INDEX_VERSION:
+            log.info(f"Logo index {self.indexFile} is from a different version, it will be rebuilt")
+            return False
+
+        with self.lock:
+            self.dirs = data.get('dirs', {})
+            self.candidates = {}
+            self.checked = {}
+        return True
+
+    def save(self):
+        """Writes the index to its sidecar file
+
+        The file is rewritten in place rather than replaced, since adding a new entry to the root directory
+        would change its mtime and make the next refresh think the root had changed.
+        """
+        with self.lock:
+            created = not os.path.exists(self.indexFile)
+            try:
+                self.__write()
+                if created and '' in self.dirs:
+                    self.dirs['']['mtime'] = os.stat(self.rootDir).st_mtime_ns
+                    self.__write()
+            except OSError as e:
+                log.warning(f"Unable to write logo index {self.indexFile}: {e}")
+                return False
+
+            self.dirty = False
+        return True
+
+    def saveChanges(self):
+        """Writes the index to its sidecar file, if it has changed since it was loaded or last saved"""
+        with self.lock:
+            if not self.dirty:
+                return False
+            return self.save()
+
+    def __write(self):
+        with open(self.indexFile, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'dirs': self.dirs}, f)
+
+    def refresh(self):
+        """Indexes the whole tree, re-listing only the directories whose mtime has changed since they were indexed,
+        and dropping the ones that are gone. Returns the number of directories (re-)listed
+
+        The changes are swapped in as new dicts rather than made in place, so a shared index can be read while
+        another thread changes it.
+        """
+        with self.lock:
+            now = time.monotonic()
+            dirs = dict(self.dirs)
+            seen = set()
+            rescanned = 0
+            pending = ['']
+            while pending:
+                relDir = pending.pop()
+                mtime = self.__mtime(relDir)
+                if mtime is None:
+                    continue
+
+                seen.add(relDir)
+                entry = dirs.get(relDir)
+                if entry is None or entry['mtime'] != mtime:
+                    entry = self.__scanDir(relDir, mtime)
+                    dirs[relDir] = entry
+                    rescanned += 1
+
+                pending.extend(os.path.join(relDir, d) for d in reversed(entry['subdirs']))
+
+            removed = [d for d in dirs if d not in seen]
+            for relDir in removed:
+                del dirs[relDir]
+
+            if rescanned > 0 or len(removed) > 0:
+                self.dirs = dirs
+                self.dirty = True
+                self.candidates = {}
+
+            self.checked = dict.fromkeys(list(seen) + [None], now)
+
+        return rescanned
+
+    def __getEntry(self, relDir):
+        """Returns the entry for the given dir, listing it if it hasn't been yet or if it has changed since it was
+        last checked (which is at most every REFRESH_INTERVAL). None if the dir doesn't exist"""
+        entry = self.dirs.get(relDir)
+        if entry is not None and not self.__isDue(relDir):
+            return entry
+
+        with self.lock:
+            entry = self.dirs.get(relDir)
+            if entry is not None and not self.__isDue(relDir):
+                return entry
+
+            mtime = self.__mtime(relDir)
+            if mtime is None:
+                if entry is not None:
+                    self.__replace(relDir, None)
+                return None
+
+            if entry is None or entry['mtime'] != mtime:
+                entry = self.__scanDir(relDir, mtime)
+                self.__replace(relDir, entry)
+
+            self.checked[relDir] = time.monotonic()
+        return entry
+
+    def __isDue(self, key):
+        checked = self.checked.get(key)
+        return checked is None or time.monotonic() - checked >= REFRESH_INTERVAL
+
+    def __replace(self, relDir, entry):
+        dirs = dict(self.dirs)
+        if entry is None:
+            dirs.pop(relDir, None)
+        else:
+            dirs[relDir] = entry
+
+        self.dirs = dirs
+        self.candidates = {key: value for key, value in self.candidates.items() if key is not None and key != relDir}
+        self.dirty = True
+
+    def __mtime(self, relDir):
+        try:
+            return os.stat(os.path.join(self.rootDir, relDir)).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def __scanDir(self, relDir, mtime):
+        log.debug(f"Indexing logo dir {relDir or self.rootDir}")
+        subdirs = []
+        linkedDirs = []
+        images = {}
+
+        for f in os.scandir(os.path.join(self.rootDir, relDir)):
+            if f.is_dir(follow_symlinks=False):
+                subdirs.append(f.name)
+            elif f.is_dir():
+                linkedDirs.append(f.name)
+            elif f.is_file() and os.path.splitext(f.name)[1][1:] in IMAGE_EXTENSIONS:
+                hints = parsing.getImageHints(f.name)
+                images[f.name] = {'name': hints.name, 'hints': hintsToDict(hints)}
+
+        return {'mtime': mtime, 'subdirs': subdirs, 'linkedDirs': linkedDirs, 'images': images}
+
+    def isIndexed(self, relDir):
+        return relDir in self.dirs
+
+    def getSubdirs(self, relDir=''):
+        """Returns the names of the (non-ignored) subdirectories of the given dir, or None if it doesn't exist"""
+        entry = self.__getEntry(relDir)
+        if entry is None:
+            return None
+
+        return [d for d in entry['subdirs'] + entry['linkedDirs'] if d not in IGNORED_DIRS]
+
+    def getImagesInDir(self, relDir=''):
+        """Returns a list of (filename, cleaned name) for the images directly in the given dir, or None if it
+        doesn't exist"""
+        entry = self.__getEntry(relDir)
+        if entry is None:
+            return None
+
+        return [(name, image['name']) for name, image in entry['images'].items()]
+
+    def getCandidates(self, relDir=''):
+        """Returns the images directly in the given dir prepared for fuzzy matching, or None if it doesn't exist"""
+        images = self.getImagesInDir(relDir)
+        if images is None:
+            return None
+
+        cache = self.candidates
+        candidates = cache.get(relDir)
+        if candidates is None:
+            candidates = CandidateNames(images)
+            cache[relDir] = candidates
+
+        return candidates
+
+    def getAllCandidates(self):
+        """Returns all images in the tree prepared for fuzzy matching"""
+        if self.__isDue(None):
+            images = self.getAllImages()
+            self.checked[None] = time.monotonic()
+        else:
+            images = None
+
+        cache = self.candidates
+        candidates = cache.get(None)
+        if candidates is None:
+            candidates = CandidateNames(images if images is not None else self.getAllImages())
+            cache[None] = candidates
+
+        return candidates
+
+    def getAllImages(self):
+        """Returns a list of (path relative to the root, cleaned name) for all images in the tree"""
+        return self.__allImages(self.__getEntry)
+
+    def __allImages(self, getEntry):
+        result = []
+        pending = ['']
+        while pending:
+            relDir = pending.pop()
+            entry = getEntry(relDir)
+            if entry is None:
+                continue
+
+            for name, image in entry['images'].items():
+                if os.path.splitext(name)[1][1:] in HIERARCHY_IMAGE_EXTENSIONS:
+                    result.append((os.path.join(relDir, name), image['name']))
+
+            pending.extend(os.path.join(relDir, d) for d in reversed(entry['subdirs']))
+
+        return result
+
+    def getHints(self, relPath):
+        """Returns the ImageHints stored for the image at the given path relative to the root, if indexed"""
+        (relDir, name) = os.path.split(relPath)
+        entry = self.__getEntry(relDir)
+        if entry is None or name not in entry['images']:
+            return None
+
+        image = entry['images'][name]
+        return hintsFromDict(image['name'], image['hints'])
+
+    def verify(self):
+        """Compares this index against a fresh scan of the tree
+
+        Returns a tuple of lists of relative paths: (missing from the index, no longer on disk)
+        """
+        fresh = LogoIndex(self.rootDir, self.indexFile)
+        fresh.refresh()
+
+        indexed = set(p for p, _ in self.__allImages(self.dirs.get))
+        actual = set(p for p, _ in fresh.getAllImages())
+
+        return sorted(actual - indexed), sorted(indexed - actual)
+
+
+def hintsToDict(hints):
+    if not hints.hasHints:
+        return None
+
+    return {
+        'colors': list(hints.colors),
+        'inverted': list(hints.inverted),
+        'bg': hints.bg,
+        'mask': hints.mask,
+        'stroke': [hints.strokeSize, hints.strokeColor],
+    }
+
+
+def hintsFromDict(name, data):
+    if data is None:
+        return parsing.ImageHints(name)
+
+    return parsing.ImageHints(name, hasHints=True, colors=tuple(data['colors']), inverted=tuple(data['inverted']),
+                              bg=data['bg'], mask=data['mask'],
+                              strokeSize=data['stroke'][0], strokeColor=data['stroke'][1])
+
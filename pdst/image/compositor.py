@@ -1,4 +1,5 @@
 import logging
+from functools import lru_cache
 
 from PIL import Image, ImageDraw, ImageFont
 
@@ -6,23 +7,52 @@ from pdst import filetools
 
 log = logging.getLogger(__name__)
 
+FONT_FILE = 'fonts/SourceSansPro-Bold.ttf'
+# how much of the canvas width text can take up
+MAX_TEXT_WIDTH = 0.95
 
-class BaseCompositor:
-    def __init__(self, partSpecs, compositeSpec):
-        self.partSpecs = partSpecs
-        self.numParts = len(partSpecs)
-        self.size = compositeSpec.size
-        self.compositeSpec = compositeSpec
 
-        text = compositeSpec.text
-        self.__initFont(text)
+@lru_cache(maxsize=64)
+def getFont(fontFile, fontSize):
+    """Memoized ImageFont.truetype, loaded fonts aren't changed by drawing with them so they're shared"""
+    log.debug(f"font: {fontFile} at {fontSize}")
+    return ImageFont.truetype(fontFile, fontSize)
+
+
+def fitFontSize(fontFile, text, maxFontSize, maxWidth):
+    """The largest font size, up to maxFontSize, at which text is no wider than maxWidth"""
+    if getFont(fontFile, maxFontSize).getlength(text) <= maxWidth:
+        return maxFontSize
+
+    # text gets (a little unevenly) wider with the font size, so binary search for the last size that fits
+    low = 1
+    high = maxFontSize - 1
+    while low < high:
+        mid = (low + high + 1) // 2
+        if getFont(fontFile, mid).getlength(text) <= maxWidth:
+            low = mid
+        else:
+            high = mid - 1
+
+    return low
+
+
+class TextLayout:
+    """The font and placement for the text along the bottom of a canvas, see getTextLayout"""
+
+    def __init__(self, size, text):
+        fontFile = filetools.getResourceFilePath(FONT_FILE)
+        fontSize = size[1] // 5
+        if text is not None:
+            fontSize = fitFontSize(fontFile, text, fontSize, size[0] * MAX_TEXT_WIDTH)
+        self.font = getFont(fontFile, fontSize)
 
         self.textBounds = (0, 0, 0, 0)
         self.textBgRect = (0, 0, 0, 0)
         self.textDrawPos = (0, 0)
 
-        w = self.size[0]
-        h = self.size[1]
+        w = size[0]
+        h = size[1]
         if text is not None:
             self.textBounds = self.font.getmask(text).getbbox()
 
@@ -40,6 +70,26 @@ class BaseCompositor:
 
             self.textDrawPos = textDrawX, textDrawY
 
+
+@lru_cache(maxsize=256)
+def getTextLayout(size, text):
+    """The TextLayout for text on a canvas of size, worked out once per canvas size and text"""
+    return TextLayout(size, text)
+
+
+class BaseCompositor:
+    def __init__(self, partSpecs, compositeSpec):
+        self.partSpecs = partSpecs
+        self.numParts = len(partSpecs)
+        self.size = compositeSpec.size
+        self.compositeSpec = compositeSpec
+
+        textLayout = getTextLayout(tuple(self.size), compositeSpec.text)
+        self.font = textLayout.font
+        self.textBounds = textLayout.textBounds
+        self.textBgRect = textLayout.textBgRect
+        self.textDrawPos = textLayout.textDrawPos
+
     def getPartFullSize(self, num):
         raise NotImplementedError()
 
@@ -61,23 +111,6 @@ class BaseCompositor:
         logoCenterXY = (logoCenterX, logoCenterY)
         return logoCenterXY
 
-    def __initFont(self, text):
-        fontSize = self.size[1] // 5
-        fontFile = filetools.getResourceFilePath('fonts/SourceSansPro-Bold.ttf')
-        log.debug(f"font: {fontFile}")
-        tempFont = ImageFont.truetype(fontFile, fontSize)
-
-        if text is not None:
-            textWidth = tempFont.getmask(text).getbbox()[2]
-
-            maxTextWidth = self.size[0] * 0.95
-            while textWidth > maxTextWidth:
-                fontSize = int(fontSize * (maxTextWidth / textWidth))
-                tempFont = ImageFont.truetype(fontFile, fontSize)
-                textWidth = tempFont.getmask(text).getbbox()[2]
-
-        self.font = ImageFont.truetype(fontFile, fontSize)
-
 
 class SingleImageCompositor(BaseCompositor):
     """Compositor for a single image"""
@@ -92,22 +125,25 @@ class SingleImageCompositor(BaseCompositor):
         return (0, 0), (self.size[0], safeH)
 
     def getPartMask(self, num):
-        return Image.new('L', self.size, color=255)
+        return _getFullMask(tuple(self.size)).copy()
 
     def getPartTopLeft(self, num):
         return 0, 0
 
 
-class SimpleCompositor(BaseCompositor):
-    """Basic two-image compositor that places the images side-by-side with a diagonal divider down the center"""
-    def __init__(self, compositeSpec, imageSpecs):
-        super().__init__(imageSpecs, compositeSpec)
+@lru_cache(maxsize=16)
+def _getFullMask(size):
+    return Image.new('L', size, color=255)
+
 
-        w = self.size[0]
-        h = self.size[1]
+class DividerLayout:
+    """Where the parts of a SimpleCompositor go on a canvas, and their masks, see getDividerLayout"""
+
+    def __init__(self, size, dividerPct):
+        w = size[0]
+        h = size[1]
         mid_w = w / 2
 
-        dividerPct = 16
         divider_size = int(w * (dividerPct / 100))
         log.debug(f"divider_size: {divider_size}")
 
@@ -116,6 +152,7 @@ class SimpleCompositor(BaseCompositor):
 
         log.debug(f"divider X: {dividerLX} -> {dividerRX}")
 
+        self.size = size
         self.divider_size = divider_size
         self.dividerLX = dividerLX
         self.dividerRX = dividerRX
@@ -127,6 +164,46 @@ class SimpleCompositor(BaseCompositor):
 
         self.logoSafeW = dividerRX - self.logoUnsafeX
 
+        self.masks = [self.__drawPartMask(num) for num in range(2)]
+
+    def getPartPoly(self, num):
+        topL = (num * self.divider_size, 0)
+        topR = (self.dividerRX, 0)
+        botR = (self.dividerLX + (num * self.divider_size), self.size[1])
+        botL = (0, self.size[1])
+
+        return [topL, topR, botR, botL, topL]
+
+    def __drawPartMask(self, num):
+        mask = Image.new('L', self.partSize, color=0)
+        draw = ImageDraw.Draw(mask)
+        draw.polygon(self.getPartPoly(num), fill=255)
+
+        return mask
+
+
+@lru_cache(maxsize=16)
+def getDividerLayout(size, dividerPct):
+    """The DividerLayout for a canvas of size, worked out once per canvas size and divider"""
+    return DividerLayout(size, dividerPct)
+
+
+class SimpleCompositor(BaseCompositor):
+    """Basic two-image compositor that places the images side-by-side with a diagonal divider down the center"""
+    dividerPct = 16
+
+    def __init__(self, compositeSpec, imageSpecs):
+        super().__init__(imageSpecs, compositeSpec)
+
+        layout = getDividerLayout(tuple(self.size), self.dividerPct)
+        self.layout = layout
+        self.divider_size = layout.divider_size
+        self.dividerLX = layout.dividerLX
+        self.dividerRX = layout.dividerRX
+        self.partSize = layout.partSize
+        self.logoUnsafeX = layout.logoUnsafeX
+        self.logoSafeW = layout.logoSafeW
+
     def getPartFullSize(self, num):
         log.debug(f"Part {num} full size: {self.partSize}")
         return self.partSize
@@ -138,26 +215,14 @@ class SimpleCompositor(BaseCompositor):
         return topL, (self.logoSafeW, safeH)
 
     def getPartMask(self, num):
-        poly = self.__getPartPoly(num)
-        mask = Image.new('L', self.partSize, color=0)
-        draw = ImageDraw.Draw(mask)
-        draw.polygon(poly, fill=255)
-
-        return mask
-
-    def __getPartPoly(self, num):
-        topL = (num * self.divider_size, 0)
-        topR = (self.dividerRX, 0)
-        botR = (self.dividerLX + (num * self.divider_size), self.size[1])
-        botL = (0, self.size[1])
-
-        return [topL, topR, botR, botL, topL]
+        """Returns the mask for part num, a copy the caller is free to draw on"""
+        return self.layout.masks[num].copy()
 
     def getPartTopLeft(self, num):
         return num * self.dividerLX, 0
 
     # def getPartLogoCenter(self, num):
-        # poly = self.__getPartPoly(num)
+        # poly = self.layout.getPartPoly(num)
         # _cx = 0
         # _cy = 0
         # _a = 0
@@ -1,7 +1,9 @@
 import logging
-from math import radians, cos, sin
+from math import radians, cos, sin, sqrt
 
+import numpy as np
 from PIL import Image, ImageFilter, ImageChops, ImageColor
+from scipy.ndimage import maximum_filter1d
 
 from pdst.image.spec import StrokeSpec, LayerGroupSpec, LayerSpec
 from pdst.image.util import withAlpha, transparentCopy, paste2
@@ -9,36 +11,87 @@ from pdst.image.util import withAlpha, transparentCopy, paste2
 log = logging.getLogger(__name__)
 
 
+def dilateDisk(alpha, radius):
+    """Grayscale dilation of a 2D uint8 array by a disk: each pixel becomes the max of everything within radius
+    of it. Done as a running max along each row of the disk (a handful of distinct widths) followed by a max over the
+    rows, so the cost grows with the radius instead of its square"""
+    if radius < 1:
+        return alpha.copy()
+
+    height = alpha.shape[0]
+    out = np.zeros_like(alpha)
+    rowMaxes = {}
+    for dy in range(-int(radius), int(radius) + 1):
+        halfWidth = int(sqrt(radius * radius - dy * dy))
+        rowMax = rowMaxes.get(halfWidth)
+        if rowMax is None:
+            rowMax = maximum_filter1d(alpha, 2 * halfWidth + 1, axis=1, mode='constant', cval=0)
+            rowMaxes[halfWidth] = rowMax
+
+        if dy >= 0:
+            np.maximum(out[:height - dy], rowMax[dy:], out=out[:height - dy])
+        else:
+            np.maximum(out[-dy:], rowMax[:height + dy], out=out[-dy:])
+
+    return out
+
+
+def strokeAlpha(maskImg, strokeSize):
+    """Returns the alpha of a stroke of strokeSize around the mask's shape, covering just the shape's bounding box
+    grown by the stroke, and where that box sits relative to the mask's top left. (None, None) if there is no shape"""
+    if maskImg.mode == 'RGBA':
+        alpha = maskImg.getchannel('A')
+    elif maskImg.mode == 'L':
+        alpha = maskImg
+    else:
+        alpha = Image.new('L', maskImg.size, 255)
+
+    bbox = alpha.getbbox()
+    if bbox is None:
+        return None, None
+
+    cropped = np.asarray(alpha.crop(bbox))
+    (height, width) = cropped.shape
+    padded = np.zeros((height + 2 * strokeSize, width + 2 * strokeSize), dtype=np.uint8)
+    padded[strokeSize:strokeSize + height, strokeSize:strokeSize + width] = cropped
+
+    # the extra half pixel reaches every pixel whose center is within the stroke size
+    dilated = dilateDisk(padded, strokeSize + 0.5).astype(np.uint16)
+    # firm up the anti-aliased edge the way two overlapping pastes of it would (1 - (1 - a)^2), which is what the
+    # stroke's edge always looked like when it was drawn by pasting the mask around a circle
+    dilated += dilated * (255 - dilated) // 255
+
+    return Image.fromarray(dilated.astype(np.uint8), 'L'), (bbox[0] - strokeSize, bbox[1] - strokeSize)
+
+
 def drawStroke(baseImage, strokeSpec, drawPoint, maskImg):
     if baseImage.mode != 'RGBA':
         baseImage = baseImage.convert('RGBA')
-
-    if maskImg.mode in ['RGBA', 'L']:
-        pasteMask = maskImg
     else:
-        pasteMask = None
+        baseImage = baseImage.copy()
 
-    strokeColor = strokeSpec.color
-    strokeBase = Image.new('RGBA', baseImage.size, withAlpha(strokeColor, 0))
-    strokeImg = Image.new('RGBA', maskImg.size, strokeColor)
     strokeSize = strokeSpec.size
+    if strokeSize <= 0:
+        return baseImage
+
+    (alpha, offset) = strokeAlpha(maskImg, strokeSize)
+    if alpha is None:
+        return baseImage
+
+    opacity = strokeSpec.opacity
+    if opacity < 1:
+        alpha = alpha.point(lambda a: int(a * opacity))
+    strokeImg = Image.new('RGBA', alpha.size, withAlpha(strokeSpec.color, 0))
+    strokeImg.putalpha(alpha)
+
+    # only composite where the stroke overlaps the base image
+    left = drawPoint[0] + offset[0]
+    top = drawPoint[1] + offset[1]
+    source = (max(0, -left), max(0, -top),
+              min(alpha.size[0], baseImage.size[0] - left), min(alpha.size[1], baseImage.size[1] - top))
+    if source[0] < source[2] and source[1] < source[3]:
+        baseImage.alpha_composite(strokeImg, (max(0, left), max(0, top)), source)
 
-    offsets = []
-    # Circle method
-    steps = 8 * strokeSize
-    for ds in range(0, steps):
-        rad = radians(ds * (360 / steps))
-        dx = strokeSize * cos(rad)
-        dy = strokeSize * sin(rad)
-        point = (round(drawPoint[0] + dx), round(drawPoint[1] + dy))
-        offsets.append(point)
-
-    for position in offsets:
-        strokeBase.paste(strokeImg, position, pasteMask)
-
-    strokeTransparent = Image.new('RGBA', baseImage.size, withAlpha(strokeColor, 0))
-    strokeAlpha = Image.blend(strokeTransparent, strokeBase, strokeSpec.opacity)
-    baseImage = Image.alpha_composite(baseImage, strokeAlpha)
     return baseImage
 
 
@@ -278,7 +278,7 @@ class BlurZoomGenerator(BaseBackgroundGenerator):
 
         img = drawConfig.getLogoImage()
         fullSize = fillBounds(img.size, baseImage.size)
-        imgResized = img.resize(fullSize, Image.LANCZOS)
+        imgResized = drawConfig.getLogoResized(fullSize)
         centerXY = drawConfig.logoCenterXY
         imgPosition = calculateTopLeftCentered(fullSize, centerXY[0], centerXY[1])
 
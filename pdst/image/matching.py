@@ -0,0 +1,109 @@
+import collections
+import logging
+
+from fuzzywuzzy import fuzz, utils
+
+from pdst import parsing
+
+log = logging.getLogger(__name__)
+
+PERFECT_SCORE = 100
+
+
+class CandidateNames:
+    """A set of logo images prepared for repeated fuzzy matching against team names
+
+    Hint stripping and token processing of the candidate names happens once, up front. Images that clean to the
+    same name are only scored once (the first such image is the one that can be returned, same as a linear scan).
+    Candidates whose characters rule out beating the best score so far aren't scored at all.
+    """
+
+    def __init__(self, images):
+        """images can be image paths, DirEntries, or (path, cleaned name) tuples as returned by the logo index"""
+        self.names = []
+        self.processed = []
+        self.images = []
+        self.counts = []
+
+        seen = set()
+        for image in images:
+            if isinstance(image, tuple):
+                (path, cleaned) = image
+            else:
+                path = image
+                cleaned = parsing.getImageHints(image).name
+
+            if cleaned in seen:
+                continue
+            seen.add(cleaned)
+
+            self.names.append(cleaned)
+            self.processed.append(utils.full_process(cleaned, force_ascii=True))
+            self.images.append(path)
+            self.counts.append(collections.Counter(cleaned))
+
+    def __len__(self):
+        return len(self.names)
+
+    def bestMatch(self, query):
+        """Returns (image, score) for the candidate that best matches the query, or (None, 0)
+
+        The best candidate has the highest partial_ratio score, with ties going to the higher token_set_ratio,
+        and then to the earlier candidate. Stops early if a candidate is perfect on both.
+        """
+        processedQuery = utils.full_process(query, force_ascii=True) if query is not None else ''
+        queryCounts = collections.Counter(query) if query is not None else None
+
+        bestIndex = None
+        bestScore = 0
+        bestTokenScore = None
+
+        for i, name in enumerate(self.names):
+            if bestScore > 1 and queryCounts is not None and not self.__couldScore(query, queryCounts, i, bestScore):
+                continue
+
+            score = fuzz.partial_ratio(query, name)
+            if score < bestScore or score == 0:
+                continue
+
+            if score > bestScore:
+                bestIndex = i
+                bestScore = score
+                bestTokenScore = None
+
+            else:
+                if bestTokenScore is None:
+                    bestTokenScore = self.__tokenSetScore(processedQuery, bestIndex)
+
+                tokenScore = self.__tokenSetScore(processedQuery, i)
+                if tokenScore > bestTokenScore:
+                    bestIndex = i
+                    bestTokenScore = tokenScore
+
+            if bestScore == PERFECT_SCORE:
+                if bestTokenScore is None:
+                    bestTokenScore = self.__tokenSetScore(processedQuery, bestIndex)
+                if bestTokenScore == PERFECT_SCORE:
+                    break
+
+        if bestIndex is None:
+            return None, 0
+
+        return self.images[bestIndex], bestScore
+
+    def __couldScore(self, query, queryCounts, index, score):
+        """Cheap check for whether partial_ratio could give the candidate at least the score
+
+        partial_ratio compares the shorter string (length n) with a window of the longer one no longer than it, so
+        with c characters in common it can't score better than 2c / (n + c). It rounds, so this allows for one less.
+        """
+        shorter = min(len(query), len(self.names[index]))
+        common = sum((queryCounts & self.counts[index]).values())
+        return common * 200 >= (score - 1) * (shorter + common)
+
+    def __tokenSetScore(self, processedQuery, index):
+        processedName = self.processed[index]
+        if len(processedQuery) == 0 or len(processedName) == 0:
+            return 0
+
+        return fuzz.token_set_ratio(processedQuery, processedName, full_process=False)
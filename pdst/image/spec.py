@@ -11,24 +11,24 @@ class ImageSpec:
         self.isLogo = isLogo
 
         if imageFile is not None and isLogo:
+            hints = parsing.getImageHints(imageFile)
+
             if colors is None or len(colors) == 0:
                 colors = util.getColorsForImage(imageFile)
 
             if bg is None:
-                bg = parsing.getBgPatternHint(imageFile)
+                bg = hints.bg
 
             if invert is None:
-                invert = parsing.isColorInverted(imageFile)
+                invert = hints.isInverted()
 
             if strokeSpec is None:
-                size, color = parsing.getStrokeHint(imageFile)
-                if size is not None and color is not None:
-                    strokeSpec = StrokeSpec(size, color)
+                if hints.strokeSize is not None and hints.strokeColor is not None:
+                    strokeSpec = StrokeSpec(hints.strokeSize, hints.strokeColor)
 
             if maskSpec is None:
-                maskHint = parsing.getMaskHint(imageFile)
-                if maskHint is not None:
-                    maskSpec = ColorOverlaySpec(maskHint)
+                if hints.mask is not None:
+                    maskSpec = ColorOverlaySpec(hints.mask)
 
         self.colors = colors
         self.bg = bg
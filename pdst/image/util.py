@@ -5,7 +5,7 @@ from math import sqrt
 import numpy as np
 from PIL import Image, ImageColor
 
-from pdst import analysis, parsing
+from pdst import ColorCache, parsing
 
 log = logging.getLogger(__name__)
 
@@ -192,7 +192,7 @@ def getAcceptableColor(imageSpec, otherColors):
                 if i >= len(potentialColors):
                     if not imageAnalyzed:
                         imageAnalyzed = True
-                        analyzedColors, pcts = analysis.getAllColors(imageSpec.imageFile)
+                        analyzedColors, pcts = ColorCache.getAllColors(imageSpec.imageFile)
                         bw = ['eee', 'fff', '111', '000']
                         potentialColors += analyzedColors + bw
                     else:  # if we reach here, there are no 'good' possible colors
@@ -202,13 +202,13 @@ def getAcceptableColor(imageSpec, otherColors):
 
 
 def getColorsForImage(imagePath):
-    colorHints = parsing.getAllColorsFromFilename(imagePath)
-    if colorHints is not None:
-        log.debug(f"Got color hints: {colorHints}")
-        return colorHints
+    hints = parsing.getImageHints(imagePath)
+    if hints.hasHints:
+        log.debug(f"Got color hints: {hints.colors}")
+        return list(hints.colors)
     else:
         log.debug("filename parsing failed")
-        (foundColors, pcts) = analysis.getAllColors(imagePath)
+        (foundColors, pcts) = ColorCache.getAllColors(imagePath)
         if len(foundColors) > 0:
             return foundColors
         else:
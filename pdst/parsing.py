@@ -2,6 +2,7 @@ import logging
 import os
 import re
 from datetime import timedelta
+from functools import lru_cache
 
 from pdst.sports import TeamSpec
 
@@ -14,6 +15,61 @@ MASK_MATCH = rf"mask\$({COLOR_HEX_MATCH})"
 STROKE_MATCH = rf"stroke\$(\d+)\$({COLOR_HEX_MATCH})"
 DELIM_HINT_MATCH = rf"{DELIMITER_MATCH}(?:{COLOR_HEX_MATCH}i?|{BG_PATTERN_MATCH}|{MASK_MATCH}|{STROKE_MATCH})"
 
+IMAGE_FILENAME_PATTERN = re.compile(rf"""
+    (?P<name>.+?)                               # name, e.g. team name
+    (?P<hints>(?:{DELIM_HINT_MATCH})*)          # all trailing hints
+    (?P<ext>\.\w+)$                             # extension
+    """, re.VERBOSE | re.IGNORECASE)
+
+IMAGE_HINT_TOKEN_PATTERN = re.compile(rf"""
+    {DELIMITER_MATCH}
+    (?:
+        (?P<color>{COLOR_HEX_MATCH})(?P<invert>i)?
+        |bg\$(?P<bg>[0-9a-z.]+)
+        |mask\$(?P<mask>{COLOR_HEX_MATCH})
+        |stroke\$(?P<strokeSize>\d+)\$(?P<strokeColor>{COLOR_HEX_MATCH})
+    )
+    """, re.VERBOSE | re.IGNORECASE)
+
+
+class ImageHints:
+    """All the hints parsed out of an image filename
+
+    Instances are shared between callers via the parse cache, so they should be treated as read-only
+    """
+
+    def __init__(self, name, extension=None, hasHints=False, colors=(), inverted=(), bg=None, mask=None,
+                 strokeSize=None, strokeColor=None):
+        self.name = name
+        self.extension = extension
+        self.hasHints = hasHints
+        self.colors = colors
+        self.inverted = inverted
+        self.bg = bg
+        self.mask = mask
+        self.strokeSize = strokeSize
+        self.strokeColor = strokeColor
+
+    def isInverted(self, position=0):
+        """Returns True if the color at the given position is flagged to invert, or None if there are no hints"""
+        if not self.hasHints:
+            return None
+
+        if len(self.inverted) == 0:
+            return False
+
+        if position >= len(self.inverted):
+            position = len(self.inverted) - 1
+
+        return self.inverted[position]
+
+    def __str__(self):
+        return f"[ImageHints: name={self.name}, colors={self.colors}, inverted={self.inverted}, bg={self.bg}, " \
+               f"mask={self.mask}, stroke=({self.strokeSize}, {self.strokeColor})]"
+
+    def __repr__(self):
+        return self.__str__()
+
 
 def removeBadFilenameChars(original):
     """Removes illegal filename characters"""
@@ -59,37 +115,59 @@ def teamNamesFromMatch(text):
     return match
 
 
-def cleanImageHints(imagePath):
-    """Removes any trailing image hints such as color, BG pattern, etc"""
-    log.debug(f"Extracting team name from '{imagePath}'")
+def getImageHints(imagePath):
+    """Returns the ImageHints parsed from the filename of the given image path (or DirEntry)"""
+    if imagePath is None:
+        return ImageHints(None)
 
-    pattern = re.compile(rf"""
-        (.+?)
-        (?:{DELIM_HINT_MATCH})*
-        (?:\.\w+)$
-        """, re.VERBOSE | re.IGNORECASE)
+    return parseImageHints(os.path.basename(os.fspath(imagePath)))
 
-    base = os.path.basename(imagePath)
-    match = pattern.match(base)
-    teamName = match.group(1)
-    log.debug(f"Assumed team name: '{teamName}'")
+
+@lru_cache(maxsize=8192)
+def parseImageHints(filename):
+    """Parses all trailing image hints from the given filename (no directory) in a single pass"""
+    match = IMAGE_FILENAME_PATTERN.match(filename)
+    if match is None:
+        return ImageHints(filename)
+
+    hintStr = match['hints']
+    if len(hintStr) == 0:
+        return ImageHints(match['name'], match['ext'])
+
+    colors = []
+    inverted = []
+    bg = None
+    mask = None
+    strokeSize = None
+    strokeColor = None
+
+    for token in IMAGE_HINT_TOKEN_PATTERN.finditer(hintStr):
+        if token['color'] is not None:
+            colors.append(token['color'])
+            inverted.append(token['invert'] is not None)
+        elif token['bg'] is not None:
+            bg = bg or token['bg']
+        elif token['mask'] is not None:
+            mask = mask or token['mask']
+        elif strokeSize is None:
+            strokeSize = int(token['strokeSize'])
+            strokeColor = token['strokeColor']
+
+    return ImageHints(match['name'], match['ext'], True, tuple(colors), tuple(inverted), bg, mask,
+                      strokeSize, strokeColor)
+
+
+def cleanImageHints(imagePath):
+    """Removes any trailing image hints such as color, BG pattern, etc"""
+    teamName = getImageHints(imagePath).name
+    log.debug(f"Assumed team name for '{imagePath}': '{teamName}'")
 
     return teamName
 
 
 def hasHints(path):
     """Returns True if the image path has one or more hex color codes in its image hints, False otherwise"""
-    log.debug(f"Testing if there is a trailing color code in '{path}'")
-
-    pattern = re.compile(rf"""
-        (.+?)
-        ({DELIM_HINT_MATCH})+
-        (\.\w+)$
-        """, re.VERBOSE | re.IGNORECASE)
-
-    base = os.path.basename(path)
-    match = pattern.match(base)
-    return match is not None
+    return getImageHints(path).hasHints
 
 
 def getColorFromFilename(path, position=0):
@@ -121,24 +199,11 @@ def getAllColorsFromFilename(path):
 
     log.debug(f"Pulling all color hints from '{path}'")
 
-    pattern = re.compile(rf"""
-        (?:.+?)
-        ((?:{DELIM_HINT_MATCH})+)
-        (?:\.\w+)$
-        """, re.VERBOSE | re.IGNORECASE)
-
-    match = pattern.match(path)
-    if match is None:
+    hints = getImageHints(path)
+    if not hints.hasHints:
         return None
 
-    allHints = match.group(1)
-
-    pattern2 = re.compile(r"""
-        (?:[\s.\-_]((?:[a-f0-9]{3}){1,2}))
-        """, re.VERBOSE | re.IGNORECASE)
-
-    colorMatches = pattern2.findall(allHints)
-    return colorMatches
+    return list(hints.colors)
 
 
 def setColorInFilename(file, colorHex, invert=False):
@@ -171,28 +236,7 @@ def setColorInFilename(file, colorHex, invert=False):
 
 def isColorInverted(path, position=0):
     """Returns True if the color at the given position in the filename is flagged to invert"""
-    pattern = re.compile(rf"""
-        (?:.+?)
-        ((?:{DELIM_HINT_MATCH})+)
-        (?:\.\w+)$
-        """, re.VERBOSE | re.IGNORECASE)
-
-    match = pattern.match(path)
-    if match is None:
-        return None
-
-    allHints = match.group(1)
-
-    pattern2 = re.compile(r"""
-        ((?:[a-f0-9]{3}){1,2}i?)
-        """, re.VERBOSE | re.IGNORECASE)
-
-    colorMatches = pattern2.findall(allHints)
-
-    if position >= len(colorMatches):
-        position = len(colorMatches) - 1
-
-    return colorMatches[position].endswith(('i', 'I'))
+    return getImageHints(path).isInverted(position)
 
 
 def removePlexShowYear(title):
@@ -226,37 +270,18 @@ def titleFromFilename(filename):
 
 def getBgPatternHint(filename):
     """Parses out a background pattern hint from the filename"""
-
-    pattern = re.compile(rf"(?:{DELIMITER_MATCH}{BG_PATTERN_MATCH}{DELIMITER_MATCH})", re.IGNORECASE)
-
-    match = pattern.search(filename)
-
-    if match is None:
-        return None
-
-    return match[1]
+    return getImageHints(filename).bg
 
 
 def getMaskHint(filename):
     """Parses out a mask hint from the filename"""
-    pattern = re.compile(rf"(?:{DELIMITER_MATCH}{MASK_MATCH}{DELIMITER_MATCH})", re.IGNORECASE)
-    match = pattern.search(filename)
-
-    if match is None:
-        return None
-
-    return match[1]
+    return getImageHints(filename).mask
 
 
 def getStrokeHint(filename):
-    """Parses out a mask hint from the filename"""
-    pattern = re.compile(rf"(?:{DELIMITER_MATCH}{STROKE_MATCH}{DELIMITER_MATCH})", re.IGNORECASE)
-    match = pattern.search(filename)
-
-    if match is None:
-        return None, None
-
-    return int(match[1]), match[2]
+    """Parses out a stroke hint (size, color) from the filename"""
+    hints = getImageHints(filename)
+    return hints.strokeSize, hints.strokeColor
 
 
 def isTeamsString(inStr):
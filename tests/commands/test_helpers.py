@@ -0,0 +1,143 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import click
+from parameterized import parameterized
+
+from pdst.cli import Environment
+from pdst.commands import helpers
+
+
+def slowerFirst(ctx, path):
+    name = os.path.basename(path)
+    # make earlier files finish later, so completion order is the reverse of submission order
+    time.sleep(0.05 * (5 - int(name[0])))
+    ctx.log(f"handled {name}")
+    return name.upper()
+
+
+def failOnThree(ctx, path):
+    if os.path.basename(path).startswith('3'):
+        raise ValueError('bad file')
+    ctx.log(f"handled {os.path.basename(path)}")
+
+
+def whichProcess(ctx, path):
+    return os.getpid()
+
+
+class TestHelpers(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.files = []
+        for i in range(5):
+            path = os.path.join(self.tempDir.name, f"{i}.txt")
+            with open(path, 'w') as f:
+                f.write(str(i))
+            self.files.append(path)
+
+        self.ctx = Environment()
+        self.ctx.jobs = 3
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    @parameterized.expand([
+        ('thread',),
+        ('process',),
+    ])
+    @patch('click.echo')
+    def test_results_in_order(self, pool, mockEcho):
+        with helpers.FileExecutor(self.ctx, slowerFirst, 3, pool=pool) as executor:
+            for path in self.files:
+                executor.submit(path)
+
+        self.assertEqual(self.files, [r.path for r in executor.results])
+        self.assertEqual(['0.TXT', '1.TXT', '2.TXT', '3.TXT', '4.TXT'], [r.result for r in executor.results])
+        self.assertEqual([f"handled {i}.txt" for i in range(5)], [c.args[0] for c in mockEcho.call_args_list])
+
+    def test_bounded_in_flight(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def handle(ctx, path):
+            with lock:
+                running.append(path)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(path)
+
+        with helpers.FileExecutor(self.ctx, handle, 4, pool='thread', maxInFlight=2) as executor:
+            for path in self.files:
+                executor.submit(path)
+                self.assertLessEqual(len(executor.inFlight), 2)
+
+        self.assertLessEqual(max(peak), 2)
+        self.assertEqual(5, len(executor.results))
+
+    def test_cpu_bound_uses_processes(self):
+        executor = helpers.FileExecutor(self.ctx, whichProcess, 2, bound=helpers.CPU_BOUND)
+        with executor:
+            executor.submit(self.files[0])
+
+        self.assertEqual('process', executor.pool)
+        self.assertNotEqual(os.getpid(), executor.results[0].result)
+
+    def test_io_bound_uses_threads(self):
+        executor = helpers.FileExecutor(self.ctx, whichProcess, 2, bound=helpers.IO_BOUND)
+        with executor:
+            executor.submit(self.files[0])
+
+        self.assertEqual('thread', executor.pool)
+        self.assertEqual(os.getpid(), executor.results[0].result)
+
+    @patch('click.echo')
+    def test_handlePaths_aggregates_errors(self, mockEcho):
+
+        with self.assertRaises(click.ClickException) as e:
+            helpers.handlePaths(self.ctx, [self.tempDir.name], handleFile=failOnThree)
+
+        self.assertIn('1 of 5 files failed', str(e.exception))
+        logged = [c.args[0] for c in mockEcho.call_args_list]
+        self.assertEqual(4, len([m for m in logged if m.startswith('handled')]))
+        self.assertIn(f"Failed processing {self.files[3]}: bad file", logged)
+
+    def test_handlePaths_serial(self):
+        self.ctx.jobs = 1
+        handled = []
+        reported = []
+
+        result = helpers.handlePaths(self.ctx, self.files[:2], handleFile=lambda c, f: handled.append(f) or f,
+                                     onResult=reported.append)
+
+        self.assertIsNone(result)
+        self.assertEqual(self.files[:2], handled)
+        self.assertEqual(self.files[:2], [r.result for r in reported])
+
+    def test_captureOutput(self):
+        ctx = Environment()
+        with ctx.captureOutput() as output:
+            ctx.log('one')
+            ctx.log('two', err=True)
+
+        self.assertEqual([('one', {}), ('two', {'err': True})], output)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+    def test_prefetchMetadata_directories_only(self):
+        self.ctx.metadataService = MagicMock()
+        self.ctx.recurse = False
+
+        helpers.prefetchMetadata(self.ctx, [self.files[0], self.tempDir.name])
+
+        self.ctx.metadataService.prefetchDirectory.assert_called_once_with(self.tempDir.name, recursive=False)
+
@@ -1,9 +1,35 @@
 import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
+from unittest.mock import patch
 
-from pdst.db.PlexDao import PlexDao
+from parameterized import parameterized
+
+from pdst.db import PlexDao as plexDaoModule
+from pdst.db.PlexDao import PlexDao, PlexConnection, getConnection, closeConnections
 from pdst.db.metadata import MetadataType
 
+ALPHA_2020 = '/a/fake/data/path/Sport Alpha (2009)/Season 2020'
+ALPHA_FILE = f'{ALPHA_2020}/Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo.ts'
+
+
+def copyLibrary(db, tempDir):
+    dbPath = os.path.join(tempDir, PlexDao.PLEX_DB_PATH)
+    os.makedirs(os.path.dirname(dbPath))
+    shutil.copy(db.dbPath, dbPath)
+    return dbPath
+
+
+def addEpisode(conn, episodeId, parentId, filePath, sectionId=1):
+    conn.execute('INSERT INTO metadata_items (id, library_section_id, parent_id, metadata_type, title) '
+                 'VALUES (?, ?, ?, ?, ?)', [episodeId, sectionId, parentId, MetadataType.EPISODE.value,
+                                            f"Episode {episodeId}"])
+    cursor = conn.execute('INSERT INTO media_items (library_section_id, metadata_item_id) VALUES (?, ?)',
+                          [sectionId, episodeId])
+    conn.execute('INSERT INTO media_parts (media_item_id, file) VALUES (?, ?)', [cursor.lastrowid, filePath])
+
 
 class TestPlexDao(unittest.TestCase):
 
@@ -12,6 +38,9 @@ class TestPlexDao(unittest.TestCase):
         libPath = os.path.join(testsDir, 'test-files', 'testPlexLibrary')
         self.db = PlexDao(libPath)
 
+    def tearDown(self):
+        closeConnections()
+
     def test_getMetadataForEpisodeFile(self):
         filePath = '/a/fake/data/path/Sport Alpha (2009)/Season 2020/Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo.ts'
         metadata = self.db.getMetadataForEpisodeFile(filePath)
@@ -29,3 +58,249 @@ class TestPlexDao(unittest.TestCase):
 
         self.assertEqual('Sport Alpha', metadata.show.title)
         self.assertEqual(2020, metadata.season.index)
+
+    def test_getMetadataForEpisodeFile_chain(self):
+        filePath = '/a/fake/data/path/Sport Alpha (2009)/Season 2020/Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo.ts'
+        metadata = self.db.getMetadataForEpisodeFile(filePath)
+
+        self.assertEqual(2, metadata.season.id)
+        self.assertEqual(1, metadata.show.id)
+        self.assertIsNone(metadata.show.parentId)
+        self.assertIn('mediaGrabBeginsAt=1596484800', metadata.extraData)
+        self.assertIsNone(metadata.partExtraData)
+
+    def test_getMetadataForEpisodeFile_missing_parent(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            dbPath = copyLibrary(self.db, tempDir)
+            with sqlite3.connect(dbPath) as conn:
+                conn.execute('DELETE FROM metadata_items WHERE id = 1')
+
+            db = PlexDao(tempDir)
+            metadata = db.getMetadataForEpisodeFile('/a/fake/data/path/Sport Alpha (2009)/Season 2020/'
+                                                    'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo.ts')
+            db.close()
+
+        self.assertEqual(3, metadata.id)
+        self.assertEqual(2, metadata.season.id)
+        self.assertIsNone(metadata.show)
+
+    def test_getMetadataForEpisodeFile_missing(self):
+        self.assertIsNone(self.db.getMetadataForEpisodeFile('/not/in/the/library.ts'))
+
+    def test_connection_shared(self):
+        other = PlexDao(os.path.dirname(os.path.dirname(os.path.dirname(self.db.dbPath))))
+        self.db.getMetadataForEpisodeFile('/not/in/the/library.ts')
+        connection = getConnection(self.db.dbPath)
+        conn = connection.conn
+
+        other.getMetadataForEpisodeFile('/not/in/the/library.ts')
+
+        self.assertIs(connection, getConnection(other.dbPath))
+        self.assertIs(conn, connection.conn)
+
+    def test_connection_read_only(self):
+        connection = getConnection(self.db.dbPath)
+
+        self.assertEqual(1, connection.queryOne('PRAGMA query_only')[0])
+        with self.assertRaises(sqlite3.OperationalError):
+            connection.query('UPDATE metadata_items SET title = ? WHERE id = 3', ['changed'])
+
+    def test_close_and_reopen(self):
+        self.db.getMetadataForEpisodeFile('/not/in/the/library.ts')
+        connection = getConnection(self.db.dbPath)
+
+        self.db.close()
+        self.assertIsNone(connection.conn)
+
+        self.db.getMetadataForEpisodeFile('/not/in/the/library.ts')
+        self.assertIsNotNone(connection.conn)
+
+    def test_new_connection_after_fork(self):
+        connection = getConnection(self.db.dbPath)
+        with patch('os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(connection, getConnection(self.db.dbPath))
+
+    @patch('time.sleep')
+    def test_busy_retry(self, mockSleep):
+        connection = PlexConnection(self.db.dbPath)
+        busy = sqlite3.OperationalError('database is locked')
+        calls = []
+
+        class FlakyConnection:
+            def __init__(self, conn):
+                self.conn = conn
+
+            def execute(self, sql, params):
+                calls.append(sql)
+                if len(calls) <= 2:
+                    raise busy
+                return self.conn.execute(sql, params)
+
+        connection.queryOne('SELECT 1')
+        connection.conn = FlakyConnection(connection.conn)
+
+        self.assertEqual(1, connection.queryOne('SELECT 1')[0])
+        self.assertEqual(3, len(calls))
+        self.assertEqual([0.1, 0.2], [c.args[0] for c in mockSleep.call_args_list])
+        connection.conn.conn.close()
+
+    @patch('time.sleep')
+    def test_busy_gives_up(self, mockSleep):
+        connection = PlexConnection(self.db.dbPath)
+        connection.queryOne('SELECT 1')
+        real = connection.conn
+
+        class BusyConnection:
+            def execute(self, sql, params):
+                raise sqlite3.OperationalError('database is locked')
+
+        connection.conn = BusyConnection()
+        with self.assertRaises(sqlite3.OperationalError):
+            connection.query('SELECT 1')
+
+        self.assertEqual(PlexConnection.BUSY_RETRIES, mockSleep.call_count)
+        real.close()
+
+    def test_isBusyError(self):
+        self.assertTrue(plexDaoModule.isBusyError(sqlite3.OperationalError('database is locked')))
+        self.assertFalse(plexDaoModule.isBusyError(sqlite3.OperationalError('no such table: x')))
+
+
+class TestPlexDaoPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        testsDir = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+        libPath = os.path.join(testsDir, 'test-files', 'testPlexLibrary')
+
+        self.tempDir = tempfile.TemporaryDirectory()
+        dbPath = copyLibrary(PlexDao(libPath), self.tempDir.name)
+        with sqlite3.connect(dbPath) as conn:
+            conn.execute('INSERT INTO metadata_items (id, library_section_id, parent_id, metadata_type, "index") '
+                         'VALUES (10, 1, 1, ?, 2021)', [MetadataType.SEASON.value])
+            addEpisode(conn, 4, 2, f'{ALPHA_2020}/Sport Alpha (2009) - 2020-08-04 - Episode 4.ts')
+            addEpisode(conn, 11, 10, '/a/fake/data/path/Sport Alpha (2009)/Season 2021/Episode 11.ts')
+            addEpisode(conn, 12, 10, '/a/fake/data/path/Sport Alpha (2009)/Season 2021/Episode 12.ts')
+            addEpisode(conn, 20, None, '/a/fake/data/path/Sport Alpha (2009) Extra/Episode 20.ts', sectionId=2)
+        self.db = PlexDao(self.tempDir.name)
+
+    def tearDown(self):
+        closeConnections()
+        self.tempDir.cleanup()
+
+    def countQueries(self):
+        connection = getConnection(self.db.dbPath)
+        connection.query('SELECT 1')
+        statements = []
+        connection.conn.set_trace_callback(statements.append)
+        return statements
+
+    def test_getMetadataForFiles(self):
+        missing = '/not/in/the/library.ts'
+        result = self.db.getMetadataForFiles([ALPHA_FILE, missing,
+                                              '/a/fake/data/path/Sport Alpha (2009)/Season 2021/Episode 11.ts'])
+
+        self.assertEqual(2, len(result))
+        self.assertNotIn(missing, result)
+
+        metadata = result[ALPHA_FILE]
+        self.assertEqual(3, metadata.id)
+        self.assertEqual('abc123', metadata.hash)
+        self.assertIn('mediaGrabBeginsAt=1596484800', metadata.extraData)
+        self.assertEqual(2, metadata.season.id)
+        self.assertEqual(1, metadata.show.id)
+
+        other = result['/a/fake/data/path/Sport Alpha (2009)/Season 2021/Episode 11.ts']
+        self.assertEqual(11, other.id)
+        self.assertEqual(2021, other.season.index)
+        self.assertEqual('Sport Alpha', other.show.title)
+
+    def test_getMetadataForFiles_chunked(self):
+        files = [ALPHA_FILE, '/a/fake/data/path/Sport Alpha (2009)/Season 2021/Episode 11.ts',
+                 '/a/fake/data/path/Sport Alpha (2009)/Season 2021/Episode 12.ts']
+        with patch.object(plexDaoModule, 'IN_CHUNK_SIZE', 2):
+            result = self.db.getMetadataForFiles(files)
+
+        self.assertEqual(files, sorted(result))
+
+    def test_matches_single_lookup(self):
+        bulk = self.db.getMetadataForFiles([ALPHA_FILE])[ALPHA_FILE]
+        single = PlexDao(self.tempDir.name).getMetadataForEpisodeFile(ALPHA_FILE)
+
+        self.assertEqual(vars(single), {**vars(bulk), 'season': single.season, 'show': single.show})
+        self.assertEqual(vars(single.season), vars(bulk.season))
+        self.assertEqual(vars(single.show), vars(bulk.show))
+
+    def test_prefetched_lookup_skips_db(self):
+        self.db.getMetadataForFiles([ALPHA_FILE])
+        statements = self.countQueries()
+
+        first = self.db.getMetadataForEpisodeFile(ALPHA_FILE)
+        second = self.db.getMetadataForEpisodeFile(ALPHA_FILE)
+
+        self.assertEqual([], statements)
+        self.assertEqual(3, first.id)
+        # callers modify what they get back, so each lookup has to build its own objects
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.season, second.season)
+
+    def test_ancestors_fetched_once(self):
+        self.db.getMetadataForFiles([ALPHA_FILE])
+        statements = self.countQueries()
+
+        self.db.getMetadataForFiles([f'{ALPHA_2020}/Sport Alpha (2009) - 2020-08-04 - Episode 4.ts'])
+
+        self.assertEqual(1, len(statements))
+
+    @parameterized.expand([
+        ['/a/fake/data/path/Sport Alpha (2009)', True, [3, 4, 11, 12]],
+        ['/a/fake/data/path/Sport Alpha (2009)/', True, [3, 4, 11, 12]],
+        ['/a/fake/data/path/Sport Alpha (2009)', False, []],
+        [ALPHA_2020, False, [3, 4]],
+        ['/a/fake/data/path', True, [3, 4, 11, 12, 20]],
+        ['/a/fake/data/nothing', True, []],
+    ])
+    def test_prefetchDirectory(self, dirPath, recursive, expectedIds):
+        files = self.db.prefetchDirectory(dirPath, recursive)
+        statements = self.countQueries()
+
+        self.assertEqual(expectedIds, sorted(self.db.getMetadataForEpisodeFile(f).id for f in files))
+        self.assertEqual([], statements)
+
+    def test_loadSection(self):
+        files = self.db.loadSection(1)
+        statements = self.countQueries()
+
+        self.assertEqual(4, len(files))
+        self.assertEqual(2021, self.db.getMetadataForEpisodeFile(
+            '/a/fake/data/path/Sport Alpha (2009)/Season 2021/Episode 12.ts').season.index)
+        self.assertEqual(4, self.db.getMetadataForEpisodeFile(
+            f'{ALPHA_2020}/Sport Alpha (2009) - 2020-08-04 - Episode 4.ts').id)
+        self.assertEqual([], statements)
+
+    def test_loadSection_no_parent(self):
+        self.assertEqual(['/a/fake/data/path/Sport Alpha (2009) Extra/Episode 20.ts'], self.db.loadSection(2))
+
+        metadata = self.db.getMetadataForEpisodeFile('/a/fake/data/path/Sport Alpha (2009) Extra/Episode 20.ts')
+        self.assertEqual(20, metadata.id)
+        self.assertIsNone(metadata.season)
+        self.assertIsNone(metadata.show)
+
+    def test_not_an_episode(self):
+        with sqlite3.connect(getConnection(self.db.dbPath).dbPath) as conn:
+            conn.execute('UPDATE metadata_items SET metadata_type = ? WHERE id = 11', [MetadataType.SEASON.value])
+
+        files = self.db.prefetchDirectory('/a/fake/data/path/Sport Alpha (2009)/Season 2021')
+
+        self.assertEqual(['/a/fake/data/path/Sport Alpha (2009)/Season 2021/Episode 12.ts'], files)
+
+    def test_getPartsAfter(self):
+        parts = self.db.getPartsAfter(1)
+
+        self.assertEqual([2, 3, 4, 5], [p['id'] for p in parts])
+        self.assertEqual('/a/fake/data/path/Sport Alpha (2009)/Season 2021/Episode 11.ts', parts[1]['file'])
+        self.assertEqual(1, parts[1]['library_section_id'])
+        self.assertEqual([], self.db.getPartsAfter(5))
+
+    def test_getLastPart(self):
+        self.assertEqual(5, self.db.getLastPart()['id'])
+
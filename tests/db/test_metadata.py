@@ -1,10 +1,18 @@
 import os
+import tempfile
 import unittest
+from configparser import ConfigParser, ExtendedInterpolation
 from datetime import datetime, timedelta
 
 from parameterized import parameterized
 
-from pdst.db.metadata import BaseMetadata, MetadataType, EpisodeMetadata
+from pdst.db.metadata import BaseMetadata, MetadataType, EpisodeMetadata, readMetadataSections, parseTimestamp
+
+
+def configParserSections(filePath):
+    config = ConfigParser(interpolation=ExtendedInterpolation())
+    config.read(filePath)
+    return {name: dict(config[name]) for name in config.sections()}
 
 
 class TestMetadata(unittest.TestCase):
@@ -133,3 +141,84 @@ class TestMetadata(unittest.TestCase):
 
         expectedDatetime = datetime.strptime('2020-08-02 09:10:11', self.datetime_iso_format)
         self.assertEqual(expectedDatetime, metadata.release)
+
+    def test_readMetadataSections_same_as_ConfigParser(self):
+        row = dict(self.testData, extra_data='at%3AmediaGrabBeginsAt=1595781000', part_extra_data='a=b')
+        season = BaseMetadata({'id': 9, 'index': 2020, 'hash': 'abc', 'parent_id': 8})
+        show = BaseMetadata({'id': 8, 'title': 'The Show', 'summary': 'Show: Summary', 'genres': 'Tag A|Tag B',
+                             'user_thumb_url': 'metadata://posters/tv.plex.agents.none_abc'})
+        metadata = EpisodeMetadata(row, seasonMetadata=season, showMetadata=show)
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            filePath = os.path.join(tempDir, 'test.metadata')
+            metadata.writeToFile(filePath)
+
+            sections = readMetadataSections(filePath)
+            self.assertEqual(configParserSections(filePath), sections)
+            self.assertEqual(metadata.release.strftime('%H:%M:%S'), sections['metadata']['releaseTime'])
+
+            readMetadata = EpisodeMetadata.fromFile(filePath)
+            self.assertMatchesTestData(readMetadata)
+            self.assertEqual(metadata.release, readMetadata.release)
+            self.assertEqual(2020, readMetadata.season.index)
+            self.assertEqual('Show: Summary', readMetadata.show.summary)
+
+    @parameterized.expand([
+        ('comments', '# written by hand\n[metadata]\n; a comment\ntitle = Spaced Out \n\n\n[Show]\ntitle=Show\n'),
+        ('urls', '[metadata]\nuser_thumb_url=metadata://posters/abc\ntitle=Game 7: A = B\n'),
+        ('empty', '[metadata]\nsummary=\n'),
+    ])
+    def test_readMetadataSections_simple(self, name, contents):
+        with tempfile.TemporaryDirectory() as tempDir:
+            filePath = os.path.join(tempDir, 'test.metadata')
+            with open(filePath, 'w') as f:
+                f.write(contents)
+
+            self.assertEqual(configParserSections(filePath), readMetadataSections(filePath))
+
+    @parameterized.expand([
+        ('continuation', '[metadata]\nsummary=first line\n  second line\n'),
+        ('interpolation', '[metadata]\nsummary=$$5 off\n'),
+        ('colon delimiter', '[metadata]\ntitle: A Title\n'),
+        ('no section', 'title=A Title\n'),
+        ('default section', '[DEFAULT]\ngenres=Sport\n[metadata]\ntitle=A Title\n'),
+        ('duplicate key', '[metadata]\ntitle=A\ntitle=B\n'),
+        ('duplicate section', '[metadata]\ntitle=A\n[metadata]\nyear=2020\n'),
+        ('missing', None),
+    ])
+    def test_readMetadataSections_fallback(self, name, contents):
+        with tempfile.TemporaryDirectory() as tempDir:
+            filePath = os.path.join(tempDir, 'test.metadata')
+            if contents is not None:
+                with open(filePath, 'w') as f:
+                    f.write(contents)
+
+            self.assertIsNone(readMetadataSections(filePath))
+
+    def test_fromFile_fallback(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            filePath = os.path.join(tempDir, 'test.metadata')
+            with open(filePath, 'w') as f:
+                f.write('[metadata]\ntitle=Hand Edited\nsummary=Costs $$5,\n  on two lines\n[Show]\ntitle=Show\n')
+
+            metadata = EpisodeMetadata.fromFile(filePath)
+
+        self.assertEqual('Hand Edited', metadata.title)
+        self.assertEqual('Costs $5,\non two lines', metadata.summary)
+        self.assertEqual('Show', metadata.show.title)
+
+    @parameterized.expand([
+        ('2020-02-03 08:07:06', datetime(2020, 2, 3, 8, 7, 6)),
+        ('2020-2-3 8:07:06', datetime(2020, 2, 3, 8, 7, 6)),
+    ])
+    def test_parseTimestamp(self, value, expected):
+        self.assertEqual(expected, parseTimestamp(value))
+
+    @parameterized.expand([
+        ('None',),
+        ('2020-02-30 08:07:06',),
+        ('2020-02-03T08:07:06',),
+    ])
+    def test_parseTimestamp_invalid(self, value):
+        with self.assertRaises(ValueError):
+            parseTimestamp(value)
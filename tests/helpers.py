@@ -1,6 +1,21 @@
+import errno
+import os
+
 import numpy
 from PIL import Image
 
+from pdst import filetools
+
+realLink = os.link
+
+
+def crossDeviceLink(src, dst, **kwargs):
+    """os.link as if src was on a different filesystem, apart from the partial copies written next to dst"""
+    if not src.endswith(filetools.PARTIAL_SUFFIX):
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+    return realLink(src, dst, **kwargs)
+
+
 
 def verifyImagesEquivalent(expectedImagePath, compareImagePath, threshold):
     expectedImage = Image.open(expectedImagePath)
@@ -1,6 +1,6 @@
 import os
 import unittest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from pdst.Config import Config
 from pdst.image.ImageService import ImageService, ImageGenerationException
@@ -52,3 +52,17 @@ class TestImageService(unittest.TestCase):
 
         self.assertEqual('/just/sport/logo.png', imageSpecs[0].imageFile)
         self.assertEqual(True, imageSpecs[0].isLogo)
+
+    @patch('pdst.image.ImageService.ImageMatcher')
+    def test_generateThumbnail_resolves_sport_once(self, mockIm):
+        mockIm.return_value.findBestMatch.return_value = None
+        self.service.sportService = MagicMock(wraps=self.service.sportService)
+        self.service.metadataService = MagicMock()
+        self.service.imageGen = MagicMock()
+
+        self.service.generateEventThumbnail('/Just.Image/Test Sport - 2020-02-02 - Team A vs. Team B.mkv')
+
+        self.service.sportService.getSportFor.assert_called_once()
+        # the sport has no image text, so there's no need for the metadata
+        self.service.metadataService.getMetadataForEpisodeFile.assert_not_called()
+
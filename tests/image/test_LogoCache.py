@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from pdst.image.LogoCache import LogoCache
+
+
+class TestLogoCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.logo = os.path.join(self.tempDir.name, 'Alpha.png')
+        shutil.copy(os.path.join(os.path.dirname(__file__), '..', 'test-files', 'logos', 'plain', 'Alpha.png'),
+                    self.logo)
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_matches_plain_resize(self):
+        cache = LogoCache()
+        expected = Image.open(self.logo).resize((50, 40), Image.LANCZOS)
+
+        resized = cache.getResized(self.logo, (50, 40))
+
+        self.assertEqual(expected.mode, resized.mode)
+        self.assertEqual(expected.tobytes(), resized.tobytes())
+
+    def test_resizes_once(self):
+        cache = LogoCache()
+        cache.getResized(self.logo, (50, 40))
+        cache.getResized(self.logo, (50, 40))
+        cache.getResized(self.logo, (40, 40))
+
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(2, cache.misses)
+
+    def test_returns_copies(self):
+        cache = LogoCache()
+        first = cache.getResized(self.logo, (50, 40))
+        first.paste((1, 2, 3), (0, 0, 50, 40))
+
+        second = cache.getResized(self.logo, (50, 40))
+
+        self.assertNotEqual(first.tobytes(), second.tobytes())
+
+    def test_changed_logo_is_resized_again(self):
+        cache = LogoCache()
+        cache.getResized(self.logo, (50, 40))
+        Image.new('RGBA', (100, 80), (255, 0, 0, 255)).save(self.logo)
+        os.utime(self.logo, ns=(0, 0))
+
+        resized = cache.getResized(self.logo, (50, 40))
+
+        self.assertEqual((255, 0, 0, 255), resized.getpixel((0, 0)))
+        self.assertEqual(2, cache.misses)
+
+    def test_evicts_by_bytes(self):
+        cache = LogoCache(maxBytes=50 * 40 * 4 * 2)
+        cache.getResized(self.logo, (50, 40))
+        cache.getResized(self.logo, (40, 50))
+        cache.getResized(self.logo, (50, 40))
+        cache.getResized(self.logo, (30, 30))
+
+        self.assertEqual(2, len(cache.entries))
+        self.assertLessEqual(cache.totalBytes, cache.maxBytes)
+        cache.getResized(self.logo, (40, 50))
+        self.assertEqual(4, cache.misses)
+
+    def test_persisted(self):
+        cacheDir = os.path.join(self.tempDir.name, 'logos')
+        resized = LogoCache(cacheDir).getResized(self.logo, (50, 40))
+
+        reopened = LogoCache(cacheDir)
+        fromDisk = reopened.getResized(self.logo, (50, 40))
+
+        self.assertEqual(0, reopened.misses)
+        self.assertEqual(resized.mode, fromDisk.mode)
+        self.assertEqual(resized.tobytes(), fromDisk.tobytes())
+
+    def test_oversized_source_close_to_full_resize(self):
+        big = os.path.join(self.tempDir.name, 'Big.png')
+        image = Image.new('RGBA', (2400, 1800), (0, 0, 0, 0))
+        ImageDraw.Draw(image).ellipse([200, 100, 2200, 1700], fill=(20, 120, 220, 255))
+        image.save(big)
+        expected = np.asarray(image.resize((240, 180), Image.LANCZOS), dtype=np.int16)
+
+        resized = np.asarray(LogoCache().getResized(big, (240, 180)), dtype=np.int16)
+
+        self.assertLess(np.abs(expected - resized).mean(), 1)
+
+    def test_jpeg_drafted(self):
+        jpeg = os.path.join(self.tempDir.name, 'Big.jpg')
+        image = Image.new('RGB', (2400, 1800), (20, 120, 220))
+        image.save(jpeg)
+
+        resized = LogoCache().getResized(jpeg, (240, 180))
+
+        self.assertEqual((240, 180), resized.size)
+        self.assertEqual('RGB', resized.mode)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pdst.image.ImageMatcher import ImageMatcher
+from pdst.image.LogoIndex import LogoIndex, INDEX_FILENAME
+
+
+class TestLogoIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tempDir.name, 'logos')
+        testLogos = os.path.join(os.path.dirname(__file__), '..', 'test-files', 'logos')
+        shutil.copytree(testLogos, self.root, ignore=shutil.ignore_patterns(INDEX_FILENAME))
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_refresh_indexes_tree(self):
+        index = LogoIndex(self.root)
+        self.assertEqual(2, index.refresh())
+
+        allImages = dict(index.getAllImages())
+        self.assertEqual('Alpha', allImages['Alpha_69d2e6_a1cdc5_bg$hStripe3.png'])
+        self.assertEqual('Bravo', allImages[os.path.join('plain', 'Bravo.png')])
+        self.assertEqual(6, len(allImages))
+        self.assertEqual(['plain'], index.getSubdirs())
+
+        hints = index.getHints('Charlie_0021A5_mask$FA4616.png')
+        self.assertEqual(('0021A5',), hints.colors)
+        self.assertEqual('FA4616', hints.mask)
+
+    def test_save_and_load(self):
+        index = LogoIndex(self.root)
+        index.refresh()
+        index.save()
+
+        loaded = LogoIndex(self.root)
+        self.assertTrue(loaded.load())
+        self.assertEqual(0, loaded.refresh())
+        self.assertFalse(loaded.dirty)
+        self.assertEqual(sorted(index.getAllImages()), sorted(loaded.getAllImages()))
+
+    def test_refresh_only_changed_dirs(self):
+        index = LogoIndex(self.root)
+        index.refresh()
+        index.save()
+
+        plainDir = os.path.join(self.root, 'plain')
+        shutil.copy(os.path.join(plainDir, 'Alpha.png'), os.path.join(plainDir, 'Delta_123456.png'))
+        os.utime(plainDir, ns=(0, os.stat(plainDir).st_mtime_ns + 1_000_000_000))
+
+        loaded = LogoIndex(self.root)
+        loaded.load()
+        self.assertEqual(1, loaded.refresh())
+        self.assertIn(('Delta_123456.png', 'Delta'), loaded.getImagesInDir('plain'))
+
+    def test_verify(self):
+        index = LogoIndex(self.root)
+        index.refresh()
+
+        os.remove(os.path.join(self.root, 'plain', 'Charlie.png'))
+        missing, stale = index.verify()
+
+        self.assertEqual([], missing)
+        self.assertEqual([os.path.join('plain', 'Charlie.png')], stale)
+
+    def test_matcher_uses_index(self):
+        index = LogoIndex(self.root)
+        index.refresh()
+
+        matcher = ImageMatcher(self.root, logoIndex=index)
+        logo = matcher.findBestMatch('Charlie', 'Sport')
+
+        self.assertEqual(os.path.join(self.root, 'Charlie_0021A5_mask$FA4616.png'), logo)
+
+    def test_lists_only_dirs_looked_in(self):
+        index = LogoIndex(self.root)
+
+        self.assertEqual(['plain'], index.getSubdirs())
+        self.assertTrue(index.isIndexed(''))
+        self.assertFalse(index.isIndexed('plain'))
+
+        self.assertIn(('Bravo.png', 'Bravo'), index.getImagesInDir('plain'))
+        self.assertTrue(index.isIndexed('plain'))
+        self.assertIsNone(index.getImagesInDir('nothing'))
+
+    def test_forRoot_doesnt_save_unless_asked(self):
+        index = LogoIndex.forRoot(self.root)
+        index.getSubdirs()
+        self.assertFalse(os.path.exists(os.path.join(self.root, INDEX_FILENAME)))
+
+        self.assertIs(index, LogoIndex.forRoot(self.root, persist=True))
+        self.assertTrue(os.path.exists(os.path.join(self.root, INDEX_FILENAME)))
+        self.assertFalse(index.dirty)
+
+    def test_forRoot_sees_new_logos(self):
+        index = LogoIndex.forRoot(self.root)
+        self.assertNotIn(('Delta_123456.png', 'Delta'), index.getImagesInDir('plain'))
+        self.assertNotEqual(os.path.join('plain', 'Delta_123456.png'), index.getAllCandidates().bestMatch('Delta')[0])
+
+        plainDir = os.path.join(self.root, 'plain')
+        shutil.copy(os.path.join(plainDir, 'Alpha.png'), os.path.join(plainDir, 'Delta_123456.png'))
+        os.utime(plainDir, ns=(0, os.stat(plainDir).st_mtime_ns + 1_000_000_000))
+
+        self.assertIs(index, LogoIndex.forRoot(self.root))
+        # only checked again once the refresh interval has passed
+        self.assertNotIn(('Delta_123456.png', 'Delta'), index.getImagesInDir('plain'))
+        with patch('pdst.image.LogoIndex.REFRESH_INTERVAL', 0):
+            self.assertIn(('Delta_123456.png', 'Delta'), index.getImagesInDir('plain'))
+            self.assertEqual(os.path.join('plain', 'Delta_123456.png'),
+                             index.getAllCandidates().bestMatch('Delta')[0])
+
+    def test_checks_dir_at_most_once_per_interval(self):
+        index = LogoIndex(self.root)
+        index.getImagesInDir('plain')
+
+        with patch('pdst.image.LogoIndex.os.stat', side_effect=os.stat) as mockStat:
+            for _ in range(3):
+                index.getCandidates('plain')
+            self.assertEqual(0, mockStat.call_count)
+
+            with patch('pdst.image.LogoIndex.REFRESH_INTERVAL', 0):
+                index.getCandidates('plain')
+            self.assertEqual(1, mockStat.call_count)
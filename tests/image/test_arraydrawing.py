@@ -0,0 +1,136 @@
+import os
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+from PIL import Image, ImageDraw
+from parameterized import parameterized
+
+from pdst.image import arraydrawing, drawing
+from pdst.image.ImageGenerator import ImageGenerator
+from pdst.image.spec import OuterGlowSpec, StrokeSpec, DropShadowSpec, ColorOverlaySpec, LayerEffects, LayerSpec, \
+    LayerGroupSpec, ImageSpec, CompositeSpec
+
+
+def compare(expected, actual):
+    """Returns (fraction of pixels visibly different, mean squared error) between two images"""
+    expected = np.asarray(expected.convert('RGBA'), dtype=np.int32)
+    actual = np.asarray(actual.convert('RGBA'), dtype=np.int32)
+    visiblyDifferent = (np.abs(expected - actual).max(axis=2) > 32).mean()
+    meanSquaredError = ((expected - actual)[..., :3] ** 2).sum() / (expected.shape[0] * expected.shape[1])
+    return visiblyDifferent, meanSquaredError
+
+
+class TestArrayDrawing(unittest.TestCase):
+    testFilesDir = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'test-files'))
+
+    def logo(self, name='Charlie.png'):
+        logo = Image.open(os.path.join(self.testFilesDir, 'logos', 'plain', name))
+        logo.load()
+        return logo
+
+    def assertScratchIsClear(self):
+        for (key, buffer) in arraydrawing._scratch.buffers.items():
+            self.assertFalse(buffer.any(), f"{key} buffer was left dirty")
+
+    @parameterized.expand([
+        ['plain', LayerEffects(), 1],
+        ['stroke', LayerEffects(stroke=StrokeSpec(4, colorHex='222')), 5],
+        ['overlay', LayerEffects(colorOverlay=ColorOverlaySpec('fff', 0.3)), 5],
+        ['glow', LayerEffects(outerGlow=OuterGlowSpec(20, 'f88', 0.8)), 5],
+        # stays black as it's blurred, rather than picking up the base image's colors
+        ['shadow', LayerEffects(dropShadow=DropShadowSpec(10, 30, 35, 0.7)), 120],
+    ])
+    def test_drawLayers_matches_pil(self, name, effects, maxError):
+        logo = self.logo()
+        base = Image.new('RGB', (logo.size[0] + 50, logo.size[1] + 50), (180, 230, 190))
+        specs = [LayerSpec(logo, (25, 25), effects)]
+
+        (visiblyDifferent, meanSquaredError) = compare(drawing.drawLayers(base, specs),
+                                                       arraydrawing.drawLayers(base, specs))
+
+        self.assertLess(visiblyDifferent, 0.005)
+        self.assertLess(meanSquaredError, maxError)
+        self.assertScratchIsClear()
+
+    def test_drawLayers_masked_group_matches_pil(self):
+        logo = self.logo('Alpha.png').resize((120, 100))
+        base = Image.new('RGB', (300, 200), (200, 200, 200))
+        mask = Image.new('L', (200, 200), 0)
+        ImageDraw.Draw(mask).polygon([(0, 0), (200, 0), (120, 200), (0, 200)], fill=255)
+
+        group = LayerGroupSpec([LayerSpec(Image.new('RGB', (200, 200), (20, 40, 160)), (0, 0)),
+                                LayerSpec(logo, (40, 50), LayerEffects(stroke=StrokeSpec(3, colorHex='fff')))])
+        group.offset = (50, 0)
+        group.alphaMask = mask
+
+        (visiblyDifferent, meanSquaredError) = compare(drawing.drawLayers(base, [group]),
+                                                       arraydrawing.drawLayers(base, [group]))
+
+        self.assertLess(visiblyDifferent, 0.005)
+        self.assertLess(meanSquaredError, 5)
+        self.assertScratchIsClear()
+
+    def test_drawLayers_clipped_to_base(self):
+        logo = self.logo('Alpha.png').resize((80, 80))
+        base = Image.new('RGB', (100, 60), (255, 255, 255))
+        specs = [LayerSpec(logo, (-30, 20), LayerEffects(stroke=StrokeSpec(5, colorHex='000')))]
+
+        (visiblyDifferent, meanSquaredError) = compare(drawing.drawLayers(base, specs),
+                                                       arraydrawing.drawLayers(base, specs))
+
+        self.assertLess(visiblyDifferent, 0.005)
+        self.assertLess(meanSquaredError, 5)
+        self.assertScratchIsClear()
+
+    def test_drawLayers_outside_base(self):
+        base = Image.new('RGB', (40, 40), (10, 20, 30))
+        specs = [LayerSpec(Image.new('RGBA', (10, 10), (255, 0, 0, 255)), (50, 50))]
+
+        out = arraydrawing.drawLayers(base, specs)
+
+        self.assertEqual('RGBA', out.mode)
+        self.assertEqual(base.convert('RGBA').tobytes(), out.tobytes())
+
+    def test_drawLayers_transparent_base(self):
+        base = Image.new('RGBA', (40, 40), (0, 0, 255, 128))
+        specs = [LayerSpec(Image.new('RGBA', (20, 20), (255, 0, 0, 128)), (10, 10))]
+
+        out = arraydrawing.drawLayers(base, specs)
+
+        # a layer covers as much as drawing.paste2 shows of it, alpha cubed, composited over the base's own alpha
+        expected = Image.alpha_composite(Image.new('RGBA', (1, 1), (0, 0, 255, 128)),
+                                         Image.new('RGBA', (1, 1), (255, 0, 0, 32))).getpixel((0, 0))
+        for (channel, value) in zip(out.getpixel((20, 20)), expected):
+            self.assertAlmostEqual(value, channel, delta=1)
+        self.assertEqual((0, 0, 255, 128), out.getpixel((5, 5)))
+
+    def test_drawLayers_doesnt_change_inputs(self):
+        base = Image.new('RGB', (40, 40), (10, 20, 30))
+        logo = Image.new('RGBA', (10, 10), (255, 0, 0, 200))
+
+        arraydrawing.drawLayers(base, [LayerSpec(logo, (15, 15), LayerEffects(stroke=StrokeSpec(3, colorHex='0f0')))])
+
+        self.assertEqual((10, 20, 30), base.getpixel((20, 20)))
+        self.assertEqual((255, 0, 0, 200), logo.getpixel((5, 5)))
+
+    def test_generateImage_matches_pil(self):
+        compositeSpec = CompositeSpec((400, 225))
+        imageSpecs = [ImageSpec(os.path.join(self.testFilesDir, 'logos', 'plain', 'Alpha.png'), colors=['123456']),
+                      ImageSpec(os.path.join(self.testFilesDir, 'logos', 'plain', 'Charlie.png'), colors=['ddeeff'],
+                                strokeSpec=StrokeSpec(4, colorHex='000'))]
+        config = MagicMock(thumbnailSize=[400, 225], fallbackColor='ccc', preventSimilarColors=False)
+
+        config.compositingBackend = 'pil'
+        expected = ImageGenerator(config).generateImage(compositeSpec, imageSpecs)
+        config.compositingBackend = 'numpy'
+        actual = ImageGenerator(config).generateImage(compositeSpec, imageSpecs)
+
+        (visiblyDifferent, meanSquaredError) = compare(expected, actual)
+        self.assertLess(visiblyDifferent, 0.005)
+        self.assertLess(meanSquaredError, 5)
+
+    def test_ImageGenerator_unknown_backend(self):
+        config = MagicMock(thumbnailSize=[400, 225], fallbackColor='ccc', compositingBackend='cairo')
+
+        self.assertRaises(ValueError, ImageGenerator, config)
@@ -1,7 +1,10 @@
 import unittest
 from unittest.mock import MagicMock
 
-from pdst.image.compositor import SimpleCompositor, SingleImageCompositor
+from parameterized import parameterized
+
+from pdst import filetools
+from pdst.image.compositor import SimpleCompositor, SingleImageCompositor, FONT_FILE, getFont, fitFontSize
 from pdst.image.spec import CompositeSpec
 
 
@@ -59,3 +62,45 @@ class TestCompositor(unittest.TestCase):
         tl = c.getPartTopLeft(0)
 
         self.assertEqual((0, 0), tl)
+
+    def test_SimpleCompositor_layout_shared_by_size(self):
+        first = SimpleCompositor(CompositeSpec([800, 450], 'Final'), [self.mockImageSpec, self.mockImageSpec])
+        second = SimpleCompositor(CompositeSpec((800, 450), 'Final'), [self.mockImageSpec, self.mockImageSpec])
+
+        self.assertIs(first.layout, second.layout)
+        self.assertIs(first.font, second.font)
+        self.assertEqual(first.textDrawPos, second.textDrawPos)
+
+    def test_SimpleCompositor_getPartMask(self):
+        c = SimpleCompositor(self.basicCompositeSpec, [self.mockImageSpec, self.mockImageSpec])
+
+        left = c.getPartMask(0)
+        right = c.getPartMask(1)
+
+        self.assertEqual((58, 100), left.size)
+        self.assertEqual((255, 0, 0, 255), (left.getpixel((0, 0)), left.getpixel((57, 99)),
+                                            right.getpixel((0, 0)), right.getpixel((57, 99))))
+
+        # the cached masks are copied, so drawing on one doesn't change the next
+        left.paste(0, (0, 0, 58, 100))
+        self.assertEqual(255, c.getPartMask(0).getpixel((0, 0)))
+
+    def test_getFont_memoized(self):
+        fontFile = filetools.getResourceFilePath(FONT_FILE)
+
+        self.assertIs(getFont(fontFile, 20), getFont(fontFile, 20))
+        self.assertIsNot(getFont(fontFile, 20), getFont(fontFile, 21))
+
+    @parameterized.expand([
+        ['short', 'Final', 90],
+        ['long', 'Conference Championship Round - Game 3 of the Western Semifinal', 25],
+    ])
+    def test_fitFontSize(self, name, text, expected):
+        fontFile = filetools.getResourceFilePath(FONT_FILE)
+
+        fontSize = fitFontSize(fontFile, text, 90, 760)
+
+        self.assertEqual(expected, fontSize)
+        self.assertLessEqual(getFont(fontFile, fontSize).getlength(text), 760)
+        if fontSize < 90:
+            self.assertGreater(getFont(fontFile, fontSize + 1).getlength(text), 760)
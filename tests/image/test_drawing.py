@@ -1,8 +1,12 @@
 import os
 import shutil
 import unittest
+from math import radians, cos, sin
 
-from PIL import Image
+import numpy as np
+from PIL import Image, ImageDraw
+from parameterized import parameterized
+from scipy.ndimage import grey_dilation
 
 from pdst.image import drawing
 from pdst.image.spec import OuterGlowSpec, StrokeSpec, DropShadowSpec, ColorOverlaySpec, LayerEffects, LayerSpec
@@ -156,3 +160,92 @@ class TestImageService(unittest.TestCase):
 
         if not match:
             self.fail(msg)
+
+
+def circleStroke(baseImage, strokeSpec, drawPoint, maskImg):
+    """The original stroke: the mask pasted 8 * size times around a circle, kept to compare the dilation against"""
+    baseImage = baseImage.convert('RGBA')
+    pasteMask = maskImg if maskImg.mode in ['RGBA', 'L'] else None
+
+    transparent = strokeSpec.color + (0,)
+    strokeBase = Image.new('RGBA', baseImage.size, transparent)
+    strokeImg = Image.new('RGBA', maskImg.size, strokeSpec.color)
+    steps = 8 * strokeSpec.size
+    for ds in range(0, steps):
+        rad = radians(ds * (360 / steps))
+        point = (round(drawPoint[0] + strokeSpec.size * cos(rad)), round(drawPoint[1] + strokeSpec.size * sin(rad)))
+        strokeBase.paste(strokeImg, point, pasteMask)
+
+    strokeAlpha = Image.blend(Image.new('RGBA', baseImage.size, transparent), strokeBase, strokeSpec.opacity)
+    return Image.alpha_composite(baseImage, strokeAlpha)
+
+
+class TestStrokeDilation(unittest.TestCase):
+    testFilesDir = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'test-files'))
+
+    @parameterized.expand([[1], [2.5], [4], [7.5]])
+    def test_dilateDisk_matches_disk_footprint(self, radius):
+        rng = np.random.default_rng(1)
+        alpha = (rng.random((40, 50)) > 0.97).astype(np.uint8) * rng.integers(1, 256, (40, 50), dtype=np.uint8)
+
+        span = int(radius)
+        (dy, dx) = np.mgrid[-span:span + 1, -span:span + 1]
+        footprint = dx * dx + dy * dy <= radius * radius
+        expected = grey_dilation(alpha, footprint=footprint, mode='constant', cval=0)
+
+        np.testing.assert_array_equal(expected, drawing.dilateDisk(alpha, radius))
+
+    @parameterized.expand([
+        ['Alpha.png', 1], ['Alpha.png', 4], ['Alpha.png', 10], ['Alpha.png', 20],
+        ['Charlie.png', 2], ['Charlie.png', 6], ['Charlie.png', 12], ['Charlie.png', 20],
+    ])
+    def test_drawStroke_matches_circle_method(self, logoName, size):
+        logo = Image.open(os.path.join(self.testFilesDir, 'logos', 'plain', logoName))
+        base = Image.new('RGB', (logo.size[0] + 60, logo.size[1] + 60), (255, 255, 255))
+        strokeSpec = StrokeSpec(size, colorHex='088')
+
+        expected = np.asarray(circleStroke(base, strokeSpec, (30, 30), logo), dtype=np.int32)
+        actual = np.asarray(drawing.drawStroke(base, strokeSpec, (30, 30), logo), dtype=np.int32)
+
+        # differences are limited to the anti-aliased edge of the stroke
+        visiblyDifferent = (np.abs(expected - actual).max(axis=2) > 32).mean()
+        self.assertLess(visiblyDifferent, 0.005)
+        meanSquaredError = ((expected - actual) ** 2).sum() / (expected.shape[0] * expected.shape[1])
+        self.assertLess(meanSquaredError, 40)
+
+    def test_drawStroke_opaque_mask(self):
+        base = Image.new('RGBA', (40, 40), (0, 0, 0, 0))
+        mask = Image.new('RGB', (10, 10), (255, 255, 255))
+
+        out = drawing.drawStroke(base, StrokeSpec(3, colorHex='f00'), (15, 15), mask)
+
+        alpha = np.asarray(out.getchannel('A'))
+        self.assertEqual(255, alpha[20, 12])
+        self.assertEqual(255, alpha[12, 20])
+        self.assertEqual(0, alpha[11, 20])
+        self.assertEqual((255, 0, 0, 255), out.getpixel((20, 12)))
+
+    def test_drawStroke_clipped_to_base(self):
+        logo = Image.new('RGBA', (30, 30), (0, 0, 0, 0))
+        ImageDraw.Draw(logo).ellipse([0, 0, 29, 29], fill=(255, 255, 255, 255))
+        base = Image.new('RGB', (40, 40), (255, 255, 255))
+
+        expected = np.asarray(circleStroke(base, StrokeSpec(5, colorHex='000'), (-10, 20), logo), dtype=np.int32)
+        actual = np.asarray(drawing.drawStroke(base, StrokeSpec(5, colorHex='000'), (-10, 20), logo), dtype=np.int32)
+
+        self.assertLess((np.abs(expected - actual).max(axis=2) > 32).mean(), 0.02)
+
+    def test_drawStroke_doesnt_change_base(self):
+        base = Image.new('RGBA', (40, 40), (10, 20, 30, 255))
+        logo = Image.new('L', (10, 10), 255)
+
+        drawing.drawStroke(base, StrokeSpec(3, colorHex='f00'), (15, 15), logo)
+
+        self.assertEqual((10, 20, 30, 255), base.getpixel((14, 20)))
+
+    def test_drawStroke_nothing_to_stroke(self):
+        base = Image.new('RGB', (40, 40), (10, 20, 30))
+
+        for size, logo in [(0, Image.new('L', (10, 10), 255)), (3, Image.new('RGBA', (10, 10), (0, 0, 0, 0)))]:
+            out = drawing.drawStroke(base, StrokeSpec(size, colorHex='f00'), (15, 15), logo)
+            self.assertEqual(base.convert('RGBA').tobytes(), out.tobytes())
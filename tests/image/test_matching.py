@@ -0,0 +1,104 @@
+import random
+import unittest
+from unittest.mock import patch
+
+from fuzzywuzzy import fuzz
+from parameterized import parameterized
+
+from pdst.image.matching import CandidateNames
+
+
+def linearBestMatch(searchTarget, images):
+    """The original one-at-a-time ImageMatcher scan, kept here as the reference behavior"""
+    bestMatch = None
+    bestCleaned = None
+    bestScore = 0
+
+    for (filename, cleaned) in images:
+        score = fuzz.partial_ratio(searchTarget, cleaned)
+        if score > bestScore:
+            bestScore = score
+            bestMatch = filename
+            bestCleaned = cleaned
+        elif score == bestScore and bestCleaned is not None:
+            if fuzz.token_set_ratio(searchTarget, cleaned) > fuzz.token_set_ratio(searchTarget, bestCleaned):
+                bestMatch = filename
+                bestCleaned = cleaned
+
+    return bestMatch, bestScore
+
+
+class TestCandidateNames(unittest.TestCase):
+
+    def test_cleans_image_names(self):
+        candidates = CandidateNames(['Boston Red Sox_bd3039_0c2340.png', 'New York Yankees.png'])
+        self.assertEqual(['Boston Red Sox', 'New York Yankees'], candidates.names)
+        self.assertEqual(['boston red sox', 'new york yankees'], candidates.processed)
+
+    def test_accepts_indexed_tuples(self):
+        candidates = CandidateNames([('sub/Boston_bd3039.png', 'Boston')])
+        self.assertEqual(('sub/Boston_bd3039.png', 100), candidates.bestMatch('Boston'))
+
+    def test_duplicate_names_keep_first(self):
+        candidates = CandidateNames(['Boston_bd3039.png', 'Boston_000000.png', 'Bostonian.png'])
+        self.assertEqual(2, len(candidates))
+        self.assertEqual(('Boston_bd3039.png', 100), candidates.bestMatch('Boston'))
+
+    def test_empty(self):
+        self.assertEqual((None, 0), CandidateNames([]).bestMatch('Boston'))
+
+    def test_no_match(self):
+        self.assertEqual((None, 0), CandidateNames(['Zzz.png']).bestMatch('Boston'))
+
+    @parameterized.expand([
+        ['Red Sox', 'Boston Red Sox.png'],
+        ['Manchester United', 'Manchester United FC.png'],
+        ['Manchester City', 'Manchester City FC.png'],
+        ['Yankees', 'New York Yankees.png'],
+    ])
+    def test_tie_break_on_token_set(self, team, expected):
+        candidates = CandidateNames(['Manchester United FC.png', 'Manchester City FC.png', 'Manchester.png',
+                                     'Boston Red Sox.png', 'Red.png', 'New York Yankees.png', 'New York Mets.png'])
+        self.assertEqual(expected, candidates.bestMatch(team)[0])
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(1234)
+        words = ['Boston', 'New', 'York', 'Red', 'Sox', 'City', 'United', 'FC', 'St.', 'Louis', 'Saint', 'Bay',
+                 'Tampa', 'Los', 'Angeles', 'Real', 'Madrid', 'Athletic', 'Club', 'José']
+        images = []
+        for i in range(300):
+            name = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+            images.append((f"{i}.png", name))
+
+        candidates = CandidateNames(images)
+        for _ in range(50):
+            query = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+            self.assertEqual(linearBestMatch(query, images), candidates.bestMatch(query), query)
+
+    def test_matches_linear_scan_without_perfect_match(self):
+        rng = random.Random(4321)
+        cities = ['Boston', 'New York', 'St. Louis', 'Tampa Bay', 'Los Angeles', 'Madrid', 'San José', 'Chicago']
+        nicknames = ['Red Sox', 'Yankees', 'Cardinals', 'Rays', 'Galaxy', 'Athletic', 'Earthquakes', 'Fire']
+        images = [(f"{city} {nickname}.png", f"{city} {nickname}") for city in cities for nickname in nicknames]
+
+        candidates = CandidateNames(images)
+        for (_, name) in rng.sample(images, 20):
+            i = rng.randrange(len(name))
+            query = name[:i] + 'x' + name[i + 1:]
+            self.assertEqual(linearBestMatch(query, images), candidates.bestMatch(query), query)
+
+        for query in ['Zorvak Quillons', 'Xyz', 'Pryngwel Daxuun FC']:
+            self.assertEqual(linearBestMatch(query, images), candidates.bestMatch(query), query)
+
+    def test_skips_candidates_that_cant_score_high_enough(self):
+        images = [('Boston Red Sox.png', 'Boston Red Sox')] + [(f"{i}.png", f"Qqqqqq {i}") for i in range(50)]
+        candidates = CandidateNames(images)
+
+        with patch('pdst.image.matching.fuzz.partial_ratio', wraps=fuzz.partial_ratio) as partialRatio:
+            self.assertEqual(('Boston Red Sox.png', 93), candidates.bestMatch('Boston Red Sax'))
+
+        self.assertEqual(1, partialRatio.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pdst import ColorCache
+
+
+class TestColorCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.cacheFile = os.path.join(self.tempDir.name, 'cache', 'colors.json')
+        self.image = os.path.join(self.tempDir.name, 'Alpha.png')
+        shutil.copy(os.path.join(os.path.dirname(__file__), 'test-files', 'logos', 'plain', 'Alpha.png'), self.image)
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    @patch('pdst.analysis.getAllColors')
+    def test_analyzes_once(self, mockAnalyze):
+        mockAnalyze.return_value = ['123456', 'abcdef'], [60, 40]
+        cache = ColorCache.ColorCache()
+
+        self.assertEqual((['123456', 'abcdef'], [60, 40]), cache.getAllColors(self.image))
+        self.assertEqual((['123456', 'abcdef'], [60, 40]), cache.getAllColors(self.image))
+        self.assertEqual(1, mockAnalyze.call_count)
+        self.assertEqual(1, cache.hits)
+
+    @patch('pdst.analysis.getAllColors')
+    def test_noBlackWhite_cached_separately(self, mockAnalyze):
+        mockAnalyze.side_effect = [(['000000', '123456'], [50, 50]), (['123456'], [100])]
+        cache = ColorCache.ColorCache()
+
+        self.assertEqual(['000000', '123456'], cache.getAllColors(self.image)[0])
+        self.assertEqual(['123456'], cache.getAllColors(self.image, True)[0])
+        self.assertEqual(['000000', '123456'], cache.getAllColors(self.image)[0])
+        self.assertEqual(2, mockAnalyze.call_count)
+
+    @patch('pdst.analysis.getDominantColor')
+    @patch('pdst.analysis.getAllColors')
+    def test_dominant_color_cached_separately(self, mockAllColors, mockDominant):
+        mockAllColors.return_value = ['123456', 'abcdef'], [60, 40]
+        mockDominant.side_effect = ['abcdef', '123456']
+        cache = ColorCache.ColorCache(maxPixels=1000)
+
+        self.assertEqual('abcdef', cache.getDominantColor(self.image))
+        self.assertEqual('abcdef', cache.getDominantColor(self.image))
+        self.assertEqual('123456', cache.getDominantColor(self.image, True))
+        self.assertEqual(['123456', 'abcdef'], cache.getAllColors(self.image)[0])
+        self.assertEqual(2, mockDominant.call_count)
+        mockDominant.assert_called_with(self.image, True, maxPixels=1000)
+        self.assertEqual(1, len(cache.entries))
+
+    @patch('pdst.analysis.getAllColors')
+    def test_changed_file_reanalyzed(self, mockAnalyze):
+        mockAnalyze.side_effect = [(['123456'], [100]), (['abcdef'], [100])]
+        cache = ColorCache.ColorCache()
+
+        self.assertEqual(['123456'], cache.getAllColors(self.image)[0])
+        with open(self.image, 'ab') as f:
+            f.write(b'\0')
+        self.assertEqual(['abcdef'], cache.getAllColors(self.image)[0])
+
+    @patch('pdst.analysis.getAllColors')
+    def test_different_pixel_budget_reanalyzed(self, mockAnalyze):
+        mockAnalyze.return_value = ['123456'], [100]
+        first = ColorCache.ColorCache(self.cacheFile, maxPixels=1000)
+        first.getAllColors(self.image)
+        self.assertTrue(first.save())
+
+        cache = ColorCache.ColorCache(self.cacheFile, maxPixels=2000)
+        cache.getAllColors(self.image)
+        cache.getAllColors(self.image)
+
+        self.assertEqual(2, mockAnalyze.call_count)
+        mockAnalyze.assert_called_with(self.image, False, maxPixels=2000)
+
+    @patch('pdst.analysis.getAllColors')
+    def test_missing_file_not_cached(self, mockAnalyze):
+        mockAnalyze.return_value = [], []
+        cache = ColorCache.ColorCache()
+
+        cache.getAllColors(None)
+        cache.getAllColors(None)
+        self.assertEqual(2, mockAnalyze.call_count)
+        self.assertEqual(0, len(cache.entries))
+
+    @patch('pdst.analysis.getAllColors')
+    def test_lru_eviction(self, mockAnalyze):
+        mockAnalyze.return_value = ['123456'], [100]
+        images = []
+        for name in ['a.png', 'b.png', 'c.png']:
+            images.append(os.path.join(self.tempDir.name, name))
+            shutil.copy(self.image, images[-1])
+
+        cache = ColorCache.ColorCache(maxEntries=2)
+        cache.getAllColors(images[0])
+        cache.getAllColors(images[1])
+        cache.getAllColors(images[0])
+        cache.getAllColors(images[2])
+
+        self.assertEqual([os.path.realpath(images[0]), os.path.realpath(images[2])], list(cache.entries))
+
+    @patch('pdst.analysis.getAllColors')
+    def test_persisted(self, mockAnalyze):
+        mockAnalyze.return_value = ['123456'], [100]
+        cache = ColorCache.ColorCache(self.cacheFile)
+        cache.getAllColors(self.image)
+        self.assertTrue(cache.save())
+        self.assertFalse(cache.save())
+
+        loaded = ColorCache.ColorCache(self.cacheFile)
+        self.assertEqual((['123456'], [100]), loaded.getAllColors(self.image))
+        self.assertEqual(1, mockAnalyze.call_count)
+
+    def test_real_analysis(self):
+        cache = ColorCache.ColorCache()
+        (colors, percents) = cache.getAllColors(self.image)
+
+        self.assertTrue(len(colors) > 0)
+        self.assertEqual(len(percents), len(cache.entries[os.path.realpath(self.image)]['colors']['all'][1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
+import json
 import os
+import tempfile
 import unittest
 from pathlib import Path
+from unittest.mock import patch
 
 from parameterized import parameterized
 
@@ -17,6 +20,26 @@ class TestConfig(unittest.TestCase):
 
         self.assertTrue(len(config.sports) > 0, 'Sports parsed from Config should not be empty')
 
+    @parameterized.expand([
+        ('default', None, None),
+        ('off', False, None),
+        ('on', True, os.path.join('xdg', 'pdst', 'color-cache.json')),
+        ('path', 'colors.json', 'colors.json'),
+    ])
+    def test_Config_colorCacheFile(self, name, setting, expected):
+        with tempfile.TemporaryDirectory() as tempDir, \
+                patch.dict(os.environ, {'XDG_CACHE_HOME': os.path.join(tempDir, 'xdg')}):
+            configFile = os.path.join(tempDir, 'config.json')
+            rawConfig = {'sports': []}
+            if setting is not None:
+                rawConfig['colorCache'] = os.path.join(tempDir, setting) if isinstance(setting, str) else setting
+            with open(configFile, 'w') as f:
+                json.dump(rawConfig, f)
+
+            config = Config(configFile)
+
+            self.assertEqual(os.path.join(tempDir, expected) if expected is not None else None, config.colorCacheFile)
+
     @parameterized.expand([
         ('always', DateOverrideMode.ALWAYS),
         (None, DateOverrideMode.EOY),
@@ -50,6 +73,24 @@ class TestConfig(unittest.TestCase):
         entry = SportMatchEntry(inEntry)
         self.assertEqual(expectedMatchRegex, entry.matchRegex)
 
+    def test_Config_SportMatchEntry_compiled(self):
+        entry = SportMatchEntry('Formula One')
+
+        self.assertTrue(entry.pattern.search('formula.one racing'))
+        self.assertEqual(('Formula One', 100), entry.getMatchScore('Formula One Racing'))
+        self.assertEqual((None, 0), SportMatchEntry({'overrideShow': True}).getMatchScore('None'))
+
+    @parameterized.expand([
+        ({'name': 'NFL'}, 'NFL Football', 60, True),
+        ({'name': 'NFL'}, 'Hockey', 60, False),
+        ({'name': 'NFL'}, 'NFL Football', 100, False),
+        ({'name': 'NFL'}, '', 0, False),
+        ({'name': 'Soccer', 'matches': ['MLS']}, 'Hockey', 60, True),
+    ])
+    def test_Config_SportConfigEntry_couldScoreAbove(self, config, searchStr, score, expected):
+        entry = SportConfigEntry(config)
+        self.assertEqual(expected, entry.couldScoreAbove(searchStr, score))
+
     @parameterized.expand([
         ('match', False),
         ({'match': 'match'}, False),
@@ -1,3 +1,6 @@
+import os
+import sqlite3
+import tempfile
 import unittest
 from datetime import datetime
 from unittest.mock import MagicMock, patch
@@ -5,7 +8,8 @@ from unittest.mock import MagicMock, patch
 from parameterized import parameterized
 
 from pdst.Config import DateOverrideMode, SportConfigEntry
-from pdst.MetadataService import MetadataService
+from pdst.MetadataService import MetadataService, EpisodeContext
+from pdst.db.metadata import EpisodeMetadata
 
 
 class TestCliMetadataExport(unittest.TestCase):
@@ -99,3 +103,150 @@ class TestCliMetadataExport(unittest.TestCase):
         metadata = self.service.getMetadataForEpisodeFile('Sport - 2019-12-31 - The Title.ts')
 
         self.assertEqual('File Show', metadata.show.title)
+
+    def test_prefetchDirectory(self):
+        self.mockDao.prefetchDirectory.return_value = ['a.ts', 'b.ts']
+
+        self.assertEqual(2, self.service.prefetchDirectory('/some/dir', recursive=False))
+        self.mockDao.prefetchDirectory.assert_called_once_with('/some/dir', False)
+
+    def test_prefetchDirectory_db_error(self):
+        """A DB that can't be read shouldn't stop commands that may not even need it"""
+        self.mockDao.prefetchDirectory.side_effect = sqlite3.OperationalError('unable to open database file')
+
+        self.assertEqual(0, self.service.prefetchDirectory('/some/dir'))
+
+    def test_prefetchSections(self):
+        self.mockDao.loadSection.side_effect = lambda sectionId: {1: ['a.ts', 'b.ts'], 2: ['c.ts']}[sectionId]
+
+        self.assertEqual(3, self.service.prefetchSections({2, 1}))
+        self.assertEqual([((1,),), ((2,),)], self.mockDao.loadSection.call_args_list)
+
+
+class TestMetadataServiceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.video = os.path.join(self.tempDir.name, 'Sport - 2020-08-01 - The Title.ts')
+        with open(self.video, 'w') as f:
+            f.write('video')
+
+        self.mockDao = MagicMock()
+        self.mockDao.getMetadataForEpisodeFile.side_effect = lambda path: EpisodeMetadata(
+            {'id': 3, 'title': 'DB Title', 'originally_available_at': '2020-08-01 12:00:00'},
+            EpisodeMetadata({'id': 2, 'index': 2020}), EpisodeMetadata({'id': 1, 'title': 'Sport'}))
+        self.mockSportService = MagicMock()
+        self.mockSportService.getSportFor.return_value = None
+
+        self.service = MetadataService(self.mockDao, self.mockSportService)
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_db_lookup_cached(self):
+        first = self.service.getMetadataForEpisodeFile(self.video, readFromFile=False)
+        second = self.service.getMetadataForEpisodeFile(self.video, readFromFile=False)
+
+        self.assertEqual('DB Title', second.title)
+        self.assertEqual(1, self.mockDao.getMetadataForEpisodeFile.call_count)
+        self.assertEqual(1, self.mockSportService.getSportFor.call_count)
+
+        # each caller gets its own copy to change
+        self.assertIsNot(first, second)
+        first.show.title = 'Changed'
+        self.assertEqual('Sport', self.service.getMetadataForEpisodeFile(self.video, readFromFile=False).show.title)
+
+    @patch('pdst.db.metadata.EpisodeMetadata.fromFile')
+    def test_metadata_file_parsed_once(self, mockFromFile):
+        mockFromFile.return_value = EpisodeMetadata({'id': 3, 'title': 'File Title'})
+        with open(os.path.join(self.tempDir.name, 'Sport - 2020-08-01 - The Title.metadata'), 'w') as f:
+            f.write('[metadata]')
+
+        for _ in range(3):
+            self.assertEqual('File Title', self.service.getMetadataForEpisodeFile(self.video).title)
+
+        self.assertEqual(1, mockFromFile.call_count)
+        self.mockDao.getMetadataForEpisodeFile.assert_not_called()
+
+    def test_changed_metadata_file_reread(self):
+        self.assertEqual('DB Title', self.service.getMetadataForEpisodeFile(self.video).title)
+
+        metadataFile = os.path.join(self.tempDir.name, 'Sport - 2020-08-01 - The Title.metadata')
+        with open(metadataFile, 'w') as f:
+            f.write('[metadata]\ntitle=File Title\n')
+
+        self.assertEqual('File Title', self.service.getMetadataForEpisodeFile(self.video).title)
+
+    def test_changed_video_reread(self):
+        self.service.getMetadataForEpisodeFile(self.video, readFromFile=False)
+        with open(self.video, 'a') as f:
+            f.write('a new recording')
+        self.service.getMetadataForEpisodeFile(self.video, readFromFile=False)
+
+        self.assertEqual(2, self.mockDao.getMetadataForEpisodeFile.call_count)
+
+    def test_lru_eviction(self):
+        service = MetadataService(self.mockDao, self.mockSportService, cacheSize=1)
+        other = os.path.join(self.tempDir.name, 'Other.ts')
+
+        service.getMetadataForEpisodeFile(self.video, readFromFile=False)
+        service.getMetadataForEpisodeFile(other, readFromFile=False)
+        service.getMetadataForEpisodeFile(self.video, readFromFile=False)
+
+        self.assertEqual(3, self.mockDao.getMetadataForEpisodeFile.call_count)
+        self.assertEqual(1, len(service.cache))
+
+    def test_missing_not_cached(self):
+        self.mockDao.getMetadataForEpisodeFile.side_effect = None
+        self.mockDao.getMetadataForEpisodeFile.return_value = None
+
+        self.assertIsNone(self.service.getMetadataForEpisodeFile(self.video, readFromFile=False))
+        self.assertEqual(0, len(self.service.cache))
+
+
+class TestEpisodeContext(unittest.TestCase):
+
+    def test_resolved_once(self):
+        metadataService = MagicMock()
+        sportService = MagicMock()
+        sportEntry = sportService.getSportFor.return_value
+        sportEntry.matchObjectFor.return_value = ('match', 100)
+        context = EpisodeContext('/dvr/Sport - 2020-08-01 - Team A vs. Team B.ts', metadataService, sportService)
+
+        for _ in range(2):
+            self.assertIs(sportEntry, context.sportEntry)
+            self.assertEqual('match', context.matchEntry)
+            self.assertIs(metadataService.getMetadataForEpisodeFile.return_value, context.metadata)
+            self.assertEqual(['Team A', 'Team B'], context.teamNames)
+
+        sportService.getSportFor.assert_called_once_with('/dvr/Sport - 2020-08-01 - Team A vs. Team B.ts')
+        sportEntry.matchObjectFor.assert_called_once()
+        metadataService.getMetadataForEpisodeFile.assert_called_once()
+
+    def test_lazy(self):
+        metadataService = MagicMock()
+        sportService = MagicMock()
+        sportService.getSportFor.return_value = None
+        context = EpisodeContext('/dvr/Sport - 2020-08-01 - Event.ts', metadataService, sportService)
+
+        self.assertIsNone(context.matchEntry)
+        self.assertIsNone(context.sportEntry)
+        metadataService.getMetadataForEpisodeFile.assert_not_called()
+
+    def test_metadata_without_show_shares_sport_match(self):
+        filePath = '/dvr/Sport - 2020-08-01 - Event.ts'
+        sportEntry = SportConfigEntry({'name': 'Sport', 'matches': ['Sport'], 'dateOverride': 'never'})
+        sportService = MagicMock()
+        sportService.getSportFor.return_value = sportEntry
+        dao = MagicMock()
+        dao.getMetadataForEpisodeFile.return_value = EpisodeMetadata({'id': 3, 'title': 'Event'})
+        context = EpisodeContext(filePath, MetadataService(dao, sportService), sportService)
+
+        with patch.object(sportEntry, 'matchObjectFor', wraps=sportEntry.matchObjectFor) as matchObjectFor:
+            self.assertIs(sportEntry, context.sportEntry)
+            self.assertEqual('Event', context.metadata.title)
+            self.assertIs(sportEntry.matches[0], context.matchEntry)
+
+        sportService.getSportFor.assert_called_once_with(filePath)
+        matchObjectFor.assert_called_once_with(filePath)
+
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+
+from pdst.MovePlan import MovePlan, MoveOperation, MoveJournal, MKDIR, COPY, MOVE
+
+
+class TestMovePlan(unittest.TestCase):
+
+    def test_plan_dedupes_setup(self):
+        plan = MovePlan()
+        plan.add(MoveOperation(MKDIR, '/out/Show/Season 1'))
+        plan.add(MoveOperation(COPY, '/out/Show/poster.jpg', src='/plex/poster.jpg'))
+        plan.add(MoveOperation(MOVE, '/out/Show/Season 1/a.ts', src='/dvr/a.ts', video='/dvr/a.ts'))
+        plan.add(MoveOperation(MKDIR, '/out/Show/Season 1'))
+        plan.add(MoveOperation(COPY, '/out/Show/poster.jpg', src='/plex/poster.jpg'))
+        plan.add(MoveOperation(MOVE, '/out/Show/Season 1/b.ts', src='/dvr/b.ts', video='/dvr/b.ts'))
+        plan.add(MoveOperation(MOVE, '/out/Show/Season 1/b.png', src='/dvr/b.png', video='/dvr/b.ts'))
+
+        self.assertEqual(5, len(plan))
+        self.assertEqual([MKDIR, COPY], [op.kind for op in plan.getSetup()])
+        self.assertEqual(['/dvr/a.ts', '/dvr/b.ts'], list(plan.getVideos()))
+        self.assertEqual(2, len(plan.getVideos()['/dvr/b.ts']))
+
+    def test_isDone(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            src = os.path.join(tempDir, 'src.ts')
+            dst = os.path.join(tempDir, 'dst.ts')
+            operation = MoveOperation(MOVE, dst, src=src)
+
+            open(src, 'w').close()
+            self.assertFalse(operation.isDone())
+
+            # copied across filesystems, but not yet removed
+            open(dst, 'w').close()
+            self.assertFalse(operation.isDone())
+
+            os.remove(src)
+            self.assertTrue(operation.isDone())
+
+
+class TestMoveJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.journalFile = os.path.join(self.tempDir.name, 'journal', 'move.journal')
+
+        self.plan = MovePlan()
+        self.plan.add(MoveOperation(MKDIR, '/out/Show/Season 1'))
+        self.plan.add(MoveOperation(MOVE, '/out/Show/Season 1/a.ts', src='/dvr/a.ts', video='/dvr/a.ts'))
+        self.plan.add(MoveOperation(MOVE, '/out/Show/Season 1/b.ts', src='/dvr/b.ts', video='/dvr/b.ts'))
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_unfinished(self):
+        journal = MoveJournal(self.journalFile)
+        journal.start(self.plan)
+        journal.markDone(self.plan.operations[:2])
+        self.assertFalse(journal.finish())
+
+        leftover = MoveJournal(self.journalFile).load()
+
+        self.assertEqual(1, len(leftover))
+        self.assertEqual('/dvr/b.ts', leftover[0].src)
+        self.assertEqual('/dvr/b.ts', leftover[0].video)
+
+    def test_finished(self):
+        journal = MoveJournal(self.journalFile)
+        journal.start(self.plan)
+        journal.markDone(self.plan.operations)
+
+        self.assertTrue(journal.finish())
+        self.assertFalse(os.path.exists(self.journalFile))
+        self.assertEqual([], MoveJournal(self.journalFile).load())
+
+    def test_cut_short(self):
+        journal = MoveJournal(self.journalFile)
+        journal.start(self.plan)
+        journal.markDone(self.plan.operations[:1])
+        journal.close()
+        with open(self.journalFile, 'a') as f:
+            f.write('{"do')
+
+        self.assertEqual(2, len(MoveJournal(self.journalFile).load()))
+
+    def test_unreadable(self):
+        os.makedirs(os.path.dirname(self.journalFile))
+        with open(self.journalFile, 'w') as f:
+            f.write('not json\n')
+
+        self.assertEqual([], MoveJournal(self.journalFile).load())
+
+
+if __name__ == '__main__':
+    unittest.main()
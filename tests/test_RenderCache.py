@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from PIL import Image
+from parameterized import parameterized
+
+from pdst import RenderCache
+from pdst.image.spec import ImageSpec, CompositeSpec, StrokeSpec
+
+
+def mockConfig(**overrides):
+    settings = dict(fallbackColor='111', preventSimilarColors=True, colorAnalysisMaxPixels=250000,
+                    compositingBackend='pil')
+    settings.update(overrides)
+    return MagicMock(**settings)
+
+
+class TestRenderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.cacheDir = os.path.join(self.tempDir.name, 'renders')
+        self.logo = os.path.join(self.tempDir.name, 'Alpha.png')
+        shutil.copy(os.path.join(os.path.dirname(__file__), 'test-files', 'logos', 'plain', 'Alpha.png'), self.logo)
+        self.config = mockConfig()
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def spec(self, imageFile=None, **kwargs):
+        return ImageSpec(imageFile if imageFile is not None else self.logo, colors=['123456'], **kwargs)
+
+    def key(self, cache, imageSpecs=None, compositeSpec=None, config=None, extension='png'):
+        return cache.keyFor(compositeSpec if compositeSpec is not None else CompositeSpec((600, 340)),
+                            imageSpecs if imageSpecs is not None else [self.spec()],
+                            config if config is not None else self.config, extension)
+
+    def image(self, color='red'):
+        return Image.new('RGB', (60, 34), color)
+
+    def test_key_is_stable(self):
+        cache = RenderCache.RenderCache(self.cacheDir)
+        self.assertEqual(self.key(cache), self.key(RenderCache.RenderCache(self.cacheDir)))
+
+    def test_key_follows_content_not_location(self):
+        cache = RenderCache.RenderCache(self.cacheDir)
+        os.makedirs(os.path.join(self.tempDir.name, 'elsewhere'))
+        moved = os.path.join(self.tempDir.name, 'elsewhere', 'Alpha.png')
+        shutil.copy(self.logo, moved)
+
+        self.assertEqual(self.key(cache), self.key(cache, [self.spec(moved)]))
+
+    @parameterized.expand([
+        ['text', dict(compositeSpec=CompositeSpec((600, 340), 'Final'))],
+        ['size', dict(compositeSpec=CompositeSpec((800, 450)))],
+        ['fallbackColor', dict(config=mockConfig(fallbackColor='ccc'))],
+        ['preventSimilarColors', dict(config=mockConfig(preventSimilarColors=False))],
+        ['colorAnalysisMaxPixels', dict(config=mockConfig(colorAnalysisMaxPixels=0))],
+        ['compositingBackend', dict(config=mockConfig(compositingBackend='numpy'))],
+        ['extension', dict(extension='jpg')],
+    ])
+    def test_key_changes_with_inputs(self, name, kwargs):
+        cache = RenderCache.RenderCache(self.cacheDir)
+        self.assertNotEqual(self.key(cache), self.key(cache, **kwargs))
+
+    @parameterized.expand([
+        ['colors', dict(colors=['654321'])],
+        ['bg', dict(bg='solid')],
+        ['invert', dict(invert=True)],
+        ['stroke', dict(strokeSpec=StrokeSpec(4, 'ffffff'))],
+    ])
+    def test_key_changes_with_specs(self, name, kwargs):
+        cache = RenderCache.RenderCache(self.cacheDir)
+        spec = self.spec()
+        for attr, value in kwargs.items():
+            setattr(spec, attr, value)
+
+        self.assertNotEqual(self.key(cache), self.key(cache, [spec]))
+
+    def test_key_changes_with_logo_contents(self):
+        cache = RenderCache.RenderCache(self.cacheDir)
+        before = self.key(cache)
+        self.image().save(self.logo)
+
+        self.assertNotEqual(before, self.key(cache))
+
+    def test_no_key_for_missing_image(self):
+        cache = RenderCache.RenderCache(self.cacheDir)
+        self.assertIsNone(self.key(cache, [self.spec(os.path.join(self.tempDir.name, 'missing.png'))]))
+
+    def test_store_then_place(self):
+        cache = RenderCache.RenderCache(self.cacheDir)
+        key = self.key(cache)
+        first = os.path.join(self.tempDir.name, 'first.png')
+        second = os.path.join(self.tempDir.name, 'second.png')
+
+        self.assertFalse(cache.place(key, first))
+        cache.store(key, self.image(), first)
+        self.assertTrue(cache.place(key, second))
+
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_rerender_doesnt_change_linked_files(self):
+        cache = RenderCache.RenderCache(self.cacheDir)
+        key = self.key(cache)
+        first = os.path.join(self.tempDir.name, 'first.png')
+        second = os.path.join(self.tempDir.name, 'second.png')
+        cache.store(key, self.image('red'), first)
+        cache.place(key, second)
+
+        RenderCache.saveImage(self.image('blue'), first)
+
+        with Image.open(second) as placed:
+            self.assertEqual((255, 0, 0), placed.getpixel((0, 0)))
+        self.assertTrue(cache.place(key, os.path.join(self.tempDir.name, 'third.png')))
+        with Image.open(os.path.join(self.tempDir.name, 'third.png')) as placed:
+            self.assertEqual((255, 0, 0), placed.getpixel((0, 0)))
+
+    def test_evicts_least_recently_used(self):
+        cache = RenderCache.RenderCache(self.cacheDir)
+        paths = [os.path.join(self.tempDir.name, f'{i}.png') for i in range(3)]
+        keys = [self.key(cache, compositeSpec=CompositeSpec((600, 340), str(i))) for i in range(3)]
+        cache.store(keys[0], self.image(), paths[0])
+        cache.store(keys[1], self.image(), paths[1])
+        cache.maxBytes = cache.totalBytes
+
+        cache.place(keys[0], paths[0])
+        cache.store(keys[2], self.image(), paths[2])
+
+        self.assertEqual([keys[0], keys[2]], list(cache.entries))
+        self.assertFalse(cache.place(keys[1], paths[1]))
+        # the output itself is untouched
+        self.assertTrue(os.path.exists(paths[1]))
+
+    def test_scan_orders_by_use(self):
+        cache = RenderCache.RenderCache(self.cacheDir)
+        keys = [self.key(cache, compositeSpec=CompositeSpec((600, 340), str(i))) for i in range(2)]
+        for key in keys:
+            cache.store(key, self.image(), os.path.join(self.tempDir.name, key))
+        past = time.time() - 60
+        os.utime(os.path.join(self.cacheDir, keys[1][:2], keys[1]), (past, past))
+
+        reopened = RenderCache.RenderCache(self.cacheDir)
+
+        self.assertEqual([keys[1], keys[0]], list(reopened.entries))
+        self.assertEqual(cache.totalBytes, reopened.totalBytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
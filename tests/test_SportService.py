@@ -1,12 +1,27 @@
 import os
+import random
 import unittest
+from unittest.mock import patch
 
 from parameterized import parameterized
 
-from pdst.Config import Config
+from pdst.Config import Config, SportConfigEntry, combinedPattern
 from pdst.SportService import SportService
 
 
+def exhaustiveSportFor(sports, inStr):
+    """Scores every sport, the way getSportFor did before it learned to skip ones that can't win"""
+    bestMatch = None
+    bestScore = 0
+    for sport in sports:
+        (match, score) = sport.matchFor(inStr)
+        if score > bestScore:
+            bestScore = score
+            bestMatch = sport
+
+    return bestMatch if bestScore > 60 else None
+
+
 class TestSportService(unittest.TestCase):
 
     def setUp(self):
@@ -60,6 +75,49 @@ class TestSportService(unittest.TestCase):
         else:
             self.assertEqual(expected, sportEntry.name)
 
+    def test_getSportFor_same_as_exhaustive(self):
+        words = ['NCAA', 'College', 'Football', 'World', 'Cup', 'Olympic', 'national', 'Premier', 'League', 'MLS',
+                 'Soccer', 'NWSL', 'NFL', 'NHL', 'Super', 'Rugby', 'Formula', 'One', 'E', '1', 'Cricket', 'Hockey',
+                 'Live', '(2019)', '-', 'vs.', 'Georgia']
+        rng = random.Random(1234)
+        titles = [' '.join(rng.choice(words) for _ in range(rng.randint(1, 6))) for _ in range(500)]
+        titles += ['NFL', 'NHL Hockey', 'Super Rugby Pacific', 'NWSL Soccer', 'Rugby', 'Nfl', '']
+
+        for title in titles:
+            self.assertIs(exhaustiveSportFor(self.service.sports, title), self.service.getSportFor(title), title)
+
+    def test_getSportFor_memoized(self):
+        with patch.object(SportConfigEntry, 'matchFor', autospec=True, return_value=('MLS', 100)) as mockMatch:
+            first = self.service.getSportFor('MLS Soccer')
+            second = self.service.getSportFor('MLS Soccer')
+
+        self.assertIs(first, second)
+        self.assertEqual(1, mockMatch.call_count)
+
+    def test_getSportFor_memo_bounded(self):
+        jsonPath = os.path.join(os.path.split(__file__)[0], 'test-files', 'test_sports.json')
+        service = SportService(Config(jsonPath), memoSize=2)
+
+        for title in ['MLS', 'NFL', 'Formula 1']:
+            service.getSportFor(title)
+
+        self.assertEqual(['NFL', 'Formula 1'], list(service.memo))
+
+    def test_getSportFor_skips_regexes_on_miss(self):
+        with patch.object(SportConfigEntry, 'matchFor', autospec=True, return_value=(None, 0)) as mockMatch:
+            self.service.getSportFor('Cricket')
+
+        checked = [call.args[0].name for call in mockMatch.call_args_list]
+        self.assertTrue(all(len(sport.matches) == 0 for sport in self.service.sports if sport.name in checked))
+
+    def test_combinedPattern_backreference(self):
+        sport = SportConfigEntry({'name': 'Repeats', 'matches': [{'rawRegex': r'(\w+) \1'}, 'Other']})
+
+        self.assertIsNone(combinedPattern(sport.matches))
+        service = SportService(None)
+        service.sports = [sport]
+        self.assertIs(sport, service.getSportFor('go go'))
+
 
 if __name__ == '__main__':
     unittest.main()
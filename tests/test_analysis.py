@@ -1,9 +1,33 @@
+import os
+import tempfile
 import unittest
 
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
 from parameterized import parameterized
 
 from pdst import analysis
 
+LOGOS_DIR = os.path.join(os.path.dirname(__file__), 'test-files', 'logos', 'plain')
+
+
+def colorDistance(hex1, hex2):
+    return np.linalg.norm(np.array(ImageColor.getrgb(f'#{hex1}')) - np.array(ImageColor.getrgb(f'#{hex2}')))
+
+
+def stripedImage(path, size, stripes, transparentBorder=0):
+    """Draws vertical stripes of (hex color, fraction of the width), optionally inside a transparent border"""
+    im = Image.new('RGBA', size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(im)
+    left = transparentBorder
+    inner = size[0] - 2 * transparentBorder
+    for color, fraction in stripes:
+        right = left + round(inner * fraction)
+        draw.rectangle([left, transparentBorder, right - 1, size[1] - transparentBorder - 1], fill=f'#{color}')
+        left = right
+    im.save(path)
+    return path
+
 
 class TestMetadata(unittest.TestCase):
 
@@ -50,3 +74,61 @@ class TestMetadata(unittest.TestCase):
 
     def test_isValidImage_nonImage(self):
         self.assertFalse(analysis.isValidImage(__file__))
+
+    def test_downscaleToPixels(self):
+        im = Image.new('RGB', (3000, 1500))
+
+        self.assertIs(im, analysis.downscaleToPixels(im, None))
+        self.assertIs(im, analysis.downscaleToPixels(im, 3000 * 1500))
+        self.assertEqual((2000, 1000), analysis.downscaleToPixels(im, 2000000).size)
+
+    def test_getColorCounts_ignores_transparent(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            path = stripedImage(os.path.join(tempDir, 'logo.png'), (400, 400), [('ff0000', 1.0)], transparentBorder=100)
+            (colors, counts) = analysis.getColorCounts(path)
+
+        self.assertEqual(200 * 200, sum(counts))
+        self.assertTrue(all(c[3] == 255 for c, n in zip(colors, counts) if n > 0))
+
+    def test_getColorCounts_fully_transparent(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            path = os.path.join(tempDir, 'empty.png')
+            Image.new('RGBA', (50, 50), (255, 0, 0, 0)).save(path)
+
+            self.assertEqual(([], []), analysis.getColorCounts(path))
+            self.assertEqual(([], []), analysis.getAllColors(path))
+
+    @parameterized.expand([
+        ('stripes', [('c8102e', 0.5), ('041e42', 0.3), ('ffffff', 0.2)], 0),
+        ('bordered', [('00338d', 0.6), ('c60c30', 0.4)], 400),
+        ('many', [('006bb6', 0.3), ('f58426', 0.25), ('bec0c2', 0.2), ('000000', 0.15), ('ffc72c', 0.1)], 200),
+    ])
+    def test_sampled_matches_full_synthetic(self, name, stripes, border):
+        with tempfile.TemporaryDirectory() as tempDir:
+            path = stripedImage(os.path.join(tempDir, f'{name}.png'), (1200, 900), stripes, border // 2)
+            self.__assertSampledMatchesFull(path)
+
+    @parameterized.expand([
+        ('Alpha.png',),
+        ('Bravo.png',),
+        ('Charlie.png',),
+    ])
+    def test_sampled_matches_full_logos(self, logo):
+        with tempfile.TemporaryDirectory() as tempDir:
+            # blow the logo up well past the pixel budget
+            path = os.path.join(tempDir, logo)
+            im = Image.open(os.path.join(LOGOS_DIR, logo))
+            im.resize((im.size[0] * 2, im.size[1] * 2), Image.NEAREST).save(path)
+            self.__assertSampledMatchesFull(path)
+
+    def __assertSampledMatchesFull(self, path):
+        np.random.seed(1000)
+        (fullColors, fullPercents) = analysis.getAllColors(path, maxPixels=None)
+        np.random.seed(1000)
+        (sampledColors, sampledPercents) = analysis.getAllColors(path, maxPixels=50000)
+
+        self.assertEqual(len(fullColors), len(sampledColors))
+        for full, sampled in zip(fullColors, sampledColors):
+            self.assertLess(colorDistance(full, sampled), 12, f"{full} vs {sampled}")
+        for full, sampled in zip(fullPercents[:len(fullColors)], sampledPercents):
+            self.assertLessEqual(abs(full - sampled), 2)
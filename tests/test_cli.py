@@ -1,7 +1,41 @@
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
 import unittest
 
 from click.testing import CliRunner
 from pdst.cli import cli
+from pdst.db.PlexDao import PlexDao
+
+# Wall time budget (in seconds) for importing the CLI and running a command in a fresh interpreter, not counting
+# interpreter startup itself
+STARTUP_BUDGET = 0.75
+
+HEAVY_MODULES = ['PIL', 'numpy', 'scipy', 'fuzzywuzzy']
+# commands that don't touch images may still match names, but shouldn't need any of the image libraries
+IMAGE_MODULES = ['PIL', 'numpy', 'scipy']
+
+STARTUP_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+from pdst.cli import cli
+cli.main(json.loads(sys.argv[1]), standalone_mode=False)
+elapsed = time.perf_counter() - start
+loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(json.dumps({{'elapsed': elapsed, 'loaded': loaded}}))
+"""
+
+
+def runInFreshInterpreter(args):
+    """Runs the CLI with the given args in a new interpreter, returning how long it took and the heavy modules loaded"""
+    repoRoot = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, json.dumps(args)], cwd=repoRoot,
+                            stdout=subprocess.PIPE, check=True).stdout.decode()
+    return json.loads(output.strip().splitlines()[-1])
 
 
 class TestCli(unittest.TestCase):
@@ -22,3 +56,46 @@ class TestCli(unittest.TestCase):
 
         self.assertEqual(0, result.exit_code)
         self.assertIn(', version', result.output)
+
+    def test_clean_help_startup_budget(self):
+        result = runInFreshInterpreter(['clean', '--help'])
+
+        self.assertEqual([], result['loaded'])
+        self.assertLess(result['elapsed'], STARTUP_BUDGET)
+
+    def test_clean_skips_image_imports(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            # something to check against the config's video extensions
+            open(os.path.join(tempDir, 'Sport - 2020-08-01 - Event.ts'), 'w').close()
+            result = runInFreshInterpreter(['clean', tempDir])
+
+        self.assertEqual([], [m for m in result['loaded'] if m in IMAGE_MODULES])
+        self.assertLess(result['elapsed'], STARTUP_BUDGET)
+
+    def test_move_dry_run_skips_image_imports(self):
+        testFiles = os.path.join(os.path.dirname(__file__), 'test-files')
+        with tempfile.TemporaryDirectory() as tempDir:
+            sourceDir = os.path.join(tempDir, 'dvr')
+            shutil.copytree(os.path.join(testFiles, 'testMedia', 'Sport Alpha (2009)', 'Season 2020'), sourceDir,
+                            ignore=shutil.ignore_patterns('*.metadata'))
+            video = os.path.join(sourceDir, 'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo.ts')
+
+            libraryPath = os.path.join(tempDir, 'library')
+            shutil.copytree(os.path.join(testFiles, 'testPlexLibrary'), libraryPath)
+            with sqlite3.connect(os.path.join(libraryPath, PlexDao.PLEX_DB_PATH)) as conn:
+                conn.execute('UPDATE media_parts SET file = ? WHERE id = 1', [video])
+
+            configFile = os.path.join(tempDir, 'config.json')
+            with open(os.path.join(testFiles, 'config.json')) as f:
+                config = json.load(f)
+            config['plexLibrary'] = libraryPath
+            config['moveTarget'] = os.path.join(tempDir, 'library-out')
+            with open(configFile, 'w') as f:
+                json.dump(config, f)
+
+            result = runInFreshInterpreter(['move', '-c', configFile, '--dry-run', sourceDir])
+
+            self.assertTrue(os.path.exists(video), 'a dry run should leave the video where it is')
+
+        self.assertEqual([], [m for m in result['loaded'] if m in IMAGE_MODULES])
+        self.assertLess(result['elapsed'], STARTUP_BUDGET)
@@ -1,9 +1,15 @@
 import os
+import shutil
+import tempfile
 import unittest
+from unittest.mock import MagicMock
 
 from click.testing import CliRunner
 
+from pdst import ColorCache
 from pdst.cli import cli
+from pdst.commands import cmd_analyze
+from pdst.commands.helpers import FileResult
 
 
 class TestCliAnalyze(unittest.TestCase):
@@ -83,6 +89,22 @@ class TestCliAnalyze(unittest.TestCase):
             print(result.exception)
             raise e
 
+    def test_analyze_all_stores_only_uncached_colors(self):
+        cache = ColorCache.configure(None)
+        ctx = MagicMock(allColors=True, noBW=False, interactive=False, rename=False)
+        file = 'test-files/logos/plain/Alpha.png'
+        colors = cache.getAllColors(file)
+        cache.unsaved = 0
+
+        cmd_analyze.reportImageColors(ctx, FileResult(file, colors))
+        self.assertEqual(0, cache.unsaved)
+
+        # a result from a worker process, which this process' cache hasn't seen
+        other = 'test-files/logos/plain/Charlie.png'
+        cmd_analyze.reportImageColors(ctx, FileResult(other, (['123456'], [100])))
+        self.assertEqual(1, cache.unsaved)
+        self.assertEqual((['123456'], [100]), cache.lookup(other))
+
     def test_analyze_rename(self):
         runner = CliRunner()
         file = 'test-files/logos/plain/Alpha.png'
@@ -102,3 +124,63 @@ class TestCliAnalyze(unittest.TestCase):
             # rename file back to Alpha.png
             newFile = result.output.split('\n')[-2].split(' -> ')[-1]
             os.rename(newFile, file)
+
+    def test_analyze_jobs_ordered(self):
+        runner = CliRunner()
+        imgDir = 'test-files/logos/plain'
+        serial = runner.invoke(cli, ['analyze', '-m', 'image', '-a', '-c', self.cfg, imgDir])
+        parallel = runner.invoke(cli, ['analyze', '-m', 'image', '-a', '-j', '3', '-c', self.cfg, imgDir])
+
+        try:
+            self.assertEqual(0, parallel.exit_code)
+            headers = [line for line in parallel.output.splitlines() if line.startswith('Colors in ')]
+            self.assertEqual([line for line in serial.output.splitlines() if line.startswith('Colors in ')], headers)
+            self.assertEqual(3, len(headers))
+
+        except AssertionError as e:
+            print(parallel.output)
+            print(parallel.exception)
+            raise e
+
+    def test_analyze_jobs_rename(self):
+        runner = CliRunner()
+        with tempfile.TemporaryDirectory() as tempDir:
+            for name in ['Alpha.png', 'Bravo.png']:
+                shutil.copy(os.path.join('test-files/logos/plain', name), tempDir)
+
+            result = runner.invoke(cli, ['analyze', '-m', 'image', '-r', '-j', '2', '-c', self.cfg, tempDir])
+
+            try:
+                self.assertEqual(0, result.exit_code)
+                renamed = sorted(os.listdir(tempDir))
+                self.assertEqual(2, len(renamed))
+                self.assertTrue(renamed[0].startswith('Alpha_6'))
+                self.assertTrue(renamed[1].startswith('Bravo_'))
+
+            except AssertionError as e:
+                print(result.output)
+                print(result.exception)
+                raise e
+
+    def test_analyze_rename_conflict(self):
+        runner = CliRunner()
+        with tempfile.TemporaryDirectory() as tempDir:
+            file = os.path.join(tempDir, 'Alpha.png')
+            shutil.copy('test-files/logos/plain/Alpha.png', file)
+
+            first = runner.invoke(cli, ['analyze', '-m', 'image', '-r', '-c', self.cfg, file])
+            renamed = first.output.split('\n')[-2].split(' -> ')[-1]
+            shutil.copy('test-files/logos/plain/Alpha.png', file)
+
+            second = runner.invoke(cli, ['analyze', '-m', 'image', '-r', '-c', self.cfg, file])
+
+            try:
+                self.assertEqual(0, second.exit_code)
+                self.assertIn('already exists', second.output)
+                self.assertTrue(os.path.exists(file))
+                self.assertTrue(os.path.exists(renamed))
+
+            except AssertionError as e:
+                print(second.output)
+                print(second.exception)
+                raise e
@@ -0,0 +1,232 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import simplejson as json
+from click.testing import CliRunner
+from parameterized import parameterized
+
+from pdst.cli import cli
+from pdst.commands.cmd_catchup import HighWaterMark, isWatchedFile
+from pdst.db.PlexDao import PlexDao, closeConnections
+
+
+class TestCliCatchup(unittest.TestCase):
+    basename = 'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo'
+
+    def setUp(self):
+        testsDir = os.path.dirname(__file__)
+        os.chdir(testsDir)
+
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.mediaRoot = os.path.join(self.tempDir.name, 'dvr')
+        self.seasonDir = os.path.join(self.mediaRoot, 'Sport Alpha (2009)', 'Season 2020')
+        shutil.copytree(os.path.join(testsDir, 'test-files', 'testMedia'), self.mediaRoot)
+        for ext in ['metadata', 'png']:
+            os.remove(os.path.join(self.seasonDir, f'{self.basename}.{ext}'))
+        self.video = os.path.join(self.seasonDir, f'{self.basename}.ts')
+
+        libraryPath = os.path.join(self.tempDir.name, 'library')
+        self.dbPath = os.path.join(libraryPath, PlexDao.PLEX_DB_PATH)
+        os.makedirs(os.path.dirname(self.dbPath))
+        shutil.copy(os.path.join(testsDir, 'test-files', 'testPlexLibrary', PlexDao.PLEX_DB_PATH), self.dbPath)
+        with sqlite3.connect(self.dbPath) as conn:
+            conn.execute('UPDATE media_parts SET file = ? WHERE id = 1', [self.video])
+        self.lastPartId = 1
+
+        self.cfg = os.path.join(self.tempDir.name, 'config.json')
+        with open(os.path.join(testsDir, 'test-files', 'config.json')) as f:
+            config = json.load(f)
+        config['plexLibrary'] = libraryPath
+        config['sports'][0]['imageRoot'] = os.path.abspath(config['sports'][0]['imageRoot'])
+        config['colorCache'] = False
+        with open(self.cfg, 'w') as f:
+            json.dump(config, f)
+
+        self.stateFile = os.path.join(self.tempDir.name, 'state', 'catchup.json')
+
+    def tearDown(self):
+        closeConnections()
+        self.tempDir.cleanup()
+
+    def addRecording(self, name):
+        path = os.path.join(self.seasonDir, f'{name}.ts')
+        shutil.copy(self.video, path)
+
+        with sqlite3.connect(self.dbPath) as conn:
+            episodeId = conn.execute('SELECT max(id) + 1 FROM metadata_items').fetchone()[0]
+            # a copy of the existing episode, under a new id
+            conn.execute('CREATE TEMP TABLE episode AS SELECT * FROM metadata_items WHERE id = 3')
+            conn.execute('UPDATE episode SET id = ?, title = ?, added_at = ?',
+                         [episodeId, name, f'2020-08-{episodeId:02} 18:46:24'])
+            conn.execute('INSERT INTO metadata_items SELECT * FROM episode')
+            cursor = conn.execute('INSERT INTO media_items (library_section_id, metadata_item_id) VALUES (1, ?)',
+                                  [episodeId])
+            cursor = conn.execute('INSERT INTO media_parts (media_item_id, file) VALUES (?, ?)',
+                                  [cursor.lastrowid, path])
+            self.lastPartId = cursor.lastrowid
+
+        return path
+
+    def invoke(self, *args):
+        runner = CliRunner()
+        result = runner.invoke(cli, ['catchup', '-v', '-R', '-c', self.cfg, '--state-file', self.stateFile,
+                                     '--no-move', *args, self.mediaRoot])
+        closeConnections()
+        return result
+
+    def savedMark(self):
+        mark = HighWaterMark(self.stateFile, self.dbPath)
+        mark.load()
+        return mark.partId
+
+    def test_catchup_help(self):
+        runner = CliRunner()
+        result = runner.invoke(cli, ['catchup', '--help'])
+
+        self.assertEqual(0, result.exit_code)
+        self.assertIn('Usage: cli catchup [OPTIONS] PATH...', result.output)
+
+    def test_first_run_processes_everything(self):
+        result = self.invoke()
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('No previous run recorded', result.output)
+        self.assertIn(f'[meta-export] {self.video}', result.output)
+        self.assertIn(f'[generate] {self.video}', result.output)
+        self.assertTrue(os.path.exists(os.path.join(self.seasonDir, f'{self.basename}.metadata')))
+        self.assertEqual(self.lastPartId, self.savedMark())
+
+    def test_first_run_prefetches_library_sections(self):
+        with patch('pdst.db.PlexDao.PlexDao.loadSection', autospec=True, return_value=[]) as loadSection, \
+                patch('pdst.db.PlexDao.PlexDao.prefetchFiles', autospec=True, return_value=[]) as prefetchFiles:
+            self.invoke()
+
+        self.assertEqual([1], [c.args[1] for c in loadSection.call_args_list])
+        prefetchFiles.assert_not_called()
+
+    def test_only_new_recordings(self):
+        self.invoke()
+        newVideo = self.addRecording('New Recording')
+
+        with patch('pdst.db.PlexDao.PlexDao.loadSection', autospec=True) as loadSection:
+            result = self.invoke()
+        loadSection.assert_not_called()
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('1 new recordings since media part 1', result.output)
+        self.assertIn(f'[meta-export] {newVideo}', result.output)
+        self.assertNotIn(f'[meta-export] {self.video}', result.output)
+        self.assertEqual(self.lastPartId, self.savedMark())
+
+    def test_nothing_new(self):
+        self.invoke()
+        result = self.invoke()
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('0 new recordings since media part 1', result.output)
+
+    def test_init(self):
+        self.addRecording('New Recording')
+        result = self.invoke('--init')
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertNotIn('[meta-export]', result.output)
+        self.assertEqual(self.lastPartId, self.savedMark())
+
+    def test_parts_elsewhere_advance_mark(self):
+        self.invoke()
+        with sqlite3.connect(self.dbPath) as conn:
+            cursor = conn.execute("INSERT INTO media_parts (media_item_id, file) VALUES (1, '/somewhere/else.ts')")
+            lastPartId = cursor.lastrowid
+
+        result = self.invoke()
+
+        self.assertIn('0 new recordings', result.output)
+        self.assertEqual(lastPartId, self.savedMark())
+
+    def test_failure_holds_back_mark(self):
+        self.invoke('--init')
+        failing = self.addRecording('Failing Recording')
+        failingPartId = self.lastPartId
+        self.addRecording('Later Recording')
+
+        def failOne(ctx, path, stages):
+            if path == failing:
+                raise ValueError('broken')
+
+        with patch('pdst.commands.cmd_watch.runStages', side_effect=failOne) as mockRun:
+            result = self.invoke()
+
+        self.assertNotEqual(0, result.exit_code)
+        self.assertEqual(2, mockRun.call_count)
+        self.assertIn('1 of 2 files failed', result.output)
+        self.assertEqual(failingPartId - 1, self.savedMark())
+
+        result = self.invoke()
+        self.assertIn('2 new recordings', result.output)
+        self.assertEqual(self.lastPartId, self.savedMark())
+
+
+class TestHighWaterMark(unittest.TestCase):
+
+    def test_per_library(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            stateFile = os.path.join(tempDir, 'state.json')
+            first = HighWaterMark(stateFile, '/libraries/one.db')
+            self.assertIsNone(first.partId)
+            first.advance(10, '2020-08-03 18:46:24')
+            first.save()
+
+            second = HighWaterMark(stateFile, '/libraries/two.db')
+            second.load()
+            self.assertIsNone(second.partId)
+            second.advance(3, None)
+            second.save()
+
+            reloaded = HighWaterMark(stateFile, '/libraries/one.db')
+            reloaded.load()
+            self.assertEqual(10, reloaded.partId)
+            self.assertEqual('2020-08-03 18:46:24', reloaded.addedAt)
+
+    def test_never_goes_back(self):
+        mark = HighWaterMark('unused.json', '/libraries/one.db')
+        self.assertTrue(mark.advance(10, None))
+        self.assertFalse(mark.advance(5, None))
+        self.assertEqual(10, mark.partId)
+
+    def test_unreadable_state(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            stateFile = os.path.join(tempDir, 'state.json')
+            with open(stateFile, 'w') as f:
+                f.write('not json')
+
+            mark = HighWaterMark(stateFile, '/libraries/one.db')
+            self.assertFalse(mark.load())
+            self.assertIsNone(mark.partId)
+
+
+class TestIsWatchedFile(unittest.TestCase):
+
+    @parameterized.expand([
+        ['/dvr/Show/Season 1/episode.ts', True, True],
+        ['/dvr/Show/Season 1/episode.ts', False, False],
+        ['/dvr/episode.ts', False, True],
+        ['/dvr2/Show/episode.ts', True, False],
+        ['/elsewhere/episode.ts', True, False],
+        ['/dvr/.grab/123/episode.ts', True, False],
+        ['/dvr/Show/Plex Versions/Optimized/episode.ts', True, False],
+        [None, True, False],
+    ])
+    def test_isWatchedFile(self, filePath, recurse, expected):
+        ctx = MagicMock()
+        ctx.recurse = recurse
+
+        self.assertEqual(expected, isWatchedFile(ctx, filePath, ['/dvr']))
+
+
+if __name__ == '__main__':
+    unittest.main()
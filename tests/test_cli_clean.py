@@ -1,10 +1,13 @@
 import os
 import shutil
 import unittest
+from unittest.mock import patch
 
 from click.testing import CliRunner
+from parameterized import parameterized
 
 from pdst.cli import cli
+from pdst.commands.cmd_clean import formatSize
 
 
 class TestCliGenerate(unittest.TestCase):
@@ -116,3 +119,71 @@ class TestCliGenerate(unittest.TestCase):
             print(result.output)
             print(result.exception)
             raise e
+
+    @parameterized.expand([
+        (['-j', '1'],),
+        (['-j', '4'],),
+    ])
+    def test_clean_summary(self, jobArgs):
+        targetDir = os.path.join(self.cleanRoot, 'Sport Alpha (2009)', 'Season 2020')
+        originalBasename = 'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo'
+
+        orphans = []
+        for i in range(5):
+            for ext in ['metadata', 'png']:
+                orphan = os.path.join(targetDir, f'orphan {i}.{ext}')
+                shutil.copy(os.path.join(targetDir, f'{originalBasename}.{ext}'), orphan)
+                orphans.append(orphan)
+        size = sum(os.path.getsize(f) for f in orphans)
+
+        runner = CliRunner()
+        result = runner.invoke(cli, ['clean', '-R', *jobArgs, self.cleanRoot])
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertFalse(any(os.path.exists(f) for f in orphans))
+        self.assertIn(f'Removed 10 files, freeing {formatSize(size)}', result.output)
+
+    def test_clean_matches_whole_base_name(self):
+        targetDir = os.path.join(self.cleanRoot, 'Sport Alpha (2009)', 'Season 2020')
+        originalBasename = 'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo'
+
+        # 'Team Alpha vs.png' shares a prefix (up to a '.') with the video, but isn't one of its files
+        prefixOrphan = os.path.join(targetDir, 'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs.png')
+        # glob would treat the brackets as a pattern
+        bracketOrphan = os.path.join(targetDir, 'orphan [1].metadata')
+        for orphan in [prefixOrphan, bracketOrphan]:
+            shutil.copy(os.path.join(targetDir, f'{originalBasename}.png'), orphan)
+
+        runner = CliRunner()
+        result = runner.invoke(cli, ['clean', '-R', self.cleanRoot])
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertFalse(os.path.exists(prefixOrphan))
+        self.assertFalse(os.path.exists(bracketOrphan))
+        self.assertTrue(os.path.exists(os.path.join(targetDir, f'{originalBasename}.png')))
+
+    def test_clean_lists_each_directory_once(self):
+        targetDir = os.path.join(self.cleanRoot, 'Sport Alpha (2009)', 'Season 2020')
+        for i in range(20):
+            with open(os.path.join(targetDir, f'orphan {i}.metadata'), 'w') as f:
+                f.write('[metadata]\n')
+
+        realScandir = os.scandir
+        with patch('pdst.commands.cmd_clean.os.scandir', side_effect=realScandir) as scanMock:
+            runner = CliRunner()
+            result = runner.invoke(cli, ['clean', '-R', self.cleanRoot])
+
+        self.assertEqual(0, result.exit_code, result.output)
+        scanned = [call.args[0] for call in scanMock.call_args_list]
+        self.assertEqual(len(set(scanned)), len(scanned))
+        self.assertIn(targetDir, scanned)
+
+    @parameterized.expand([
+        (0, '0 B'),
+        (1023, '1023 B'),
+        (1536, '1.5 KB'),
+        (5 * 1024 ** 3, '5.0 GB'),
+        (3 * 1024 ** 4, '3.0 TB'),
+    ])
+    def test_formatSize(self, size, expected):
+        self.assertEqual(expected, formatSize(size))
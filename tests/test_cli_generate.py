@@ -1,7 +1,9 @@
 import os
 import shutil
+import tempfile
 import unittest
 
+import simplejson as json
 from PIL import Image
 from click.testing import CliRunner
 
@@ -55,6 +57,35 @@ class TestCliGenerate(unittest.TestCase):
             print(result.exception)
             raise e
 
+    def test_generate_video_file_render_cache(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            with open(self.cfg) as f:
+                config = json.load(f)
+            config['renderCache'] = os.path.join(tempDir, 'renders')
+            cfg = os.path.join(tempDir, 'config.json')
+            with open(cfg, 'w') as f:
+                json.dump(config, f)
+
+            outDir = os.path.join(tempDir, 'out')
+            os.makedirs(outDir)
+            vid_file = os.path.join('test-files', 'testMedia', 'Sport Alpha (2009)', 'Season 2020',
+                                    'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo.ts')
+            image = os.path.join(outDir, 'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo.png')
+
+            runner = CliRunner()
+            first = runner.invoke(cli, ['generate', '-f', '-o', outDir, '-c', cfg, vid_file])
+            with open(image, 'rb') as f:
+                rendered = f.read()
+            os.remove(image)
+            second = runner.invoke(cli, ['generate', '-f', '-o', outDir, '-c', cfg, vid_file])
+
+            self.assertEqual(0, first.exit_code, first.output)
+            self.assertIn('Render cache: 0 hits, 1 misses', first.output)
+            self.assertEqual(0, second.exit_code, second.output)
+            self.assertIn('Render cache: 1 hits, 0 misses', second.output)
+            with open(image, 'rb') as f:
+                self.assertEqual(rendered, f.read())
+
     def test_generate_video_file_no_process(self):
         runner = CliRunner()
         vid_file = os.path.join('test-files', 'testMedia', 'Sport Alpha (2009)', 'Season 2020',
@@ -149,6 +180,29 @@ class TestCliGenerate(unittest.TestCase):
         if not match:
             self.fail(msg)
 
+    def test_generate_logos_jobs(self):
+        runner = CliRunner()
+        logoDir = os.path.join('test-files', 'logos')
+        outDir = os.path.join(self.outDir, 'jobs')
+        os.makedirs(outDir)
+        result = runner.invoke(cli, ['generate', '-v', '-m', 'image', '-s', '600', '340', '-j', '2', '-o', outDir,
+                                     logoDir])
+
+        try:
+            self.assertEqual(0, result.exit_code)
+            processed = [line for line in result.output.splitlines() if line.startswith('Processing image file')]
+            self.assertEqual(3, len(processed))
+        except AssertionError as e:
+            print(result.output)
+            print(result.exception)
+            raise e
+
+        for name in ['Bravo_031734_046564_bg$vStripe11.png', 'Alpha_69d2e6_a1cdc5_bg$hStripe3.png']:
+            (match, msg) = verifyImagesEquivalent(os.path.join(self.genRefDir, name), os.path.join(outDir, name), 5)
+
+            if not match:
+                self.fail(msg)
+
     def test_generate_set_size(self):
         runner = CliRunner()
         spec = 'team:Sport/Alpha'
@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+
+from pdst.cli import cli
+from pdst.image.LogoIndex import INDEX_FILENAME
+
+
+class TestCliIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tempDir.name, 'logos')
+        testLogos = os.path.join(os.path.dirname(__file__), 'test-files', 'logos')
+        shutil.copytree(testLogos, self.root, ignore=shutil.ignore_patterns(INDEX_FILENAME))
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_index_help(self):
+        runner = CliRunner()
+        result = runner.invoke(cli, ['index', '--help'])
+
+        self.assertEqual(0, result.exit_code)
+        self.assertIn('Usage: cli index [OPTIONS] [PATH]...', result.output)
+
+    def test_index_build_and_verify(self):
+        runner = CliRunner()
+        result = runner.invoke(cli, ['index', '--verify', self.root])
+        self.assertEqual(1, result.exit_code)
+        self.assertIn('does not have a usable index', result.output)
+
+        result = runner.invoke(cli, ['index', self.root])
+        try:
+            self.assertEqual(0, result.exit_code)
+            self.assertIn(f'Indexed 6 images in {self.root}', result.output)
+            self.assertTrue(os.path.isfile(os.path.join(self.root, INDEX_FILENAME)))
+        except AssertionError as e:
+            print(result.output)
+            print(result.exception)
+            raise e
+
+        result = runner.invoke(cli, ['index', '--verify', self.root])
+        self.assertEqual(0, result.exit_code)
+        self.assertIn('is up to date', result.output)
+
+        os.remove(os.path.join(self.root, 'plain', 'Charlie.png'))
+        result = runner.invoke(cli, ['index', '-v', '--verify', self.root])
+        self.assertEqual(1, result.exit_code)
+        self.assertIn(f"No longer exists: {os.path.join('plain', 'Charlie.png')}", result.output)
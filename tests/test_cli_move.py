@@ -1,13 +1,20 @@
+import errno
 import os
 import shutil
+import sqlite3
+import tempfile
 import unittest
 from datetime import datetime
 from glob import iglob
 from unittest.mock import patch
 
+import simplejson as json
 from click.testing import CliRunner
 
+from pdst import filetools
 from pdst.cli import cli
+from pdst.db.PlexDao import PlexDao, closeConnections
+from tests.helpers import crossDeviceLink
 
 
 def mocked_abspath(path):
@@ -40,11 +47,12 @@ class TestCliMove(unittest.TestCase):
         self.assertEqual(0, result.exit_code)
         self.assertIn('Usage: cli move [OPTIONS]', result.output)
 
+    @patch('pdst.filetools.os.link', side_effect=OSError(errno.EPERM, 'Operation not permitted'))
     @patch('pdst.commands.cmd_move.os.rename', side_effect=mocked_rename)
     @patch('pdst.filetools.glob.iglob', side_effect=mocked_glob)
     @patch('pdst.commands.cmd_move.os.path.isfile', return_value=True)
     @patch('pdst.commands.cmd_move.os.path.abspath', side_effect=mocked_abspath)
-    def test_move_single(self, mock_abspath, mock_isfile, mocked_glob, mock_rename):
+    def test_move_single(self, mock_abspath, mock_isfile, mocked_glob, mock_rename, mock_link):
         runner = CliRunner()
         vid_file = 'Sport Alpha (2009)/Season 2020/' \
                    'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo.ts'
@@ -86,3 +94,132 @@ class TestCliMove(unittest.TestCase):
             # always clean up
             if os.path.exists('test-files/out'):
                 shutil.rmtree('test-files/out')
+
+
+class TestCliMovePlan(unittest.TestCase):
+    basename = 'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo'
+
+    def setUp(self):
+        testsDir = os.path.dirname(__file__)
+        os.chdir(testsDir)
+
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.mediaRoot = os.path.join(self.tempDir.name, 'dvr')
+        self.seasonDir = os.path.join(self.mediaRoot, 'Sport Alpha (2009)', 'Season 2020')
+        shutil.copytree(os.path.join(testsDir, 'test-files', 'testMedia'), self.mediaRoot)
+        self.video = os.path.join(self.seasonDir, f'{self.basename}.ts')
+        # the test .metadata file is empty, which would hide the database's metadata, use subtitles instead
+        os.rename(os.path.join(self.seasonDir, f'{self.basename}.metadata'),
+                  os.path.join(self.seasonDir, f'{self.basename}.srt'))
+        self.files = [os.path.join(self.seasonDir, f'{self.basename}.{ext}') for ext in ['ts', 'srt', 'png']]
+
+        libraryPath = os.path.join(self.tempDir.name, 'library')
+        shutil.copytree(os.path.join(testsDir, 'test-files', 'testPlexLibrary'), libraryPath)
+        with sqlite3.connect(os.path.join(libraryPath, PlexDao.PLEX_DB_PATH)) as conn:
+            conn.execute('UPDATE media_parts SET file = ? WHERE id = 1', [self.video])
+
+        self.target = os.path.join(self.tempDir.name, 'library-out')
+        os.makedirs(self.target)
+        self.cfg = os.path.join(self.tempDir.name, 'config.json')
+        with open(os.path.join(testsDir, 'test-files', 'config.json')) as f:
+            config = json.load(f)
+        config['plexLibrary'] = libraryPath
+        config['moveTarget'] = self.target
+        config['colorCache'] = False
+        with open(self.cfg, 'w') as f:
+            json.dump(config, f)
+
+        self.journal = os.path.join(self.tempDir.name, 'state', 'move.journal')
+
+        zoneFixedTimestamp = datetime.fromtimestamp(1596484800).strftime('%Y-%m-%d %H %M %S')
+        self.destinationDir = os.path.join(self.target, 'Sport Alpha', 'Season 2020')
+        self.expectedBase = os.path.join(self.destinationDir, f'Sport Alpha - {zoneFixedTimestamp} - '
+                                                              f'Team Alpha vs. Team Bravo')
+
+    def tearDown(self):
+        closeConnections()
+        self.tempDir.cleanup()
+
+    def invoke(self, *args):
+        runner = CliRunner()
+        result = runner.invoke(cli, ['move', '-v', '-c', self.cfg, *args, self.video])
+        closeConnections()
+        return result
+
+    def assertMoved(self):
+        for ext in ['ts', 'srt', 'png']:
+            self.assertTrue(os.path.exists(f'{self.expectedBase}.{ext}'), f'{self.expectedBase}.{ext}')
+        self.assertFalse(any(os.path.exists(f) for f in self.files))
+        self.assertTrue(os.path.exists(os.path.join(self.target, 'Sport Alpha', 'poster.jpg')))
+
+    def test_dry_run(self):
+        result = self.invoke('--dry-run')
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn(f'mkdir {self.destinationDir}', result.output)
+        self.assertIn(f'move {self.video} -> {self.expectedBase}.ts', result.output)
+        self.assertIn(f"copy ", result.output)
+        self.assertIn('1 videos, 5 operations', result.output)
+        self.assertTrue(all(os.path.exists(f) for f in self.files))
+        self.assertEqual([], os.listdir(self.target))
+
+    def test_move(self):
+        result = self.invoke('--journal', self.journal)
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertMoved()
+        self.assertFalse(os.path.exists(self.journal))
+
+    @patch('pdst.filetools.os.link', side_effect=crossDeviceLink)
+    def test_move_cross_device(self, linkMock):
+        result = self.invoke()
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertMoved()
+        self.assertIn('(copied across filesystems)', result.output)
+
+    def test_resume_from_journal(self):
+        realMoveFile = filetools.moveFile
+
+        def failOnSubtitles(src, dst):
+            if src.endswith('.srt'):
+                raise OSError(errno.EIO, 'Input/output error')
+            return realMoveFile(src, dst)
+
+        with patch('pdst.filetools.moveFile', side_effect=failOnSubtitles):
+            result = self.invoke('--journal', self.journal)
+
+        self.assertNotEqual(0, result.exit_code)
+        self.assertIn("run again with '--journal", result.output)
+        self.assertTrue(os.path.exists(self.journal))
+        self.assertTrue(os.path.exists(f'{self.expectedBase}.png'))
+        self.assertTrue(os.path.exists(self.video))
+
+        result = self.invoke('--journal', self.journal)
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('Resuming an interrupted move', result.output)
+        self.assertIn(f'Already done: move {self.files[2]}', result.output)
+        self.assertMoved()
+        self.assertFalse(os.path.exists(self.journal))
+
+    def test_resume_dry_run_lists_each_move_once(self):
+        realMoveFile = filetools.moveFile
+
+        def failOnSubtitles(src, dst):
+            if src.endswith('.srt'):
+                raise OSError(errno.EIO, 'Input/output error')
+            return realMoveFile(src, dst)
+
+        with patch('pdst.filetools.moveFile', side_effect=failOnSubtitles):
+            self.invoke('--journal', self.journal)
+
+        result = self.invoke('--journal', self.journal, '--dry-run')
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('Resuming an interrupted move', result.output)
+        self.assertEqual(1, result.output.count(f'move {self.video} -> {self.expectedBase}.ts'), result.output)
+        self.assertIn('part of the interrupted move', result.output)
+        self.assertTrue(os.path.exists(self.video))
+        self.assertTrue(os.path.exists(self.journal))
+
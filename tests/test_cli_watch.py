@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import simplejson as json
+from click.testing import CliRunner
+
+from pdst.cli import cli
+from pdst.commands import cmd_move
+from pdst.commands.cmd_watch import DirectoryPoller
+
+
+class TestCliWatch(unittest.TestCase):
+    watchRoot = os.path.join(os.path.dirname(__file__), 'test-files', 'watchTest')
+    basename = 'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Alpha vs. Team Bravo'
+
+    def setUp(self):
+        testsDir = os.path.dirname(__file__)
+        os.chdir(testsDir)
+        self.cfg = os.path.join(testsDir, 'test-files', 'config.json')
+        self.seasonDir = os.path.join(self.watchRoot, 'Sport Alpha (2009)', 'Season 2020')
+
+        testMediaDir = os.path.join(testsDir, 'test-files', 'testMedia')
+        shutil.copytree(testMediaDir, self.watchRoot)
+
+    def tearDown(self):
+        shutil.rmtree(self.watchRoot)
+
+    def getMockCtx(self):
+        ctx = MagicMock()
+        ctx.recurse = True
+        ctx.config.videoExtensions = ['ts', 'mkv']
+        return ctx
+
+    def test_watch_help(self):
+        runner = CliRunner()
+        result = runner.invoke(cli, ['watch', '--help'])
+
+        self.assertEqual(0, result.exit_code)
+        self.assertIn('Usage: cli watch [OPTIONS] PATH...', result.output)
+
+    def test_poller_debounces_until_settled(self):
+        poller = DirectoryPoller(self.getMockCtx(), [self.watchRoot], settleTime=5)
+        video = os.path.join(self.seasonDir, f'{self.basename}.ts')
+
+        self.assertEqual([], poller.poll(now=0))
+        self.assertTrue(poller.hasPending())
+        self.assertEqual([], poller.poll(now=4))
+        self.assertEqual([video], poller.poll(now=5))
+
+        # already handed off, and unchanged
+        self.assertEqual([], poller.poll(now=20))
+        self.assertFalse(poller.hasPending())
+
+    def test_poller_restarts_settle_on_change(self):
+        poller = DirectoryPoller(self.getMockCtx(), [self.watchRoot], settleTime=5)
+        video = os.path.join(self.seasonDir, f'{self.basename}.ts')
+
+        self.assertEqual([], poller.poll(now=0))
+        with open(video, 'ab') as f:
+            f.write(b'more data')
+        self.assertEqual([], poller.poll(now=4))
+        self.assertEqual([], poller.poll(now=8))
+        self.assertEqual([video], poller.poll(now=9))
+
+    def test_poller_ignores_existing(self):
+        poller = DirectoryPoller(self.getMockCtx(), [self.watchRoot], settleTime=0, includeExisting=False)
+        self.assertEqual([], poller.poll(now=0))
+
+        newVideo = os.path.join(self.seasonDir, 'New Recording.ts')
+        shutil.copy(os.path.join(self.seasonDir, f'{self.basename}.ts'), newVideo)
+        self.assertEqual([newVideo], poller.poll(now=1))
+
+    def test_watch_once_runs_stages(self):
+        runner = CliRunner()
+        result = runner.invoke(cli, ['watch', '-v', '-f', '-R', '-c', self.cfg, '--once', '--settle', '0',
+                                     '--no-move', self.watchRoot])
+        try:
+            self.assertEqual(0, result.exit_code)
+            self.assertIn(f'[meta-export] {os.path.join(self.seasonDir, self.basename)}.ts', result.output)
+            self.assertIn(f'[generate] {os.path.join(self.seasonDir, self.basename)}.ts', result.output)
+            self.assertIn(f'Saving {self.basename}.png', result.output)
+            self.assertNotIn('[move]', result.output)
+
+        except AssertionError as e:
+            print(result.output)
+            print(result.exception)
+            raise e
+
+    def test_watch_moves_same_timestamp_files_to_different_names(self):
+        source = os.path.join(self.seasonDir, f'{self.basename}.ts')
+        other = os.path.join(self.seasonDir,
+                             'Sport Alpha (2009) - 2020-08-03 08 00 00 - Team Charlie vs. Team Delta.ts')
+        shutil.copy(source, other)
+        os.remove(os.path.join(self.seasonDir, f'{self.basename}.png'))
+        os.remove(os.path.join(self.seasonDir, f'{self.basename}.metadata'))
+
+        # both workers have their metadata before either moves anything, so they pick names at the same time
+        barrier = threading.Barrier(2, timeout=10)
+
+        def getMetadata(path):
+            barrier.wait()
+            metadata = MagicMock()
+            metadata.show.title = 'Sport Alpha'
+            metadata.show.thumbUrl = 'no/poster.jpg'
+            metadata.season.index = 2020
+            metadata.release = datetime(2020, 8, 3, 8, 0, 0)
+            metadata.title = 'Event'
+            return metadata
+
+        with tempfile.TemporaryDirectory() as moveTarget:
+            with open(self.cfg) as f:
+                config = json.load(f)
+            config['moveTarget'] = moveTarget
+            cfg = os.path.join(moveTarget, 'config.json')
+            with open(cfg, 'w') as f:
+                json.dump(config, f)
+
+            stages = [('move', lambda ctx, path: True, cmd_move.moveAssociatedFiles)]
+            with patch('pdst.commands.cmd_watch.getStages', return_value=stages), \
+                    patch('pdst.MetadataService.MetadataService.getMetadataForEpisodeFile', side_effect=getMetadata):
+                result = CliRunner().invoke(cli, ['watch', '-v', '-R', '-c', cfg, '--once', '--settle', '0',
+                                                  '--jobs', '2', self.watchRoot])
+
+            self.assertEqual(0, result.exit_code, result.output)
+            moved = sorted(os.listdir(os.path.join(moveTarget, 'Sport Alpha', 'Season 2020')))
+            self.assertEqual(['Sport Alpha - 2020-08-03 08 00 00 - Event.ts',
+                              'Sport Alpha - 2020-08-03 08 00 01 - Event.ts'], moved)
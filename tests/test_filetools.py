@@ -1,4 +1,6 @@
+import errno
 import os
+import tempfile
 import unittest
 from datetime import datetime
 from unittest.mock import MagicMock, patch
@@ -6,6 +8,7 @@ from unittest.mock import MagicMock, patch
 from parameterized import parameterized
 
 from pdst import filetools
+from tests.helpers import crossDeviceLink
 
 
 class TestMetadata(unittest.TestCase):
@@ -140,3 +143,175 @@ class TestMetadata(unittest.TestCase):
 
         output = filetools.getMoveDestinationFilename(originalFile, metadataObj, destinationPath)
         self.assertEqual(expectedName, output)
+
+    @staticmethod
+    def mockMetadata(release):
+        metadata = MagicMock()
+        metadata.show.title = 'Show'
+        metadata.title = 'Title'
+        metadata.release = datetime.strptime(release, '%Y-%m-%d %H:%M:%S')
+        return metadata
+
+    @patch('pdst.filetools.os.scandir')
+    def test_getMoveDestinationFilename_index(self, scanMock):
+        scanMock.return_value = ['Show - 2020-01-01 12 00 00 - Another.mkv',
+                                 'Show - 2020-01-01 12 00 00 - Another.metadata',
+                                 'Show - 2020-01-01 12 00 00 - Another.png',
+                                 'Show - 2020-01-01 12 00 02 - Later.mkv']
+        index = filetools.DestinationIndex()
+
+        names = [filetools.getMoveDestinationFilename(f'File{i}.ts', self.mockMetadata('2020-01-01 12:00:00'),
+                                                      '/a/fake/path', index)
+                 for i in range(3)]
+
+        self.assertEqual(['Show - 2020-01-01 12 00 01 - Title',
+                          'Show - 2020-01-01 12 00 03 - Title',
+                          'Show - 2020-01-01 12 00 04 - Title'], names)
+        scanMock.assert_called_once_with('/a/fake/path')
+
+    def test_TimestampIndex_sees_files_added_since(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            index = filetools.TimestampIndex(tempDir)
+            metadata = self.mockMetadata('2020-01-01 12:00:00')
+            self.assertEqual('Show - 2020-01-01 12 00 00 - Title', index.claim(metadata))
+
+            # put there by something else, e.g. another pdst process
+            open(os.path.join(tempDir, 'Show - 2020-01-01 12 00 01 - Other.ts'), 'w').close()
+            os.utime(tempDir, ns=(0, os.stat(tempDir).st_mtime_ns + 1_000_000_000))
+
+            metadata = self.mockMetadata('2020-01-01 12:00:00')
+            self.assertEqual('Show - 2020-01-01 12 00 02 - Title', index.claim(metadata))
+
+    @patch('pdst.filetools.os.scandir', return_value=[])
+    def test_DestinationIndex_maxDirectories(self, scanMock):
+        index = filetools.DestinationIndex(maxDirectories=2)
+        first = index.get('/a')
+        index.get('/b')
+        self.assertIs(first, index.get('/a'))
+        index.get('/c')
+
+        self.assertEqual(['/a', '/c'], list(index.indexes))
+        self.assertEqual(3, scanMock.call_count)
+
+    @patch('pdst.filetools.os.scandir')
+    def test_TimestampIndex_ignoreName(self, scanMock):
+        scanMock.return_value = ['Show - 2020-01-01 12 00 00 - Original.mkv',
+                                 'Show - 2020-01-01 12 00 01 - Other.mkv']
+        index = filetools.TimestampIndex('/a/fake/path')
+        start = datetime(2020, 1, 1, 12)
+
+        self.assertEqual(datetime(2020, 1, 1, 12, 0, 2), index.nextFree(start))
+        self.assertEqual(start, index.nextFree(start, 'Show - 2020-01-01 12 00 00 - Original.mkv'))
+
+    @patch('pdst.filetools.os.scandir')
+    def test_TimestampIndex_no_timestamp(self, scanMock):
+        scanMock.return_value = ['season.jpg']
+        index = filetools.TimestampIndex('/a/fake/path')
+
+        metadata = self.mockMetadata('2020-01-01 12:00:00')
+        metadata.release = None
+
+        self.assertEqual('Show - Title', index.claim(metadata))
+
+class TestFileTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tempDir.name, 'src.ts')
+        self.dst = os.path.join(self.tempDir.name, 'dst.ts')
+        self.contents = os.urandom(256 * 1024)
+        with open(self.src, 'wb') as f:
+            f.write(self.contents)
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def readDst(self):
+        with open(self.dst, 'rb') as f:
+            return f.read()
+
+    def test_copyFile(self):
+        os.chmod(self.src, 0o640)
+        filetools.copyFile(self.src, self.dst)
+
+        self.assertEqual(self.contents, self.readDst())
+        self.assertEqual(0o640, os.stat(self.dst).st_mode & 0o777)
+        self.assertTrue(os.path.exists(self.src))
+
+    @parameterized.expand([
+        ('copy_file_range',),
+        ('sendfile',),
+    ])
+    def test_copyFileContents_fallback(self, unsupported):
+        if not hasattr(os, unsupported):
+            self.skipTest(f"no os.{unsupported} here")
+
+        with patch(f'pdst.filetools.os.{unsupported}', side_effect=OSError(errno.ENOSYS, 'Not supported')):
+            filetools.copyFileContents(self.src, self.dst)
+
+        self.assertEqual(self.contents, self.readDst())
+
+    def test_moveFile_same_device(self):
+        self.assertFalse(filetools.moveFile(self.src, self.dst))
+
+        self.assertEqual(self.contents, self.readDst())
+        self.assertFalse(os.path.exists(self.src))
+
+    def test_moveFile_doesnt_replace(self):
+        with open(self.dst, 'wb') as f:
+            f.write(b'existing')
+
+        with self.assertRaises(FileExistsError):
+            filetools.moveFile(self.src, self.dst)
+
+        self.assertEqual(b'existing', self.readDst())
+        self.assertTrue(os.path.exists(self.src))
+
+    @patch('pdst.filetools.os.link', side_effect=OSError(errno.EPERM, 'Operation not permitted'))
+    def test_moveFile_without_hard_links(self, linkMock):
+        self.assertFalse(filetools.moveFile(self.src, self.dst))
+        self.assertEqual(self.contents, self.readDst())
+        self.assertFalse(os.path.exists(self.src))
+
+        with open(self.src, 'wb') as f:
+            f.write(b'another')
+        with self.assertRaises(FileExistsError):
+            filetools.moveFile(self.src, self.dst)
+        self.assertEqual(self.contents, self.readDst())
+
+    def test_moveFile_onto_itself(self):
+        self.assertFalse(filetools.moveFile(self.src, self.src))
+        self.assertTrue(os.path.exists(self.src))
+
+    @patch('pdst.filetools.os.link', side_effect=crossDeviceLink)
+    def test_moveFile_cross_device(self, linkMock):
+        os.utime(self.src, (1000000000, 1000000000))
+        self.assertTrue(filetools.moveFile(self.src, self.dst))
+
+        self.assertEqual(self.contents, self.readDst())
+        self.assertFalse(os.path.exists(self.src))
+        self.assertFalse(os.path.exists(self.dst + filetools.PARTIAL_SUFFIX))
+        self.assertEqual(1000000000, os.stat(self.dst).st_mtime)
+
+    @patch('pdst.filetools.os.link', side_effect=crossDeviceLink)
+    def test_moveFile_cross_device_doesnt_replace(self, linkMock):
+        with open(self.dst, 'wb') as f:
+            f.write(b'existing')
+
+        with self.assertRaises(FileExistsError):
+            filetools.moveFile(self.src, self.dst)
+
+        self.assertEqual(b'existing', self.readDst())
+        self.assertTrue(os.path.exists(self.src))
+        self.assertFalse(os.path.exists(self.dst + filetools.PARTIAL_SUFFIX))
+
+    @patch('pdst.filetools.os.link', side_effect=crossDeviceLink)
+    def test_moveFile_cross_device_failure(self, linkMock):
+        with patch('pdst.filetools.copyFileContents', side_effect=OSError(errno.ENOSPC, 'No space left')):
+            with self.assertRaises(OSError):
+                filetools.moveFile(self.src, self.dst)
+
+        self.assertTrue(os.path.exists(self.src))
+        self.assertFalse(os.path.exists(self.dst))
+        self.assertFalse(os.path.exists(self.dst + filetools.PARTIAL_SUFFIX))
+
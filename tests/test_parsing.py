@@ -98,6 +98,38 @@ class TestMetadata(unittest.TestCase):
         found = parsing.hasHints(input)
         self.assertEqual(expected, found)
 
+    @parameterized.expand([
+        ('/some/path/Team_One.png', 'Team_One', False, (), (), None, None, (None, None)),
+        ('Team_One_123456_fffi_bg$solid.png', 'Team_One', True, ('123456', 'fff'), (False, True), 'solid', None,
+         (None, None)),
+        ('Team_One_bg$vStripe1.2_abc_mask$0f0_stroke$3$000.png', 'Team_One', True, ('abc',), (False,), 'vStripe1.2',
+         '0f0', (3, '000')),
+        ('Team_One_123456_fff_oops.png', 'Team_One_123456_fff_oops', False, (), (), None, None, (None, None)),
+        ('Team_One_mask$abc.png', 'Team_One', True, (), (), None, 'abc', (None, None)),
+    ])
+    def test_getImageHints(self, path, name, hasHints, colors, inverted, bg, mask, stroke):
+        hints = parsing.getImageHints(path)
+
+        self.assertEqual(name, hints.name)
+        self.assertEqual(hasHints, hints.hasHints)
+        self.assertEqual(colors, hints.colors)
+        self.assertEqual(inverted, hints.inverted)
+        self.assertEqual(bg, hints.bg)
+        self.assertEqual(mask, hints.mask)
+        self.assertEqual(stroke, (hints.strokeSize, hints.strokeColor))
+
+    def test_getImageHints_cached(self):
+        first = parsing.getImageHints('/some/path/Team_One_123456.png')
+        second = parsing.getImageHints('/other/path/Team_One_123456.png')
+
+        self.assertIs(first, second)
+
+    def test_getAllColorsFromFilename_copy(self):
+        colors = parsing.getAllColorsFromFilename('Team_One_123456.png')
+        colors.append('fff')
+
+        self.assertEqual(['123456'], parsing.getAllColorsFromFilename('Team_One_123456.png'))
+
     @parameterized.expand([
         ('/some/path/Some_Name_000000.png', '000000'),
         ('/some/path/Some_Name_000000.png', '000000', 0),